@@ -13,6 +13,7 @@ if _lib_path not in sys.path:
 from .ui import ui_manager
 from . import main_logic
 from . import api_client
+from . import config_manager
 from .card.card_template_manager import update_card_templates
 from aqt import gui_hooks
 import aqt
@@ -23,6 +24,7 @@ ui_manager.register_menu_item()
 
 # 2. Register the necessary hooks (e.g., card rendering)
 main_logic.register_hooks()
+config_manager.register_config_hooks()
 
 # 3. Update saved sentence card templates after profile loads
 gui_hooks.profile_did_open.append(lambda: update_card_templates())
@@ -33,7 +35,7 @@ from . import web_server as _web_server
 def _start_web_server():
     """启动 Web 服务器（延迟到 profile 加载后）"""
     try:
-        config = aqt.mw.addonManager.getConfig(__name__.split('.')[0]) or {}
+        config = config_manager.get_config()
         if not config.get("web_enabled", True):
             print("[ContextFlow Web] Web 后端已禁用")
             return
@@ -5,7 +5,15 @@ import traceback
 import typing
 import re
 import random
+import time
+import heapq
+import threading
 from .config_manager import get_config, clean_html
+from .cache.cache_manager import record_usage, record_validation, load_cache
+from .local_backend import local_backend, is_local_url, estimate_max_tokens
+from . import llm_transport
+from .deck_resolver import deck_resolver
+from .sentence_validator import validate_sentence_pairs, strip_gloss
 
 
 class AISentenceGenerator:
@@ -84,6 +92,49 @@ class AISentenceGenerator:
 示例仅为格式参考。语言，难度，句子长度等信息请按照生成规则。请严格按照上述要求生成。
 '''
 
+    # 精简提示词：规则合并、不带示例 JSON，输入 token 约为默认提示词的三分之一
+    COMPACT_PROMPT_TEMPLATE = '''为{language}学习者生成5个包含关键词 '{world}' 的{language}例句，并附中文翻译。
+学习者：词汇量 {vocab_level}；学习目标 {learning_goal}；最大难度 {difficulty_level}；最大长度 {sentence_length_desc}。
+规则：
+- '{world}' 可以是复数、过去式等屈折形式，但不能换成同根的其他词（如 book 不能写成 booking，king 不能写成 kingdom）；带括号注释的多义词只用注释的含义。
+- 语境与学习目标相关或为通用场景，5个例句覆盖该词的不同用法；例句和翻译各自只用一种语言。
+{second_keywords}
+只输出JSON，不要代码块或其他内容：{{"sentences": [["例句1", "中文翻译1"], ["例句2", "中文翻译2"]]}}'''
+
+    # 补生成提示词：追加在原提示词之后，只为被校验拒绝的槽位重新请求
+    REFILL_PROMPT_SUFFIX = '''
+
+补充说明（覆盖上文的例句数量要求）：
+- 本次只需生成 {count} 个例句，JSON 结构不变。
+- 每个例句都必须包含关键词 '{world}'（允许复数、过去式等屈折形式）。
+- 不得与以下已有例句重复或相近：
+{existing}'''
+
+    # 数量要求：库存规划给出的批量与默认 5 句不同时追加在提示词之后
+    COUNT_PROMPT_SUFFIX = '''
+
+补充说明（覆盖上文的例句数量要求）：
+- 本次生成 {count} 个例句，JSON 结构不变。'''
+
+    # 两阶段生成的第一阶段：只要例句，翻译在答案面即将显示时另行批量请求
+    SENTENCE_ONLY_PROMPT_SUFFIX = '''
+
+补充说明（覆盖上文的翻译要求）：
+- 本次不需要中文翻译：每个子数组的第二个元素一律输出空字符串 ""，JSON 结构不变。'''
+
+    # 两阶段生成的第二阶段：批量翻译例句
+    TRANSLATION_PROMPT_TEMPLATE = '''你是一个学习插件的翻译助手。
+请把下面 {count} 个{language}例句逐句翻译成自然准确的中文。
+- 译文必须是单一语言，不要保留原文。
+- 若原句中有 <u> 标签，在译文的对应部分同样加上 <u> 标签。
+- 必须返回严格的JSON格式：{{"translations": ["译文1", "译文2", ...]}}，数量和顺序与原句一致，不得以代码块形式输出，不要输出其他内容。
+
+例句：
+{sentences}'''
+
+    # 被拒槽位的补生成轮数上限
+    MAX_REFILL_ROUNDS = 1
+
     DEFAULT_CONFIG = {
         "vocab_level": "大学英语四级 CET-4 (4000词)",
         "learning_goal": "提升日常浏览英文网页与资料的流畅度",
@@ -93,23 +144,43 @@ class AISentenceGenerator:
         "prompt_name": "默认-不标记目标词"
     }
 
+    # prop:d 使用归一化难度 (d-1)/9，FSRS 原始难度范围为 1-10
+    DIFFICULTY_THRESHOLD = 0.6
+
     def __init__(self):
         self.support_thinking: bool = True
-        self._top_difficulty_keywords: list = []
+        self._top_difficulty_keywords: list = None
+        # card_id -> (原始难度, 关键词)；首次使用时一次性批量构建，之后随复习事件增量更新
+        self._difficulty_index: dict = None
+        self._difficulty_lock: threading.Lock = threading.Lock()
 
     # --- 提示词管理 ---
 
+    @classmethod
+    def builtin_prompts(cls) -> dict:
+        """内置提示词：名称 -> 模板（顺序即界面中的显示顺序）"""
+        return {
+            "默认-不标记目标词": cls.DEFAULT_PROMPT_TEMPLATE + cls.DEFAULT_FORMAT_NORMAL,
+            "默认-标记目标词": cls.DEFAULT_PROMPT_TEMPLATE + cls.DEFAULT_FORMAT_HIGHLIGHT,
+            "默认-精简": cls.COMPACT_PROMPT_TEMPLATE,
+        }
+
     def get_prompts(self, config):
-        custom_prompts = config.get("custom_prompts", {})
         prompt_name = config.get("prompt_name", self.DEFAULT_CONFIG["prompt_name"])
-        if prompt_name == "默认-不标记目标词":
-            prompt = self.DEFAULT_PROMPT_TEMPLATE + self.DEFAULT_FORMAT_NORMAL
-        elif prompt_name == "默认-标记目标词":
-            prompt = self.DEFAULT_PROMPT_TEMPLATE + self.DEFAULT_FORMAT_HIGHLIGHT
-        else:
-            custom_prompts = config.get("custom_prompts", {})
-            prompt = custom_prompts.get(prompt_name, self.DEFAULT_PROMPT_TEMPLATE + self.DEFAULT_FORMAT_NORMAL)
-        return prompt
+        builtin = self.builtin_prompts()
+        if prompt_name in builtin:
+            return builtin[prompt_name]
+        custom_prompts = config.get("custom_prompts", {})
+        return custom_prompts.get(prompt_name, builtin["默认-不标记目标词"])
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """粗略估算 token 数（不依赖分词器）：中日韩字符约 0.7 token/字，其余约 4 字符/token"""
+        if not text:
+            return 0
+        cjk = sum(1 for ch in text if "\u3040" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af"
+                  or "\uff00" <= ch <= "\uffef")
+        return int(cjk * 0.7 + (len(text) - cjk) / 4) + 1
 
     def format_prompt(self, config, keyword, prompt=None):
         """构建格式化后的提示词字符串"""
@@ -117,14 +188,13 @@ class AISentenceGenerator:
         config_second_kw_top_n = config.get("second_keywords_top_n", 100)
 
         if config_second_kw_enabled:
-            if not self._top_difficulty_keywords:
-                self._top_difficulty_keywords = self.get_top_difficulty_keywords()
+            top_difficulty_keywords = self.get_top_difficulty_keywords()
 
-            if not self._top_difficulty_keywords or len(self._top_difficulty_keywords) < config_second_kw_top_n:
+            if not top_difficulty_keywords or len(top_difficulty_keywords) < config_second_kw_top_n:
                 second_keywords_str = ""
             else:
-                second_keywords = random.sample(self._top_difficulty_keywords, 10) if len(
-                    self._top_difficulty_keywords) >= 10 else self._top_difficulty_keywords
+                second_keywords = random.sample(top_difficulty_keywords, 10) if len(
+                    top_difficulty_keywords) >= 10 else top_difficulty_keywords
                 second_keywords_str = ", ".join(second_keywords)
                 second_keywords_str = "- 在保证句子流畅的前提下，可以在每个例句中尝试融入若干以下词汇(" + second_keywords_str + ")，不限制每句融入几个，不得强制融入牺牲流传性，0-3个为佳，必须以句子自然流畅为前提。"
         else:
@@ -151,54 +221,185 @@ class AISentenceGenerator:
 
     # --- 高层生成 ---
 
-    def generate(self, config, keyword, prompt=None):
-        """同步调用AI接口生成包含关键词的例句，返回例句对列表"""
+    def generate(self, config, keyword, prompt=None, purpose="generate", sentence_count=None, sentence_only=False):
+        """同步调用AI接口生成包含关键词的例句，返回例句对列表。
+        purpose 写入用量账本，用于区分预取/补货/紧急等调用来源；
+        sentence_count 为库存规划给出的批量，写入提示词的数量要求（远程接口仅在开启
+        remote_max_tokens_enabled 时据此限制输出长度）；
+        sentence_only 为真时（两阶段生成）只生成例句，例句对的翻译为空字符串"""
+        formatted_prompt = self.build_prompt(config, keyword, prompt, sentence_count, sentence_only)
+        return self.generate_from_prompt(config, keyword, formatted_prompt, purpose, sentence_count)
+
+    def build_prompt(self, config, keyword, prompt=None, sentence_count=None, sentence_only=False):
+        """格式化提示词并按库存规划的批量追加数量要求（需要访问牌组，须在 Anki 进程内调用）"""
         formatted_prompt = self.format_prompt(config, keyword, prompt)
-
+        if sentence_count and sentence_count != 5:
+            formatted_prompt += self.COUNT_PROMPT_SUFFIX.format(count=sentence_count)
+        if sentence_only:
+            formatted_prompt += self.SENTENCE_ONLY_PROMPT_SUFFIX
+        return formatted_prompt
+
+    def generate_from_prompt(self, config, keyword, formatted_prompt, purpose="generate", sentence_count=None):
+        """对已格式化的提示词发送请求、解析并校验，返回例句对列表。
+        不访问牌组，可在独立的生成进程中调用"""
         try:
-            response = self.get_api_response(config, formatted_prompt)
-            message_content = self.get_message_content(response, keyword)
-            sentence_pairs = self.parse_response(message_content, keyword)
+            sentence_pairs = self.request_sentence_pairs(config, formatted_prompt, keyword, purpose, sentence_count)
             if not sentence_pairs:
                 return []
-            return sentence_pairs
+            if sentence_count:
+                sentence_pairs = sentence_pairs[:sentence_count]
+            if not config.get("sentence_validation_enabled", True):
+                return sentence_pairs
+            return self.validate_and_refill(config, keyword, formatted_prompt, sentence_pairs)
         except Exception as e:
             print(f"错误：[generate] 关键字 '{keyword}' 出现意外错误：{type(e).__name__} - {e}")
             traceback.print_exc()
             return []
 
+    def request_sentence_pairs(self, config, formatted_prompt, keyword, purpose="generate", sentence_count=None):
+        """发送一次生成请求并解析为例句对列表；给出 sentence_count 时按其估算输出上限"""
+        if is_local_url(config.get("api_url", "")):
+            # 本地模型走专用通道：Ollama 原生接口 + keep_alive，输出长度封顶
+            message_content = local_backend.chat(config, formatted_prompt, purpose, sentence_count or 5)
+        else:
+            max_tokens = self.remote_max_tokens(config, sentence_count)
+            response = self.get_api_response(config, formatted_prompt, purpose, max_tokens)
+            message_content = self.get_message_content(response, keyword)
+        return self.parse_response(message_content, keyword)
+
+    def validate_and_refill(self, config, keyword, formatted_prompt, sentence_pairs):
+        """
+        校验例句（关键词出现 + 去重），只为被拒绝的槽位补生成，并按模型记录拒绝数。
+        若全部被拒且补生成也失败，返回空列表：不合格的例句不进缓存，
+        关键词留待下次缓存未命中时重新入队。
+        """
+        language = config.get("learning_language", self.DEFAULT_CONFIG["learning_language"])
+        model_name = config.get("model_name", "")
+        existing_pairs = load_cache(keyword) or []
+
+        accepted, missing, duplicate = validate_sentence_pairs(sentence_pairs, keyword, language, existing_pairs)
+        record_validation(model_name, len(sentence_pairs), len(missing), len(duplicate))
+        rejected_count = len(missing) + len(duplicate)
+        if rejected_count:
+            print(f"DEBUG: 关键词 '{keyword}' 校验拒绝 {rejected_count} 句"
+                  f"（缺少关键词 {len(missing)}，重复 {len(duplicate)}）")
+
+        rounds = 0
+        while rejected_count and rounds < self.MAX_REFILL_ROUNDS:
+            rounds += 1
+            known_pairs = existing_pairs + accepted
+            refill_prompt = formatted_prompt + self.REFILL_PROMPT_SUFFIX.format(
+                count=rejected_count,
+                world=strip_gloss(keyword),
+                existing="\n".join(f"- {pair[0]}" for pair in known_pairs) or "- （无）",
+            )
+            refill_pairs = self.request_sentence_pairs(config, refill_prompt, keyword, "refill",
+                                                       rejected_count)[:rejected_count]
+            if not refill_pairs:
+                break
+            new_accepted, missing, duplicate = validate_sentence_pairs(refill_pairs, keyword, language, known_pairs)
+            record_validation(model_name, len(refill_pairs), len(missing), len(duplicate))
+            accepted.extend(new_accepted)
+            rejected_count -= len(new_accepted)
+
+        if not accepted:
+            print(f"WARNING: 关键词 '{keyword}' 的例句全部未通过校验，本次不写入缓存")
+            return []
+        return accepted
+
+    # --- 翻译 ---
+
+    def translate_sentences(self, config, sentences, purpose="translate"):
+        """一次请求翻译多个例句，返回与 sentences 等长的译文列表；失败或数量不符时返回空列表"""
+        if not sentences:
+            return []
+        language = config.get("learning_language", self.DEFAULT_CONFIG["learning_language"])
+        prompt = self.TRANSLATION_PROMPT_TEMPLATE.format(
+            count=len(sentences),
+            language=language,
+            sentences="\n".join(f"{i + 1}. {sentence}" for i, sentence in enumerate(sentences)),
+        )
+        try:
+            if is_local_url(config.get("api_url", "")):
+                message_content = local_backend.chat(config, prompt, purpose, len(sentences))
+            else:
+                max_tokens = self.remote_max_tokens(config, len(sentences))
+                response = self.get_api_response(config, prompt, purpose, max_tokens)
+                message_content = self.get_message_content(response, "translation")
+            translations = self.parse_translations(message_content)
+        except Exception as e:
+            print(f"错误：[translate_sentences] 翻译 {len(sentences)} 个例句失败：{type(e).__name__} - {e}")
+            return []
+        if len(translations) != len(sentences):
+            print(f"错误：[translate_sentences] 请求 {len(sentences)} 句，返回 {len(translations)} 句译文")
+            return []
+        return translations
+
+    @staticmethod
+    def parse_translations(message_content):
+        """把翻译响应解析为译文列表"""
+        if not message_content:
+            return []
+        try:
+            content_json = json.loads(message_content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'\{.*\}', message_content, re.DOTALL)
+            if not json_match:
+                print(f"错误：[parse_translations] 响应中未找到JSON内容：{message_content[:300]}")
+                return []
+            try:
+                content_json = json.loads(json_match.group())
+            except json.JSONDecodeError:
+                print(f"错误：[parse_translations] 响应非JSON格式：{message_content[:300]}")
+                return []
+        translations = content_json.get("translations") if isinstance(content_json, dict) else None
+        if not isinstance(translations, list) or not all(isinstance(t, str) for t in translations):
+            print("错误：[parse_translations] 未找到有效translations列表")
+            return []
+        return translations
+
     # --- API通信 ---
 
-    def get_api_response(self, config, formatted_prompt):
+    @staticmethod
+    def remote_max_tokens(config, sentence_count):
+        """远程接口的输出上限，默认不设（remote_max_tokens_enabled 为 false）：
+        推理模型的思考过程也计入上限，设了反而可能返回空内容"""
+        if not sentence_count or not config.get("remote_max_tokens_enabled", False):
+            return None
+        return estimate_max_tokens(config, sentence_count)
+
+    @staticmethod
+    def max_tokens_field(model_name) -> str:
+        """OpenAI o 系列与 gpt-5 不接受 max_tokens，须改用 max_completion_tokens"""
+        name = (model_name or "").lower().rsplit("/", 1)[-1]
+        if re.match(r"o\d", name) or name.startswith("gpt-5"):
+            return "max_completion_tokens"
+        return "max_tokens"
+
+    def get_api_response(self, config, formatted_prompt, purpose="generate", max_tokens=None):
         api_url = config.get("api_url")
         api_key = config.get("api_key")
         model_name = config.get("model_name")
+        start_time = time.time()
         try:
             final_prompt = formatted_prompt
             if model_name and "qwen3" in model_name.lower():
                 final_prompt = formatted_prompt + "/no_think"
 
+            payload = {
+                "model": model_name,
+                "messages": [{"role": "user", "content": final_prompt}],
+            }
             if self.support_thinking:
-                response = requests.post(
-                    api_url,
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": model_name,
-                        "messages": [{"role": "user", "content": final_prompt}],
-                        "thinking": {"type": "disabled"}
-                    },
-                    timeout=30
-                )
-            else:
-                response = requests.post(
-                    api_url,
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": model_name,
-                        "messages": [{"role": "user", "content": final_prompt}],
-                    },
-                    timeout=30
-                )
+                payload["thinking"] = {"type": "disabled"}
+            if max_tokens:
+                payload[self.max_tokens_field(model_name)] = max_tokens
+            response = llm_transport.post(
+                api_url,
+                headers={"Authorization": f"Bearer {api_key}"},
+                json=payload,
+                timeout=30
+            )
 
             if response.status_code != 200:
                 try:
@@ -210,14 +411,47 @@ class AISentenceGenerator:
                 except:
                     pass
 
+            self.record_response_usage(purpose, model_name, response, start_time)
             return response
         except requests.exceptions.RequestException as e:
             print(f"错误：[get_api_response] 网络错误：{e}")
+            log_usage(purpose, model_name, None, start_time, "network_error")
             return None
         except Exception as e:
             print(f"错误：[get_api_response] 意外错误：{type(e).__name__} - {e}")
+            log_usage(purpose, model_name, None, start_time, "error")
             return None
 
+    # --- 用量统计 ---
+
+    @staticmethod
+    def extract_usage(usage) -> tuple:
+        """从 OpenAI 兼容的 usage 块中提取 (prompt, completion, cached) token 数。
+        缓存命中数兼容 OpenAI 的 prompt_tokens_details.cached_tokens 与
+        DeepSeek 的 prompt_cache_hit_tokens 两种写法"""
+        if not isinstance(usage, dict):
+            return 0, 0, 0
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        cached_tokens = (details.get("cached_tokens") if isinstance(details, dict) else 0) \
+            or usage.get("prompt_cache_hit_tokens") or 0
+        return prompt_tokens, completion_tokens, cached_tokens
+
+    @staticmethod
+    def record_response_usage(purpose, model_name, response, start_time):
+        """解析非流式响应的 usage 块并写入用量账本"""
+        usage = None
+        if response is not None and response.status_code == 200:
+            status = "ok"
+            try:
+                usage = response.json().get("usage")
+            except Exception:
+                usage = None
+        else:
+            status = f"http_{response.status_code}" if response is not None else "error"
+        log_usage(purpose, model_name, usage, start_time, status)
+
     @staticmethod
     def get_message_content(response, keyword):
         if response is None:
@@ -279,51 +513,105 @@ class AISentenceGenerator:
 
     # --- 难度关键词 ---
 
+    @classmethod
+    def _is_difficult(cls, difficulty) -> bool:
+        return difficulty is not None and (difficulty - 1) / 9 >= cls.DIFFICULTY_THRESHOLD
+
+    def _build_difficulty_index(self, config):
+        """一次搜索 + 一次 SQL 批量读取所有难词卡片的难度和关键词字段"""
+        from anki.utils import ids2str
+
+        deck_name, field_index = config.base_deck_name, config.field_index
+        if not deck_name:
+            print("ERROR: 未获取到有效牌组名称")
+            return {}
+
+        query = f'"deck:{deck_name}" is:review prop:d>={self.DIFFICULTY_THRESHOLD}'
+        card_ids = aqt.mw.col.find_cards(query)
+        if not card_ids:
+            print("INFO: 牌组中无符合条件的复习卡片")
+            return {}
+
+        index = {}
+        rows = aqt.mw.col.db.all(
+            f"SELECT c.id, c.data, n.flds FROM cards c JOIN notes n ON n.id = c.nid WHERE c.id IN {ids2str(card_ids)}"
+        )
+        for cid, data, flds in rows:
+            try:
+                difficulty = json.loads(data).get("d") if data else None
+                if difficulty is None:
+                    continue
+                fields = flds.split("\x1f")
+                raw_keyword = fields[field_index] if field_index < len(fields) else fields[0]
+                keyword = clean_html(raw_keyword)
+                if keyword:
+                    index[cid] = (difficulty, keyword)
+            except Exception as e:
+                print(f"ERROR: 处理卡片{cid}时出错: {str(e)}")
+                continue
+        return index
+
     def get_top_difficulty_keywords(self):
-        """返回学过的单词中难度排名前N的关键词列表，N由配置决定"""
+        """返回学过的单词中难度排名前N的关键词列表，N由配置决定。
+        结果缓存到 clear_cache() 或复习事件使其失效为止"""
         config = get_config()
         try:
-            deck_name = config.get("deck_name")
-            if not deck_name:
-                print("ERROR: 未获取到有效牌组名称")
-                return []
+            with self._difficulty_lock:
+                if self._top_difficulty_keywords is not None:
+                    return self._top_difficulty_keywords
 
-            query = f"deck:{deck_name} is:review prop:d>=0.6"
-            card_ids = aqt.mw.col.find_cards(query)
-            if not card_ids:
-                print("INFO: 牌组中无符合条件的复习卡片")
-                return []
+                if self._difficulty_index is None:
+                    self._difficulty_index = self._build_difficulty_index(config)
 
-            difficulty_keywords = []
-            for cid in card_ids:
-                card = aqt.mw.col.get_card(cid)
-                try:
-                    raw_keyword = card.note().fields[0] if card.note().fields else ""
-                    keyword = clean_html(raw_keyword)
-                    if not keyword:
-                        continue
-
-                    if card.memory_state is None:
-                        continue
-                    difficulty = card.memory_state.difficulty
-
-                    difficulty_keywords.append((difficulty, keyword))
-                except Exception as e:
-                    print(f"ERROR: 处理卡片{cid}时出错: {str(e)}")
-                    continue
-
-            difficulty_keywords.sort(reverse=True, key=lambda x: x[0])
-            top_n = config.get("second_keywords_top_n", 100)
-            top_keywords = [kw for (diff, kw) in difficulty_keywords[:top_n]]
-            return top_keywords
+                top_n = config.get("second_keywords_top_n", 100)
+                top_entries = heapq.nlargest(top_n, self._difficulty_index.values(), key=lambda x: x[0])
+                self._top_difficulty_keywords = [kw for (diff, kw) in top_entries]
+                return self._top_difficulty_keywords
 
         except Exception as e:
             print(f"ERROR: 获取难度排名关键词失败: {str(e)}")
             return []
 
+    def on_card_reviewed(self, card):
+        """复习事件回调：增量更新单张卡片在难词索引中的条目（在主线程调用）"""
+        with self._difficulty_lock:
+            if self._difficulty_index is None:
+                return
+        try:
+            config = get_config()
+            if not deck_resolver.is_target_deck(card.did):
+                return
+            field_index = config.field_index
+
+            memory_state = card.memory_state
+            difficulty = memory_state.difficulty if memory_state is not None else None
+            # is:review 包含复习和重学中的卡片（type 2/3）
+            entry = None
+            if card.type in (2, 3) and self._is_difficult(difficulty):
+                fields = card.note().fields
+                raw_keyword = fields[field_index] if field_index < len(fields) else fields[0]
+                keyword = clean_html(raw_keyword)
+                if keyword:
+                    entry = (difficulty, keyword)
+        except Exception as e:
+            print(f"ERROR: 更新难词索引失败: {str(e)}")
+            return
+
+        with self._difficulty_lock:
+            if self._difficulty_index is None:
+                return
+            if entry is None:
+                if self._difficulty_index.pop(card.id, None) is None:
+                    return
+            else:
+                self._difficulty_index[card.id] = entry
+            self._top_difficulty_keywords = None
+
     def clear_cache(self):
         """清除第二关键词缓存，使配置变更立即生效"""
-        self._top_difficulty_keywords = []
+        with self._difficulty_lock:
+            self._difficulty_index = None
+            self._top_difficulty_keywords = None
 
     # --- 模型列表 ---
 
@@ -382,13 +670,15 @@ class AISentenceGenerator:
             "Content-Type": "application/json",
         }
 
+        start_time = time.time()
         try:
-            response = requests.post(
+            response = llm_transport.post(
                 api_url,
                 headers=headers,
                 json=payload,
                 timeout=timeout_seconds
             )
+            self.record_response_usage("test", model_name, response, start_time)
 
             if response.status_code != 200:
                 error_msg_detail = "Unknown error"
@@ -433,6 +723,48 @@ class AISentenceGenerator:
 _generator = AISentenceGenerator()
 
 
+def log_usage(purpose, model_name, usage, start_time, status="ok"):
+    """写入一条用量记录。usage 为响应中的 usage 块（可为 None），
+    start_time 为请求发出时的 time.time()，供流式调用方（AI 解释等）复用"""
+    prompt_tokens, completion_tokens, cached_tokens = AISentenceGenerator.extract_usage(usage)
+    latency_ms = int((time.time() - start_time) * 1000)
+    record_usage(purpose, model_name, prompt_tokens, completion_tokens, cached_tokens,
+                 latency_ms, status)
+
+
+def stream_payload(model_name, messages):
+    """流式对话（AI 解释）的请求体。OpenAI 兼容服务只有在 stream_options.include_usage
+    为真时才在最后一帧返回 usage，否则用量账本只能记 0"""
+    payload = {"model": model_name, "messages": messages, "stream": True}
+    if support_thinking:
+        payload["thinking"] = {"type": "disabled"}
+    if support_stream_usage:
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def downgrade_stream_payload(error_body) -> bool:
+    """流式请求被拒绝时，按错误信息关闭不被支持的字段；返回是否值得重试"""
+    global support_thinking, support_stream_usage
+    body = (error_body or "").lower()
+    retry = False
+    if support_thinking and "thinking" in body:
+        _generator.support_thinking = False
+        support_thinking = False
+        retry = True
+    if support_stream_usage and "stream_options" in body:
+        support_stream_usage = False
+        retry = True
+    return retry
+
+
+def estimate_chat_usage(messages, reply):
+    """服务端没有返回 usage 帧时，按提示词与回复文本估算 token，格式同 usage 块"""
+    prompt = "".join(m.get("content") or "" for m in messages)
+    return {"prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(reply) if reply else 0}
+
+
 def _sync_support_thinking(value):
     """同步模块级别的 support_thinking 变量"""
     global support_thinking
@@ -441,29 +773,62 @@ def _sync_support_thinking(value):
 
 # --- 向后兼容的模块级常量 ---
 DEFAULT_PROMPT_TEMPLATE = AISentenceGenerator.DEFAULT_PROMPT_TEMPLATE
+COMPACT_PROMPT_TEMPLATE = AISentenceGenerator.COMPACT_PROMPT_TEMPLATE
+BUILTIN_PROMPT_NAMES = list(AISentenceGenerator.builtin_prompts())
 DEFAULT_FORMAT_NORMAL = AISentenceGenerator.DEFAULT_FORMAT_NORMAL
 DEFAULT_FORMAT_HIGHLIGHT = AISentenceGenerator.DEFAULT_FORMAT_HIGHLIGHT
 DEFAULT_CONFIG = AISentenceGenerator.DEFAULT_CONFIG
 support_thinking = True
+# 流式调用是否请求 usage 帧（stream_options.include_usage）；服务端拒绝该字段时关闭
+support_stream_usage = True
 
 
 # --- 向后兼容的模块级函数 ---
-def generate_ai_sentence(config, keyword, prompt=None):
-    return _generator.generate(config, keyword, prompt)
+def generate_ai_sentence(config, keyword, prompt=None, purpose="generate", sentence_count=None, sentence_only=False):
+    return _generator.generate(config, keyword, prompt, purpose, sentence_count, sentence_only)
+
+
+def build_generation_prompt(config, keyword, prompt=None, sentence_count=None, sentence_only=False):
+    return _generator.build_prompt(config, keyword, prompt, sentence_count, sentence_only)
+
+
+def generate_from_prompt(config, keyword, formatted_prompt, purpose="generate", sentence_count=None):
+    return _generator.generate_from_prompt(config, keyword, formatted_prompt, purpose, sentence_count)
+
+
+def translate_sentences(config, sentences, purpose="translate"):
+    return _generator.translate_sentences(config, sentences, purpose)
 
 
 def get_prompts(config):
     return _generator.get_prompts(config)
 
 
-def get_api_response(config, formatted_prompt):
-    return _generator.get_api_response(config, formatted_prompt)
+def get_builtin_prompts():
+    return AISentenceGenerator.builtin_prompts()
+
+
+def estimate_tokens(text):
+    return AISentenceGenerator.estimate_tokens(text)
+
+
+def get_api_response(config, formatted_prompt, purpose="generate"):
+    return _generator.get_api_response(config, formatted_prompt, purpose)
 
 
 def get_message_content(response, keyword):
     return AISentenceGenerator.get_message_content(response, keyword)
 
 
+def get_response_usage(response):
+    """非流式响应的 (输入, 输出, 缓存命中) token 数；响应缺少 usage 块时返回 None"""
+    try:
+        usage = response.json().get("usage") if response is not None and response.status_code == 200 else None
+    except Exception:
+        usage = None
+    return AISentenceGenerator.extract_usage(usage) if usage else None
+
+
 def parse_message_content_to_sentence_pairs(message_content, keyword):
     return AISentenceGenerator.parse_response(message_content, keyword)
 
@@ -472,6 +837,14 @@ def get_top_difficulty_keywords():
     return _generator.get_top_difficulty_keywords()
 
 
+def on_card_reviewed(card):
+    _generator.on_card_reviewed(card)
+
+
+def clear_difficulty_cache():
+    _generator.clear_cache()
+
+
 def fetch_available_models(api_url: str, api_key: str) -> list:
     return AISentenceGenerator.fetch_available_models(api_url, api_key)
 
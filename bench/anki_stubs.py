@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+aqt / anki 替身 —— 让插件的生成管线（任务管理器、生成器、缓存）脱离 Anki 运行。
+
+只实现管线实际用到的接口：
+- aqt.mw.addonManager.getConfig / addonConfigDefaults / writeConfig
+- aqt.mw.taskman.run_on_main（直接在调用线程执行）
+- aqt.mw.col.find_cards / db.all / decks.name / decks.all_names_and_ids / sched.get_queued_cards（返回空结果）
+- aqt.gui_hooks（仅提供被追加回调的列表）
+- aqt.utils.showInfo / tooltip（打印或忽略）
+- anki.cards.Card、anki.utils.ids2str
+"""
+
+import sys
+import types
+
+
+class _AddonManager:
+    def __init__(self, config: dict):
+        self.config = config
+
+    def getConfig(self, name):
+        return self.config
+
+    def addonConfigDefaults(self, name):
+        return {}
+
+    def writeConfig(self, name, config):
+        self.config = config
+
+
+class _TaskManager:
+    @staticmethod
+    def run_on_main(fn):
+        fn()
+
+
+class _Decks:
+    @staticmethod
+    def name(did):
+        return ""
+
+    @staticmethod
+    def all_names_and_ids():
+        return []
+
+
+class _QueuedCards:
+    cards = []
+
+
+class _Scheduler:
+    @staticmethod
+    def get_queued_cards(fetch_limit=None, intraday_learning_only=False):
+        return _QueuedCards()
+
+
+class _Db:
+    @staticmethod
+    def all(sql, *args):
+        return []
+
+
+class _Collection:
+    decks = _Decks()
+    sched = _Scheduler()
+    db = _Db()
+
+    @staticmethod
+    def find_cards(query):
+        return []
+
+    @staticmethod
+    def get_card(cid):
+        raise KeyError(cid)
+
+
+class _MainWindow:
+    def __init__(self, config: dict):
+        self.addonManager = _AddonManager(config)
+        self.taskman = _TaskManager()
+        self.col = _Collection()
+
+
+class Card:
+    def __init__(self, col=None, backend_card=None):
+        self.did = 0
+
+
+def install(config: dict):
+    """注册替身模块到 sys.modules，返回替身 mw；须在导入插件模块之前调用"""
+    mw = _MainWindow(config)
+
+    aqt = types.ModuleType("aqt")
+    aqt.mw = mw
+    aqt.appVersion = "bench"
+    utils = types.ModuleType("aqt.utils")
+    utils.showInfo = lambda msg, *args, **kwargs: print(f"showInfo: {msg}")
+    utils.tooltip = lambda *args, **kwargs: None
+    aqt.utils = utils
+    gui_hooks = types.SimpleNamespace(operation_did_execute=[], profile_did_open=[])
+    aqt.gui_hooks = gui_hooks
+
+    anki = types.ModuleType("anki")
+    anki_cards = types.ModuleType("anki.cards")
+    anki_cards.Card = Card
+    anki_utils = types.ModuleType("anki.utils")
+    anki_utils.ids2str = lambda ids: "(" + ",".join(str(i) for i in ids) + ")"
+    anki.cards = anki_cards
+    anki.utils = anki_utils
+
+    sys.modules.update({
+        "aqt": aqt,
+        "aqt.utils": utils,
+        "anki": anki,
+        "anki.cards": anki_cards,
+        "anki.utils": anki_utils,
+    })
+    return mw
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+OpenAI 兼容的 chat/completions 模拟服务。
+
+- 延迟：每个请求 latency ± jitter 秒（均匀分布）
+- 错误：按 error_rate 概率返回 500
+- 限流：同时处理的请求超过 rate_limit 时返回 429（0 表示不限流）
+- 响应：从提示词中取出关键词，返回 5 个包含关键词的例句，附带 usage 块；
+  按 missing_rate 概率让单个例句不含关键词，用于触发校验补生成
+- /props 返回 total_slots，可模拟 llama.cpp server 的并行槽位
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSettings:
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, rate_limit=0, missing_rate=0.0, slots=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.missing_rate = missing_rate
+        self.slots = slots
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+
+def _extract_keyword(prompt: str) -> str:
+    match = re.search(r"关键词 '([^']+)'", prompt)
+    return match.group(1) if match else "word"
+
+
+def _build_sentences(keyword: str, missing_rate: float) -> list:
+    pairs = []
+    for i in range(5):
+        if random.random() < missing_rate:
+            pairs.append([f"Sentence number {i} about nothing in particular {random.random():.6f}.", "无关键词的例句。"])
+        else:
+            pairs.append([f"Example {i}: the {keyword} appears in context {random.random():.6f}.", f"例句{i}。"])
+    return pairs
+
+
+def make_handler(settings: MockSettings, stats: MockStats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, obj, extra_headers=None):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (extra_headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/props" and settings.slots:
+                self._send_json(200, {"total_slots": settings.slots})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            with stats.lock:
+                stats.requests += 1
+                if settings.rate_limit and stats.in_flight >= settings.rate_limit:
+                    stats.rate_limited += 1
+                    limited = True
+                else:
+                    stats.in_flight += 1
+                    limited = False
+            if limited:
+                self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "1"})
+                return
+
+            try:
+                delay = max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter))
+                time.sleep(delay)
+                if random.random() < settings.error_rate:
+                    with stats.lock:
+                        stats.errors += 1
+                    self._send_json(500, {"error": {"message": "mock internal error"}})
+                    return
+
+                prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+                content = json.dumps({"sentences": _build_sentences(_extract_keyword(prompt), settings.missing_rate)},
+                                     ensure_ascii=False)
+                self._send_json(200, {
+                    "choices": [{"message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": len(prompt) // 2, "completion_tokens": len(content) // 2},
+                })
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+    return Handler
+
+
+def start_mock_server(settings: MockSettings, host="127.0.0.1", port=0):
+    """在后台线程启动模拟服务，返回 (server, stats, base_url)"""
+    stats = MockStats()
+    server = ThreadingHTTPServer((host, port), make_handler(settings, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats, f"http://{host}:{server.server_port}"
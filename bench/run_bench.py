@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+生成管线基准测试 —— 脱离 Anki 运行，作为后续性能改动的对比基线。
+
+用法（在仓库根目录）：
+    python bench/run_bench.py
+    python bench/run_bench.py --keywords 200 --latency 0.8 --error-rate 0.05 --rate-limit 4
+    python bench/run_bench.py --local --slots 4          # 模拟 llama.cpp 本地服务
+    python bench/run_bench.py --replay cache/llm_cassette.jsonl --replay-speed 0
+    python bench/run_bench.py --json bench_output.json   # 保存结果
+
+输出指标：
+- 管线吞吐：关键词/秒，紧急（优先级 0）与预取任务的 入队→入缓存 耗时 p50/p95，失败数
+- 队列重组：reorganize_queue 在不同队列规模下的耗时
+- SQLite：缓存中已有 1k / 10k / 100k 个词时 load_cache（冷/热）、save_cache、pop_cache 的延迟
+- 例句校验：英语关键词匹配的正反例（book/booking、king/kingdom 等）是否判定正确
+
+注意：远程模式的服务地址不能包含 localhost / 127.0.0.1（否则会被识别为本地模型），
+默认使用 127.0.0.2（Linux 回环网段）；macOS 上请用 --host 指定本机局域网 IP。
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+PACKAGE_NAME = "contextflow"
+
+sys.path.insert(0, BENCH_DIR)
+import anki_stubs  # noqa: E402
+from mock_server import MockSettings, start_mock_server  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize_ms(values) -> dict:
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.mean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+    }
+
+
+def load_bench_config(overrides: dict) -> dict:
+    with open(os.path.join(ROOT, "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config.update({
+        "api_key": "bench",
+        "model_name": "mock-model",
+        "learning_language": "英语",
+        "second_keywords_enabled": False,
+    })
+    config.update(overrides)
+    return config
+
+
+def load_addon(config: dict) -> dict:
+    """安装替身后以包名 contextflow 导入插件模块（不执行插件的 __init__.py）"""
+    anki_stubs.install(config)
+
+    real_db = os.path.join(ROOT, "cache", "sentence_cache.db")
+    db_existed = os.path.exists(real_db)
+
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [ROOT]
+    sys.modules[PACKAGE_NAME] = package
+    modules = {
+        "cache_manager": importlib.import_module(f"{PACKAGE_NAME}.cache.cache_manager"),
+        "api_client": importlib.import_module(f"{PACKAGE_NAME}.api_client"),
+        "task_manager": importlib.import_module(f"{PACKAGE_NAME}.task_manager"),
+        "llm_transport": importlib.import_module(f"{PACKAGE_NAME}.llm_transport"),
+        "sentence_validator": importlib.import_module(f"{PACKAGE_NAME}.sentence_validator"),
+    }
+    # cache_manager 导入时会在插件目录初始化数据库；基准测试不应留下该文件
+    if not db_existed and os.path.exists(real_db):
+        os.remove(real_db)
+    return modules
+
+
+def use_fresh_db(cache_manager, workdir: str, name: str) -> str:
+    path = os.path.join(workdir, f"{name}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    cache_manager.DB_FILE = path
+    cache_manager._memory_cache.clear()
+    cache_manager._init_db()
+    return path
+
+
+# --- 管线吞吐 ---
+
+def bench_pipeline(modules: dict, config: dict, args) -> dict:
+    cache_manager = modules["cache_manager"]
+    manager = modules["task_manager"].SentenceTaskManager()
+
+    enqueued_at, finished_at, kinds = {}, {}, {}
+    manager.on_keyword_ready = lambda kw, pair: finished_at.setdefault(kw, time.perf_counter())
+    manager.start(config)
+    if args.local:
+        # 本地模式下槽位探测在后台线程完成，等待其结束再计时
+        time.sleep(1.0)
+
+    prefetch = [f"prefetch{i}" for i in range(args.keywords)]
+    urgent = [f"urgent{i}" for i in range(args.urgent)]
+
+    start = time.perf_counter()
+    for kw in prefetch:
+        enqueued_at[kw] = start
+        kinds[kw] = "prefetch"
+    manager.reorganize_queue(prefetch)
+
+    for kw in urgent:
+        time.sleep(args.urgent_interval)
+        enqueued_at[kw] = time.perf_counter()
+        kinds[kw] = "urgent"
+        manager.reorganize_queue(kw)
+
+    total = len(prefetch) + len(urgent)
+    deadline = start + args.timeout
+    while len(finished_at) < total and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    end = max(finished_at.values()) if finished_at else time.perf_counter()
+
+    manager.stop_event.set()
+    manager.executor.shutdown(wait=True)
+
+    latencies = {"urgent": [], "prefetch": []}
+    failed = 0
+    for kw, done in finished_at.items():
+        if cache_manager.load_cache(kw):
+            latencies[kinds[kw]].append(done - enqueued_at[kw])
+        else:
+            failed += 1
+    succeeded = len(latencies["urgent"]) + len(latencies["prefetch"])
+
+    return {
+        "workers": manager.max_workers,
+        "keywords": total,
+        "succeeded": succeeded,
+        "failed": failed,
+        "unfinished": total - len(finished_at),
+        "wall_s": round(end - start, 3),
+        "keywords_per_s": round(succeeded / (end - start), 3) if end > start else 0.0,
+        "urgent_time_to_cache": summarize_ms(latencies["urgent"]),
+        "prefetch_time_to_cache": summarize_ms(latencies["prefetch"]),
+    }
+
+
+# --- 队列重组 ---
+
+def bench_reorganize(modules: dict, sizes, repeats: int) -> dict:
+    results = {}
+    for size in sizes:
+        manager = modules["task_manager"].SentenceTaskManager()
+        window = [f"queued{i}" for i in range(size)]
+        manager.reorganize_queue(window)
+
+        shifts, urgents = [], []
+        for r in range(repeats):
+            # 模拟复习推进：窗口前移一位并追加新词
+            window = window[1:] + [f"new{r}"]
+            t = time.perf_counter()
+            manager.reorganize_queue(window)
+            shifts.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            manager.reorganize_queue(random.choice(window))
+            urgents.append(time.perf_counter() - t)
+
+        results[str(size)] = {"window_shift": summarize_ms(shifts), "urgent_single": summarize_ms(urgents)}
+    return results
+
+
+# --- SQLite ---
+
+def _populate(db_path: str, count: int) -> list:
+    words = [f"word{i}" for i in range(count)]
+    pairs = json.dumps([[f"Sentence {j} with a word.", f"例句{j}。"] for j in range(5)], ensure_ascii=False)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT OR REPLACE INTO cache (word, sentence_pairs, sentence_count) VALUES (?, ?, 5)",
+        ((w, pairs) for w in words),
+    )
+    conn.commit()
+    conn.close()
+    return words
+
+
+def bench_sqlite(modules: dict, workdir: str, sizes, samples: int) -> dict:
+    cache_manager = modules["cache_manager"]
+    new_pairs = [["A fresh sentence with a word.", "新例句。"]]
+    results = {}
+    for size in sizes:
+        db_path = use_fresh_db(cache_manager, workdir, f"sqlite_{size}")
+        words = _populate(db_path, size)
+        sample = random.sample(words, min(samples, len(words)))
+
+        timings = {"load_cold": [], "load_warm": [], "save": [], "pop": []}
+        for i, word in enumerate(sample):
+            cache_manager._memory_cache.pop(word, None)
+            t = time.perf_counter()
+            cache_manager.load_cache(word)
+            timings["load_cold"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            cache_manager.load_cache(word)
+            timings["load_warm"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            cache_manager.save_cache(f"saved{i}", new_pairs)
+            timings["save"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            cache_manager.pop_cache(word)
+            timings["pop"].append(time.perf_counter() - t)
+
+        results[str(size)] = {op: summarize_ms(values) for op, values in timings.items()}
+    return results
+
+
+# --- 例句校验 ---
+
+# (关键词, 例句, 是否应判定为包含关键词)
+VALIDATOR_PROBES = [
+    ("book", "I am booking a room for tonight.", False),
+    ("king", "The kingdom lasted for centuries.", False),
+    ("book", "She booked two tickets.", True),
+    ("book", "He left his books at school.", True),
+    ("book", "I bought a new notebook.", True),
+    ("king", "The two kings signed a treaty.", True),
+    ("run", "He was running late.", True),
+    ("walk", "She walked home alone.", True),
+    ("go", "They went to the market.", True),
+    ("read", "I am reading a book.", True),
+    ("develop", "She is developing a new app.", True),
+    ("achieve", "We are achieving our goals.", True),
+    ("big", "Their house is bigger than ours.", True),
+    ("swim", "She swam across the lake.", True),
+]
+
+
+def bench_validator(modules: dict) -> dict:
+    contains_keyword = modules["sentence_validator"].contains_keyword
+    mismatches = []
+    for keyword, sentence, expected in VALIDATOR_PROBES:
+        if contains_keyword(sentence, keyword, "英语") != expected:
+            mismatches.append({"keyword": keyword, "sentence": sentence, "expected": expected})
+    return {"probes": len(VALIDATOR_PROBES), "mismatches": mismatches}
+
+
+# --- 输出 ---
+
+def print_report(report: dict) -> None:
+    p = report.get("pipeline")
+    if p:
+        print("\n== 管线吞吐 ==")
+        print(f"并发 {p['workers']}，关键词 {p['keywords']}，成功 {p['succeeded']}，失败 {p['failed']}，"
+              f"未完成 {p['unfinished']}，耗时 {p['wall_s']}s，{p['keywords_per_s']} 词/秒")
+        for kind in ("urgent", "prefetch"):
+            s = p[f"{kind}_time_to_cache"]
+            print(f"  {kind:<8} 入队→入缓存  n={s['count']:<5} p50={s['p50_ms']:.1f}ms  p95={s['p95_ms']:.1f}ms")
+        m = report.get("mock_server", {})
+        print(f"  模拟服务：请求 {m.get('requests', 0)}，500 错误 {m.get('errors', 0)}，429 限流 {m.get('rate_limited', 0)}")
+
+    if report.get("reorganize"):
+        print("\n== 队列重组 (reorganize_queue) ==")
+        for size, r in report["reorganize"].items():
+            print(f"  队列 {size:>6}：窗口前移 p50={r['window_shift']['p50_ms']:.3f}ms p95={r['window_shift']['p95_ms']:.3f}ms"
+                  f"  |  单个紧急 p50={r['urgent_single']['p50_ms']:.3f}ms p95={r['urgent_single']['p95_ms']:.3f}ms")
+
+    if report.get("sqlite"):
+        print("\n== SQLite 缓存操作 ==")
+        for size, ops in report["sqlite"].items():
+            cells = "  ".join(f"{op} p50={s['p50_ms']:.3f}/p95={s['p95_ms']:.3f}ms" for op, s in ops.items())
+            print(f"  {size:>7} 词：{cells}")
+
+    v = report.get("validator")
+    if v:
+        print("\n== 例句校验 (contains_keyword) ==")
+        print(f"  用例 {v['probes']}，判定错误 {len(v['mismatches'])}")
+        for m in v["mismatches"]:
+            print(f"  应为 {m['expected']}：'{m['keyword']}' ← {m['sentence']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ContextFlow 生成管线基准测试")
+    parser.add_argument("--keywords", type=int, default=60, help="预取关键词数")
+    parser.add_argument("--urgent", type=int, default=10, help="紧急关键词数")
+    parser.add_argument("--urgent-interval", type=float, default=0.3, help="紧急关键词的注入间隔（秒）")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟服务平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="模拟服务延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--rate-limit", type=int, default=0, help="并发超过该值时返回 429，0 为不限流")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="单个例句不含关键词的概率")
+    parser.add_argument("--local", action="store_true", help="以本地模型（llama.cpp）模式运行")
+    parser.add_argument("--slots", type=int, default=2, help="本地模式下模拟的并行槽位数")
+    parser.add_argument("--host", default="127.0.0.2", help="远程模式下模拟服务的监听地址")
+    parser.add_argument("--replay", help="从 LLM 磁带回放，而不是请求模拟服务")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="回放倍速（2 为两倍速），0 为不等待")
+    parser.add_argument("--timeout", type=float, default=300, help="管线测试的最长等待时间（秒）")
+    parser.add_argument("--reorg-sizes", default="100,1000,5000", help="队列重组测试的队列规模")
+    parser.add_argument("--reorg-repeats", type=int, default=50)
+    parser.add_argument("--sqlite-sizes", default="1000,10000,100000", help="SQLite 测试的缓存词数")
+    parser.add_argument("--sqlite-samples", type=int, default=200)
+    parser.add_argument("--skip", default="", help="跳过的测试，逗号分隔：pipeline,reorganize,sqlite,validator")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+
+    settings = MockSettings(args.latency, args.jitter, args.error_rate, args.rate_limit,
+                            args.missing_rate, args.slots if args.local else 0)
+    host = "127.0.0.1" if args.local else args.host
+    server, mock_stats, base_url = start_mock_server(settings, host=host)
+    if args.local:
+        base_url = base_url.replace("127.0.0.1", "localhost")
+
+    config = load_bench_config({"api_url": f"{base_url}/v1/chat/completions"})
+    modules = load_addon(config)
+    if args.replay:
+        modules["llm_transport"].configure("replay", args.replay, args.replay_speed)
+
+    report = {"args": vars(args)}
+    with tempfile.TemporaryDirectory(prefix="contextflow_bench_") as workdir:
+        if "pipeline" not in skip:
+            use_fresh_db(modules["cache_manager"], workdir, "pipeline")
+            report["pipeline"] = bench_pipeline(modules, config, args)
+            report["mock_server"] = {"requests": mock_stats.requests, "errors": mock_stats.errors,
+                                     "rate_limited": mock_stats.rate_limited}
+        if "reorganize" not in skip:
+            use_fresh_db(modules["cache_manager"], workdir, "reorganize")
+            sizes = [int(s) for s in args.reorg_sizes.split(",") if s]
+            report["reorganize"] = bench_reorganize(modules, sizes, args.reorg_repeats)
+        if "sqlite" not in skip:
+            sizes = [int(s) for s in args.sqlite_sizes.split(",") if s]
+            report["sqlite"] = bench_sqlite(modules, workdir, sizes, args.sqlite_samples)
+        if "validator" not in skip:
+            report["validator"] = bench_validator(modules)
+
+    server.shutdown()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 import json
 import os
 import sqlite3
+import threading
 import aqt
 
 # 缓存文件路径 (使用 __name__ 获取插件目录)
@@ -15,6 +16,10 @@ DB_FILE = os.path.join(ADDON_FOLDER, "sentence_cache.db")
 # 结构: {'word': [ [sentence, translation], ... ], ...}
 _memory_cache = {}
 
+# save_cache / pop_cache 都是"读出 → 修改 → 写回"：不同线程（主线程渲染、预渲染、生成线程）
+# 对同一关键词并发执行时，可能重复取出同一句或丢失例句，这里串行化
+_write_lock = threading.RLock()
+
 
 def _init_db():
     """初始化数据库表"""
@@ -52,7 +57,65 @@ def _init_db():
                 except json.JSONDecodeError:
                     print(f"WARNING: 无法解析单词 '{word}' 的 sentence_pairs。")
             print("DEBUG: 已遍历并更新现有记录的 'sentence_count' 字段。")
-            
+
+        # 用量账本：每次 LLM 调用一行，用于统计 token 消耗、花费与延迟
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS usage_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                purpose TEXT NOT NULL,
+                model TEXT,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                cached_tokens INTEGER DEFAULT 0,
+                latency_ms INTEGER DEFAULT 0,
+                status TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_log_created_at ON usage_log (created_at)")
+
+        # 例句校验记录：每批例句一行，用于统计各模型的拒绝率
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS validation_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT,
+                checked INTEGER DEFAULT 0,
+                rejected_missing INTEGER DEFAULT 0,
+                rejected_duplicate INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # 例句归档：已看完的例句及最近一次显示时间，供间隔复用
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sentence_archive (
+                word TEXT NOT NULL,
+                sentence TEXT NOT NULL,
+                translation TEXT,
+                shown_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                show_count INTEGER DEFAULT 1,
+                PRIMARY KEY (word, sentence)
+            )
+        ''')
+
+        # 例句翻译：两阶段生成时按例句缓存的译文
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS translation_cache (
+                sentence TEXT PRIMARY KEY,
+                translation TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # 例句复用记录：每次以归档例句代替生成记一行
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recycle_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
         conn.commit()
         conn.close()
     except Exception as e:
@@ -114,138 +177,412 @@ def save_cache(word, sentence_pairs=None):
     如果只提供word，则删除该单词的缓存（为了兼容旧接口）
     """
     _init_db()
-    
-    # 先加载现有缓存（会优先走内存缓存），合并现有例句和新例句
-    existing_pairs = load_cache(word)
-    final_pairs = existing_pairs
-    if sentence_pairs:
-        final_pairs = existing_pairs + sentence_pairs
-    
-    sentence_count = len(final_pairs)
+    with _write_lock:
+        # 先加载现有缓存（会优先走内存缓存），合并现有例句和新例句
+        existing_pairs = load_cache(word)
+        final_pairs = existing_pairs
+        if sentence_pairs:
+            final_pairs = existing_pairs + sentence_pairs
+
+        sentence_count = len(final_pairs)
+
+        try:
+            conn = _get_db_connection()
+            if conn is None:
+                return False
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO cache (word, sentence_pairs, sentence_count, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (word, json.dumps(final_pairs, ensure_ascii=False), sentence_count))
+            conn.commit()
+            conn.close()
+
+            # 新增: 数据库写入成功后，更新内存缓存以保持同步
+            _memory_cache[word] = final_pairs
+            # print(f"DEBUG: 内存缓存已更新 '{word}'")
+
+            return True
+        except Exception as e:
+            error_msg = f"保存单词'{word}'缓存失败：{str(e)}"
+            aqt.utils.showInfo(error_msg)
+            print(f"ERROR: {error_msg}")
+            return False
+
+def pop_cache(word):
+    """
+    # 修改: 原子性地取出并删除第一个例句对，并在成功后更新内存缓存。
+    返回取出的例句对 [sentence, translation]，如果没有例句对则返回 None
+    """
+    _init_db()
+    with _write_lock:
+        conn = None # 确保 conn 在 try 外部可见
+        try:
+            conn = _get_db_connection()
+            if conn is None:
+                return None
+
+            cursor = conn.cursor()
+            cursor.execute("BEGIN TRANSACTION")
+
+            cursor.execute("SELECT sentence_pairs FROM cache WHERE word = ?", (word,))
+            row = cursor.fetchone()
+
+            if not row:
+                conn.commit() # 提交空事务
+                # 新增: 如果数据库中没有，也确保内存缓存中没有
+                if word in _memory_cache:
+                    del _memory_cache[word]
+                return None
+
+            sentence_pairs = json.loads(row['sentence_pairs'])
+            if not sentence_pairs:
+                cursor.execute("DELETE FROM cache WHERE word = ?", (word,))
+                conn.commit()
+                # 新增: 更新内存缓存
+                if word in _memory_cache:
+                    del _memory_cache[word]
+                return None
+
+            popped_pair = sentence_pairs.pop(0)
+
+            if sentence_pairs:
+                new_sentence_pairs_json = json.dumps(sentence_pairs, ensure_ascii=False)
+                new_count = len(sentence_pairs)
+                cursor.execute('''
+                    UPDATE cache 
+                    SET sentence_pairs = ?, sentence_count = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE word = ?
+                ''', (new_sentence_pairs_json, new_count, word))
+            else:
+                cursor.execute("DELETE FROM cache WHERE word = ?", (word,))
+
+            conn.commit()
+
+            # 新增: 数据库操作成功后，更新内存缓存
+            _memory_cache[word] = sentence_pairs
+            # print(f"DEBUG: 内存缓存已因 pop 操作更新 '{word}'")
+
+            return popped_pair
 
+        except Exception as e:
+            error_msg = f"取出单词'{word}'缓存失败：{str(e)}"
+            aqt.utils.showInfo(error_msg)
+            print(f"ERROR: {error_msg}")
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception as rb_e:
+                    print(f"ERROR: 回滚事务失败: {rb_e}")
+            return None
+        finally:
+            if conn:
+                conn.close()
+
+
+def record_usage(purpose, model, prompt_tokens=0, completion_tokens=0, cached_tokens=0,
+                 latency_ms=0, status="ok"):
+    """
+    向用量账本追加一条 LLM 调用记录。
+    在工作线程中调用，失败只打印日志，不影响生成流程。
+    """
+    _init_db()
+
+    conn = None
     try:
         conn = _get_db_connection()
         if conn is None:
             return False
+        conn.execute('''
+            INSERT INTO usage_log (purpose, model, prompt_tokens, completion_tokens,
+                                   cached_tokens, latency_ms, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (purpose, model or "", int(prompt_tokens or 0), int(completion_tokens or 0),
+              int(cached_tokens or 0), int(latency_ms or 0), status))
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"ERROR: 写入用量记录失败：{str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_usage_by_day(days=30):
+    """
+    按 (本地日期, 用途, 模型) 汇总最近 days 天的用量账本。
+    返回字典列表：day, purpose, model, calls, errors, prompt_tokens,
+    completion_tokens, cached_tokens, avg_latency_ms
+    """
+    _init_db()
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return []
         cursor = conn.cursor()
-        
         cursor.execute('''
-            INSERT OR REPLACE INTO cache (word, sentence_pairs, sentence_count, updated_at)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (word, json.dumps(final_pairs, ensure_ascii=False), sentence_count))
-        conn.commit()
+            SELECT strftime('%Y-%m-%d', created_at, 'localtime') AS day,
+                   purpose,
+                   model,
+                   COUNT(*) AS calls,
+                   SUM(CASE WHEN status = 'ok' THEN 0 ELSE 1 END) AS errors,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(cached_tokens) AS cached_tokens,
+                   AVG(latency_ms) AS avg_latency_ms
+            FROM usage_log
+            WHERE created_at >= datetime('now', ?)
+            GROUP BY day, purpose, model
+            ORDER BY day
+        ''', (f"-{int(days)} days",))
+        rows = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        
-        # 新增: 数据库写入成功后，更新内存缓存以保持同步
-        _memory_cache[word] = final_pairs
-        # print(f"DEBUG: 内存缓存已更新 '{word}'")
-        
+        return rows
+    except Exception as e:
+        print(f"ERROR: 查询用量统计失败：{str(e)}")
+        return []
+
+
+def record_validation(model, checked, rejected_missing=0, rejected_duplicate=0):
+    """记录一批例句的校验结果：校验总数、因缺少关键词被拒数、因重复被拒数"""
+    _init_db()
+
+    conn = None
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return False
+        conn.execute('''
+            INSERT INTO validation_log (model, checked, rejected_missing, rejected_duplicate)
+            VALUES (?, ?, ?, ?)
+        ''', (model or "", int(checked), int(rejected_missing), int(rejected_duplicate)))
+        conn.commit()
         return True
     except Exception as e:
-        error_msg = f"保存单词'{word}'缓存失败：{str(e)}"
-        aqt.utils.showInfo(error_msg)
-        print(f"ERROR: {error_msg}")
+        print(f"ERROR: 写入校验记录失败：{str(e)}")
         return False
+    finally:
+        if conn:
+            conn.close()
 
-def pop_cache(word):
+
+def get_validation_stats(days=30):
     """
-    # 修改: 原子性地取出并删除第一个例句对，并在成功后更新内存缓存。
-    返回取出的例句对 [sentence, translation]，如果没有例句对则返回 None
+    按模型汇总最近 days 天的例句校验结果。
+    返回字典列表：model, checked, rejected_missing, rejected_duplicate
     """
     _init_db()
-    
-    conn = None # 确保 conn 在 try 外部可见
     try:
         conn = _get_db_connection()
         if conn is None:
-            return None
-        
+            return []
         cursor = conn.cursor()
-        cursor.execute("BEGIN TRANSACTION")
-        
-        cursor.execute("SELECT sentence_pairs FROM cache WHERE word = ?", (word,))
-        row = cursor.fetchone()
-        
-        if not row:
-            conn.commit() # 提交空事务
-            # 新增: 如果数据库中没有，也确保内存缓存中没有
-            if word in _memory_cache:
-                del _memory_cache[word]
+        cursor.execute('''
+            SELECT model,
+                   SUM(checked) AS checked,
+                   SUM(rejected_missing) AS rejected_missing,
+                   SUM(rejected_duplicate) AS rejected_duplicate
+            FROM validation_log
+            WHERE created_at >= datetime('now', ?)
+            GROUP BY model
+            ORDER BY checked DESC
+        ''', (f"-{int(days)} days",))
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    except Exception as e:
+        print(f"ERROR: 查询校验统计失败：{str(e)}")
+        return []
+
+
+def archive_sentence(word, pair):
+    """把已看完的例句写入归档，记录本次显示时间"""
+    _init_db()
+
+    conn = None
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return False
+        conn.execute('''
+            INSERT INTO sentence_archive (word, sentence, translation, shown_at, show_count)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, 1)
+            ON CONFLICT(word, sentence) DO UPDATE SET
+                shown_at = CURRENT_TIMESTAMP,
+                show_count = show_count + 1
+        ''', (word, pair[0], pair[1] if len(pair) > 1 else ""))
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"ERROR: 归档例句失败：{str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def has_recyclable_sentence(word, min_age_days):
+    """是否有最近一次显示早于 min_age_days 天前的归档例句"""
+    _init_db()
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return False
+        row = conn.execute('''
+            SELECT 1 FROM sentence_archive
+            WHERE word = ? AND shown_at <= datetime('now', ?)
+            LIMIT 1
+        ''', (word, f"-{float(min_age_days)} days")).fetchone()
+        conn.close()
+        return row is not None
+    except Exception as e:
+        print(f"ERROR: 查询归档例句失败：{str(e)}")
+        return False
+
+
+def recycle_sentence(word, min_age_days):
+    """
+    取出最久未显示、且最近一次显示早于 min_age_days 天前的归档例句，更新其显示时间并记入复用记录。
+    返回 [sentence, translation]，没有可复用的例句时返回 None
+    """
+    _init_db()
+
+    conn = None
+    try:
+        conn = _get_db_connection()
+        if conn is None:
             return None
-        
-        sentence_pairs = json.loads(row['sentence_pairs'])
-        if not sentence_pairs:
-            cursor.execute("DELETE FROM cache WHERE word = ?", (word,))
-            conn.commit()
-            # 新增: 更新内存缓存
-            if word in _memory_cache:
-                del _memory_cache[word]
+        row = conn.execute('''
+            SELECT sentence, translation FROM sentence_archive
+            WHERE word = ? AND shown_at <= datetime('now', ?)
+            ORDER BY shown_at
+            LIMIT 1
+        ''', (word, f"-{float(min_age_days)} days")).fetchone()
+        if row is None:
             return None
-        
-        popped_pair = sentence_pairs.pop(0)
-        
-        if sentence_pairs:
-            new_sentence_pairs_json = json.dumps(sentence_pairs, ensure_ascii=False)
-            new_count = len(sentence_pairs)
-            cursor.execute('''
-                UPDATE cache 
-                SET sentence_pairs = ?, sentence_count = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE word = ?
-            ''', (new_sentence_pairs_json, new_count, word))
-        else:
-            cursor.execute("DELETE FROM cache WHERE word = ?", (word,))
-        
+        conn.execute(
+            "UPDATE sentence_archive SET shown_at = CURRENT_TIMESTAMP WHERE word = ? AND sentence = ?",
+            (word, row["sentence"]),
+        )
+        conn.execute("INSERT INTO recycle_log (word) VALUES (?)", (word,))
         conn.commit()
-        
-        # 新增: 数据库操作成功后，更新内存缓存
-        _memory_cache[word] = sentence_pairs
-        # print(f"DEBUG: 内存缓存已因 pop 操作更新 '{word}'")
-        
-        return popped_pair
-        
+        return [row["sentence"], row["translation"] or ""]
     except Exception as e:
-        error_msg = f"取出单词'{word}'缓存失败：{str(e)}"
-        aqt.utils.showInfo(error_msg)
-        print(f"ERROR: {error_msg}")
-        if conn:
-            try:
-                conn.rollback()
-            except Exception as rb_e:
-                print(f"ERROR: 回滚事务失败: {rb_e}")
+        print(f"ERROR: 复用归档例句失败：{str(e)}")
         return None
     finally:
         if conn:
             conn.close()
 
 
+def load_translations(sentences):
+    """按例句读取已缓存的译文，返回 {例句: 译文}（只包含命中的例句）"""
+    sentences = [s for s in sentences if s]
+    if not sentences:
+        return {}
+    _init_db()
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return {}
+        placeholders = ",".join("?" * len(sentences))
+        rows = conn.execute(
+            f"SELECT sentence, translation FROM translation_cache WHERE sentence IN ({placeholders})",
+            sentences,
+        ).fetchall()
+        conn.close()
+        return {row["sentence"]: row["translation"] for row in rows}
+    except Exception as e:
+        print(f"ERROR: 读取例句译文失败：{str(e)}")
+        return {}
+
+
+def save_translations(translations):
+    """写入 {例句: 译文}"""
+    if not translations:
+        return False
+    _init_db()
+
+    conn = None
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return False
+        conn.executemany(
+            "INSERT OR REPLACE INTO translation_cache (sentence, translation) VALUES (?, ?)",
+            list(translations.items()),
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"ERROR: 写入例句译文失败：{str(e)}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_recycle_stats(days=30):
+    """最近 days 天的复用例句数，以及归档中的例句总数"""
+    _init_db()
+    try:
+        conn = _get_db_connection()
+        if conn is None:
+            return {"recycled": 0, "archived": 0}
+        recycled = conn.execute(
+            "SELECT COUNT(*) FROM recycle_log WHERE created_at >= datetime('now', ?)",
+            (f"-{int(days)} days",),
+        ).fetchone()[0]
+        archived = conn.execute("SELECT COUNT(*) FROM sentence_archive").fetchone()[0]
+        conn.close()
+        return {"recycled": recycled, "archived": archived}
+    except Exception as e:
+        print(f"ERROR: 查询复用统计失败：{str(e)}")
+        return {"recycled": 0, "archived": 0}
+
+
+# 清除缓存时清空的例句内容表；usage_log / validation_log / recycle_log 是用量与统计记录，保留
+CONTENT_TABLES = ("cache", "sentence_archive", "translation_cache")
+
+
 def clear_cache():
     """
-    # 修改: 清除所有缓存，包括数据库文件和内存缓存。
+    清除所有例句缓存（例句、归档例句、译文）和内存缓存；AI 用量等统计记录保留。
     返回操作是否成功 (True/False)
     """
+    _init_db()
+    conn = None
     try:
-        # 删除数据库文件
-        if os.path.exists(DB_FILE):
-            os.remove(DB_FILE)
-            print(f"DEBUG: 已删除数据库文件 {os.path.basename(DB_FILE)}")
-        
+        with _write_lock:
+            conn = _get_db_connection()
+            if conn is None:
+                raise RuntimeError("无法连接数据库")
+            for table in CONTENT_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+            print(f"DEBUG: 已清空数据库中的例句缓存表 {', '.join(CONTENT_TABLES)}")
+
+            # 新增: 清空内存缓存
+            _memory_cache.clear()
+            print("DEBUG: 内存缓存已清空。")
+
         # 删除旧的JSON缓存文件
         if os.path.exists(CACHE_FILE):
             os.remove(CACHE_FILE)
             print(f"DEBUG: 已删除JSON缓存文件 {os.path.basename(CACHE_FILE)}")
-        
-        # 新增: 清空内存缓存
-        global _memory_cache
-        _memory_cache.clear()
-        print("DEBUG: 内存缓存已清空。")
-        
-        aqt.utils.showInfo("已成功清除所有缓存文件和内存缓存")
+
+        aqt.utils.showInfo("已成功清除所有例句缓存和内存缓存（AI 用量记录保留）")
         return True
-        
+
     except Exception as e:
         error_msg = f"清除缓存文件失败：{str(e)}"
         aqt.utils.showInfo(error_msg)
         return False
+    finally:
+        if conn:
+            conn.close()
 
 # 初始化数据库
 _init_db()
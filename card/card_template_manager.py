@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import json
 import os
 import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from ..config_manager import get_config
 from ..tts.tts_manager import _get_anki_lang
 
@@ -53,74 +57,205 @@ def process_highlight(html_text: str) -> str:
     )
 
 
-def _fill_template(template: str, sentence: str, translation: str,
-                   original_card: str = "", keyword: str = "") -> str:
-    """Replace all placeholders in the card template."""
-
-    def strip_html(html_text: str) -> str:
-        text = re.sub(r'<[^>]+>', '', html_text)
-        return " ".join(text.split())
-
-    def escape_js(text: str) -> str:
-        return text.replace("'", "\\'").replace('"', '&quot;')
-
-    def clean_word(kw: str) -> str:
-        word = re.sub(r'[（(].*?[）)]', '', kw).strip()
-        return word if word else kw
-
-    processed_sentence = process_highlight(sentence)
-    processed_translation = process_highlight(translation)
-    sentence_text = escape_js(strip_html(processed_sentence))
-
+_PLACEHOLDER_RE = re.compile(r'\{(FONT_CSS|SENTENCE_TEXT|SENTENCE|WORD_BUTTON|TRANSLATION|ORIGINAL_CARD_AREA)\}')
+_TRANSLATION_PLACEHOLDER = (
+    '<div class="translation-placeholder-line"></div>'
+    '<div class="translation-placeholder-line"></div>'
+)
+_PAYLOAD_CACHE_SIZE = 2048
+
+
+def _strip_html(html_text: str) -> str:
+    text = re.sub(r'<[^>]+>', '', html_text)
+    return " ".join(text.split())
+
+
+def _escape_js(text: str) -> str:
+    return text.replace("'", "\\'").replace('"', '&quot;')
+
+
+def _clean_word(kw: str) -> str:
+    word = re.sub(r'[（(].*?[）)]', '', kw).strip()
+    return word if word else kw
+
+
+def spoken_word(keyword: str) -> str:
+    """Text sent to TTS by the word button."""
+    return _clean_word(keyword)
+
+
+def spoken_sentence(sentence: str) -> str:
+    """Text sent to TTS by the sentence button (before JS escaping)."""
+    return _strip_html(process_highlight(sentence))
+
+
+class SentencePayload:
+    """Render fragments of one sentence pair, computed once and reused on every flip."""
+
+    __slots__ = ("translation", "sentence_html", "translation_html", "sentence_text")
+
+    def __init__(self, sentence: str, translation: str):
+        self.translation = translation
+        self.sentence_html = process_highlight(sentence)
+        self.translation_html = process_highlight(translation)
+        self.sentence_text = _escape_js(spoken_sentence(sentence))
+
+
+class CardTemplateEngine:
+    """card.html loaded and split at its placeholders once; rendering is a single join.
+
+    The compiled template is tied to the config snapshot it was built from (font settings
+    are baked in), so a config change recompiles it on the next render. Sentence payloads
+    are precomputed when sentences are written to the cache (see precompute) and kept in a
+    bounded LRU; a miss is computed on the spot.
+    """
+
+    def __init__(self, filename: str = "card.html"):
+        self.filename = filename
+        self._compiled = None  # (config snapshot, segments)
+        self._payloads = OrderedDict()
+        self._payload_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._compiled = None
+
+    def _segments(self) -> list:
+        config = get_config()
+        compiled = self._compiled
+        if compiled is not None and compiled[0] is config:
+            return compiled[1]
+
+        font_css = get_font_css()
+        parts = _PLACEHOLDER_RE.split(_load_template(self.filename))
+        # re.split 的结果中奇数位是占位符名；FONT_CSS 在编译时直接填入并与相邻文本合并
+        segments = []
+        for i, part in enumerate(parts):
+            if i % 2 == 1 and part != "FONT_CSS":
+                segments.append((True, part))
+                continue
+            text = font_css if i % 2 == 1 else part
+            if segments and not segments[-1][0]:
+                segments[-1] = (False, segments[-1][1] + text)
+            else:
+                segments.append((False, text))
+        self._compiled = (config, segments)
+        return segments
+
+    def payload(self, sentence: str, translation: str = None) -> SentencePayload:
+        """translation 为 None 时（问题面）不关心翻译，命中任意已缓存的片段即可"""
+        with self._payload_lock:
+            cached = self._payloads.get(sentence)
+            if cached is not None and (translation is None or cached.translation == translation):
+                self._payloads.move_to_end(sentence)
+                return cached
+        payload = SentencePayload(sentence, translation or "")
+        with self._payload_lock:
+            self._payloads[sentence] = payload
+            if len(self._payloads) > _PAYLOAD_CACHE_SIZE:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def precompute(self, sentence_pairs) -> None:
+        """Called at cache-write time so later flips only join precomputed fragments."""
+        for pair in sentence_pairs or []:
+            try:
+                self.payload(pair[0], pair[1])
+            except Exception as e:
+                print(f"ERROR: 预计算例句渲染片段失败: {e}")
+
+    def render(self, payload: SentencePayload, translation_html: str,
+               keyword: str = "", original_card: str = "") -> str:
+        values = {
+            "SENTENCE": payload.sentence_html,
+            "SENTENCE_TEXT": payload.sentence_text,
+            "WORD_BUTTON": _word_button(keyword),
+            "TRANSLATION": translation_html,
+            "ORIGINAL_CARD_AREA": _original_area(original_card),
+        }
+        return "".join(values[text] if is_slot else text for is_slot, text in self._segments())
+
+
+@lru_cache(maxsize=512)
+def _word_button(keyword: str) -> str:
     # Word button: only show when keyword exists
-    if keyword:
-        word_text = escape_js(clean_word(keyword))
-        word_button = (
-            f'<div class="tts-btn" id="tts-word" '
-            f'onclick="this.classList.add(\'loading\');'
-            f'pycmd(\'contextflow:tts:word:{word_text}\')">'
-            f'<span class="tts-label">朗读单词 (Q)</span></div>'
-        )
-    else:
-        word_button = ""
+    if not keyword:
+        return ""
+    word_text = _escape_js(spoken_word(keyword))
+    return (
+        f'<div class="tts-btn" id="tts-word" '
+        f'onclick="this.classList.add(\'loading\');'
+        f'pycmd(\'contextflow:tts:word:{word_text}\')">'
+        f'<span class="tts-label">朗读单词 (Q)</span></div>'
+    )
+
 
+def _original_area(original_card: str) -> str:
     # Original card area: only show when content exists
-    if original_card:
-        original_area = (
-            '<div class="card-group">'
-            '<div class="label" style="color: #777;">原始卡片</div>'
-            f'<div class="original-card-text">{original_card}</div>'
-            '</div>'
-        )
-    else:
-        original_area = ""
+    if not original_card:
+        return ""
+    return (
+        '<div class="card-group">'
+        '<div class="label" style="color: #777;">原始卡片</div>'
+        f'<div class="original-card-text">{original_card}</div>'
+        '</div>'
+    )
+
 
-    html = template
-    html = html.replace("{FONT_CSS}", get_font_css())
-    html = html.replace("{SENTENCE}", processed_sentence)
-    html = html.replace("{SENTENCE_TEXT}", sentence_text)
-    html = html.replace("{WORD_BUTTON}", word_button)
-    html = html.replace("{TRANSLATION}", processed_translation)
-    html = html.replace("{ORIGINAL_CARD_AREA}", original_area)
-    return html
+card_template_engine = CardTemplateEngine()
 
 
 def get_processed_front_html(sentence: str, keyword: str = "") -> str:
     """Build front HTML: sentence + translation placeholder + TTS buttons."""
-    template = _load_template("card.html")
-    placeholder = (
-        '<div class="translation-placeholder-line"></div>'
-        '<div class="translation-placeholder-line"></div>'
+    payload = card_template_engine.payload(sentence)
+    return card_template_engine.render(payload, _TRANSLATION_PLACEHOLDER, keyword=keyword)
+
+
+def get_front_swap_js(front_html: str) -> str:
+    """Build JS that swaps the sentence block shown in the reviewer with the one in front_html.
+
+    Used instead of mw.reset() when a waiting card's sentence arrives or the user refreshes it,
+    so the scheduler and card_will_show hooks are not re-run. Evaluates to false when the page
+    has no sentence block (caller should fall back to a full reset).
+    """
+    return (
+        "(function(){"
+        "var old=document.getElementById('contextflow-sentence-group');"
+        "if(!old)return false;"
+        "var tmp=document.createElement('div');"
+        f"tmp.innerHTML={json.dumps(front_html)};"
+        "var fresh=tmp.querySelector('#contextflow-sentence-group');"
+        "if(!fresh)return false;"
+        "old.replaceWith(fresh);"
+        "return true;"
+        "})();"
     )
-    return _fill_template(template, sentence, placeholder, keyword=keyword)
 
 
 def get_processed_back_html(sentence: str, translation: str,
-                            original_html: str, keyword: str = "") -> str:
-    """Build back HTML: sentence + translation + original card + TTS buttons."""
-    template = _load_template("card.html")
-    return _fill_template(template, sentence, translation,
-                          original_card=original_html, keyword=keyword)
+                            original_html: str, keyword: str = "",
+                            translation_pending: bool = False) -> str:
+    """Build back HTML: sentence + translation + original card + TTS buttons.
+
+    translation_pending keeps the placeholder lines in place of the translation (two-phase
+    generation); get_translation_fill_js fills it in once the translation arrives.
+    """
+    payload = card_template_engine.payload(sentence, translation)
+    translation_html = _TRANSLATION_PLACEHOLDER if translation_pending else payload.translation_html
+    return card_template_engine.render(payload, translation_html,
+                                       keyword=keyword, original_card=original_html)
+
+
+def get_translation_fill_js(translation: str) -> str:
+    """Build JS that replaces the translation placeholder on the answer side; evaluates to false
+    when the page has no translation block."""
+    return (
+        "(function(){"
+        "var el=document.getElementById('contextflow-translation');"
+        "if(!el)return false;"
+        f"el.innerHTML={json.dumps(process_highlight(translation))};"
+        "return true;"
+        "})();"
+    )
 
 
 def get_card_template_front() -> str:
@@ -1,14 +1,55 @@
 import aqt
 import re
 import html
+import copy
+from collections.abc import Mapping
 # 插件的 __name__，用于访问 Anki 配置
 ADDON_NAME = __name__.split('.')[0] # 获取顶级包名
 
 showing_sentence = ""
 showing_translation = ""
 
-def get_config():
-    """获取当前配置（基于config.json的默认值与用户保存值合并）"""
+# 目标牌组名末尾的 [N] 表示取第 N 个字段作为关键词
+_DECK_FIELD_RE = re.compile(r'\[(\d+)\]$')
+
+
+class ConfigSnapshot(Mapping):
+    """
+    不可变的配置快照。
+    只在 save_config 或 Anki 报告插件配置变更时重建，各线程直接无锁读取同一个实例；
+    派生值（目标牌组名、关键词字段下标）在构建时一次性计算。
+    需要修改配置的调用方请先 to_dict() 取得独立副本，再交给 save_config。
+    """
+
+    __slots__ = ("_values", "base_deck_name", "field_index")
+
+    def __init__(self, values: dict):
+        self._values = values
+        deck_name = values.get("deck_name") or ""
+        match = _DECK_FIELD_RE.search(deck_name)
+        self.base_deck_name = deck_name[:match.start()] if match else deck_name
+        # [N] 为 1 起始；[0] 或缺省时使用第一个字段
+        self.field_index = max(int(match.group(1)) - 1, 0) if match else 0
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def to_dict(self) -> dict:
+        """返回可修改的深拷贝"""
+        return copy.deepcopy(self._values)
+
+
+_snapshot: ConfigSnapshot = None
+
+
+def _build_config():
+    """基于config.json的默认值与用户保存值合并"""
     # 直接通过插件名获取用户配置
     user_config = aqt.mw.addonManager.getConfig(ADDON_NAME) or {}
     # 从config.json读取默认配置（Anki会自动加载）
@@ -23,14 +64,37 @@ def get_config():
             merged_config[key] = default_config[key]
     
     return merged_config
+
+
+def get_config() -> ConfigSnapshot:
+    """获取当前配置快照（只读）；首次调用时构建，之后直接返回缓存的快照"""
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = invalidate_config()
+    return snapshot
+
+
+def invalidate_config() -> ConfigSnapshot:
+    """重新读取 Anki 中的插件配置并替换快照（整体替换引用，读取方无需加锁）"""
+    global _snapshot
+    _snapshot = ConfigSnapshot(_build_config())
+    return _snapshot
+
+
+def register_config_hooks():
+    """用户在 工具 -> 插件 -> 配置 中直接编辑配置后，重建快照"""
+    aqt.mw.addonManager.setConfigUpdatedAction(ADDON_NAME, lambda _new_config: invalidate_config())
+
+
 def save_config(new_config):
-    """保存配置到Anki"""
+    """保存配置到Anki，并重建配置快照"""
     # 过滤掉所有以preset_开头的配置项，确保预设值不会被保存到用户配置中
     filtered_config = {key: value for key, value in new_config.items() 
                       if not key.startswith('preset_')}
     
     # 直接使用插件名保存配置
     aqt.mw.addonManager.writeConfig(ADDON_NAME, filtered_config)
+    invalidate_config()
 
 
 def clean_html(raw_string):
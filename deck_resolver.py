@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+目标牌组解析 —— 用牌组 ID 集合回答"卡片是否属于目标牌组 / 收藏牌组"。
+
+原来各处（桌面渲染、Web 端、右键菜单、预取、难度索引）对每张卡片都先
+mw.col.decks.name(did) 再做字符串前缀比较；这里一次性解析出目标牌组与收藏牌组
+（含子牌组）的 ID 集合，之后只做整数集合查询。
+
+重建时机：
+- 牌组新增 / 重命名 / 删除（operation_did_execute 中 changes.deck 为真）
+- 打开配置档案（集合更换）
+- 配置快照更换（deck_name / save_deck 可能已修改）
+"""
+
+from aqt import mw, gui_hooks
+
+from .config_manager import get_config
+
+
+def _in_subtree(deck_name: str, root_name: str) -> bool:
+    return bool(root_name) and (deck_name == root_name or deck_name.startswith(root_name + "::"))
+
+
+class DeckResolver:
+    """目标牌组 / 收藏牌组的 ID 集合索引"""
+
+    def __init__(self):
+        # (配置快照, 目标牌组 ID 集合, 收藏牌组 ID 集合)；整体替换，读取方无需加锁
+        self._state = None
+
+    def invalidate(self) -> None:
+        self._state = None
+
+    def _current_state(self):
+        config = get_config()
+        state = self._state
+        if state is not None and state[0] is config:
+            return state
+
+        base_deck_name = config.base_deck_name
+        save_deck_name = config.get("save_deck") or ""
+        target_ids, save_ids = set(), set()
+        try:
+            for entry in mw.col.decks.all_names_and_ids():
+                if _in_subtree(entry.name, base_deck_name):
+                    target_ids.add(entry.id)
+                if _in_subtree(entry.name, save_deck_name):
+                    save_ids.add(entry.id)
+        except Exception as e:
+            print(f"ERROR: 解析目标牌组失败: {e}")
+            return (config, frozenset(), frozenset())
+
+        state = (config, frozenset(target_ids), frozenset(save_ids))
+        self._state = state
+        print(f"DEBUG: 目标牌组索引已重建：目标 {len(target_ids)} 个牌组，收藏 {len(save_ids)} 个牌组")
+        return state
+
+    # --- 查询 ---
+
+    def target_deck_ids(self) -> frozenset:
+        return self._current_state()[1]
+
+    def save_deck_ids(self) -> frozenset:
+        return self._current_state()[2]
+
+    def is_target_deck(self, did) -> bool:
+        return did in self._current_state()[1]
+
+    def is_save_deck(self, did) -> bool:
+        return did in self._current_state()[2]
+
+    def is_target_card(self, card) -> bool:
+        """属于目标牌组且为正面（ord==0）"""
+        return card.ord == 0 and card.did in self._current_state()[1]
+
+    def is_save_card(self, card) -> bool:
+        """属于收藏例句牌组且为正面（ord==0）"""
+        return card.ord == 0 and card.did in self._current_state()[2]
+
+    def subtree_ids(self, deck_name: str) -> frozenset:
+        """任意牌组（含子牌组）的 ID 集合；目标 / 收藏牌组直接复用缓存"""
+        config, target_ids, save_ids = self._current_state()
+        if deck_name and deck_name == config.base_deck_name:
+            return target_ids
+        if deck_name and deck_name == (config.get("save_deck") or ""):
+            return save_ids
+        try:
+            return frozenset(entry.id for entry in mw.col.decks.all_names_and_ids()
+                             if _in_subtree(entry.name, deck_name))
+        except Exception as e:
+            print(f"ERROR: 解析牌组 '{deck_name}' 失败: {e}")
+            return frozenset()
+
+    # --- 钩子 ---
+
+    def _on_operation_did_execute(self, changes, handler) -> None:
+        if getattr(changes, "deck", False):
+            self.invalidate()
+
+    def register_hooks(self) -> None:
+        gui_hooks.operation_did_execute.append(self._on_operation_did_execute)
+        gui_hooks.profile_did_open.append(self.invalidate)
+
+
+# --- 单例实例 ---
+deck_resolver = DeckResolver()
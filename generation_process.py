@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+独立生成进程（可选，默认关闭）。
+
+原来 HTTP 请求、json.loads、正则兜底解析、例句校验和大量 print 都在 Anki 进程的线程里执行，
+负载高时与 Qt 主线程争抢 GIL，复习界面明显卡顿。开启 generation_worker_process 后：
+- 提示词仍在 Anki 进程内格式化（第二关键词需要读取牌组），请求、解析、校验与补生成
+  交给子进程完成，子进程直接写入用量与校验统计（SQLite 支持多进程访问）；
+- 生成线程只在管道上等待结果，不再占用 GIL；
+- 子进程崩溃时，等待中的请求立即退回进程内生成；无响应超过 REQUEST_TIMEOUT_S 时结束子进程，
+  下一个请求再重新启动（每次 start 最多重启 MAX_RESTARTS 次，之后留在进程内生成）。
+
+子进程解释器：配置项 generation_worker_python，留空时使用 sys.executable
+（仅当它是 python 解释器时；旧版打包的 Anki 中它是 Anki 本身，此时不启用并打印警告）。
+
+协议：stdin / stdout 上每行一条 UTF-8 JSON；子进程的 print 输出改写到 stderr。
+    父 → 子  {"op": "config", "config": {...}}           配置快照更换后、下一个请求之前发送
+             {"op": "gen", "id": 1, "kw": 关键词, "prompt": 提示词, "purpose": 用途, "count": 批量}
+             {"op": "quit"}
+    子 → 父  {"op": "ready"}
+             {"id": 1, "pairs": [[例句, 翻译], ...]}      失败时为空列表，出现异常时附带 "error"
+
+本模块顶层只导入标准库：作为脚本运行时先构造包再导入自身。
+"""
+
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+
+ADDON_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# 子进程中插件包的名字（不执行插件的 __init__.py）
+WORKER_PACKAGE = "contextflow_worker"
+READY_TIMEOUT_S = 30
+# 远程请求超时 30s、本地模型 120s，再加一轮补生成
+REQUEST_TIMEOUT_S = 300
+MAX_RESTARTS = 3
+
+
+def _python_executable(config):
+    configured = (config.get("generation_worker_python") or "").strip()
+    if configured:
+        return configured
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    return None
+
+
+class GenerationProcess:
+    """Anki 进程一侧：启动子进程，按请求 id 收发消息"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proc = None
+        self._ready = threading.Event()
+        # 请求 id -> (子进程, [完成事件, 结果])；结果为 None 表示子进程已退出
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._config_sent = None
+        self._python = None
+        self._pool_size = 1
+        self._restarts = 0
+
+    def start(self, config, pool_size: int) -> bool:
+        """启动子进程（不等待就绪）；找不到可用解释器时返回 False"""
+        self._python = _python_executable(config)
+        if self._python is None:
+            print("WARNING: 当前 Anki 的 sys.executable 不是 python 解释器，请在 generation_worker_python "
+                  "中指定；例句生成留在 Anki 进程内")
+            return False
+        self._pool_size = max(1, pool_size)
+        self._restarts = 0
+        with self._lock:
+            return self._spawn()
+
+    def _spawn(self) -> bool:
+        """持有 _lock 时调用"""
+        self._ready = threading.Event()
+        self._config_sent = None
+        try:
+            self._proc = subprocess.Popen(
+                [self._python, os.path.abspath(__file__), str(self._pool_size)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                encoding="utf-8", bufsize=1,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except Exception as e:
+            print(f"ERROR: 启动生成进程失败: {e}")
+            self._proc = None
+            return False
+        threading.Thread(target=self._read_loop, args=(self._proc, self._ready), daemon=True,
+                         name="GenerationProcessReader").start()
+        print(f"DEBUG: 生成进程已启动（pid {self._proc.pid}）")
+        return True
+
+    def stop(self) -> None:
+        with self._lock:
+            proc, self._proc = self._proc, None
+            self._python = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.write('{"op": "quit"}\n')
+            proc.stdin.close()
+        except Exception:
+            pass
+        # 不在主线程等待子进程退出
+        threading.Thread(target=_reap, args=(proc,), daemon=True).start()
+
+    def generate(self, config, keyword: str, prompt: str, purpose: str, sentence_count):
+        """生成线程调用：返回例句对列表；子进程不可用或中途退出时返回 None（由调用方在进程内生成）"""
+        with self._lock:
+            proc = self._proc
+            if proc is None or proc.poll() is not None:
+                if self._python is None or self._restarts >= MAX_RESTARTS:
+                    return None
+                self._restarts += 1
+                print(f"WARNING: 生成进程已退出，重新启动（第 {self._restarts} 次）")
+                if not self._spawn():
+                    return None
+                proc = self._proc
+            ready = self._ready
+
+        if not ready.wait(READY_TIMEOUT_S):
+            print("ERROR: 生成进程启动超时")
+            self._kill(proc)
+            return None
+        if proc.poll() is not None:
+            return None
+
+        request_id = next(self._ids)
+        slot = [threading.Event(), None]
+        with self._lock:
+            if proc is not self._proc:
+                return None
+            self._pending[request_id] = (proc, slot)
+            try:
+                if self._config_sent is not config:
+                    self._send(proc, {"op": "config", "config": dict(config)})
+                    self._config_sent = config
+                self._send(proc, {"op": "gen", "id": request_id, "kw": keyword, "prompt": prompt,
+                                  "purpose": purpose, "count": sentence_count})
+            except Exception as e:
+                print(f"ERROR: 向生成进程发送请求失败: {e}")
+                self._pending.pop(request_id, None)
+                return None
+
+        if not slot[0].wait(REQUEST_TIMEOUT_S):
+            print(f"ERROR: 生成进程处理 '{keyword}' 超时，结束子进程")
+            self._kill(proc)
+            return []
+        return slot[1]
+
+    @staticmethod
+    def _send(proc, message: dict) -> None:
+        proc.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+        proc.stdin.flush()
+
+    def _kill(self, proc) -> None:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+    def _read_loop(self, proc, ready) -> None:
+        try:
+            for line in proc.stdout:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get("op") == "ready":
+                    ready.set()
+                    continue
+                with self._lock:
+                    entry = self._pending.pop(message.get("id"), None)
+                if entry is None:
+                    continue
+                slot = entry[1]
+                if message.get("error"):
+                    print(f"ERROR: 生成进程: {message['error']}")
+                slot[1] = message.get("pairs") or []
+                slot[0].set()
+        except Exception as e:
+            print(f"ERROR: 读取生成进程输出失败: {e}")
+
+        # 子进程已退出：唤醒所有等待者（包括仍在等待就绪的），由它们退回进程内生成
+        _reap(proc)
+        ready.set()
+        with self._lock:
+            orphaned = [request_id for request_id, (owner, _) in self._pending.items() if owner is proc]
+            slots = [self._pending.pop(request_id)[1] for request_id in orphaned]
+        for slot in slots:
+            slot[0].set()
+
+
+def _reap(proc) -> None:
+    try:
+        proc.wait(timeout=5)
+    except Exception:
+        proc.kill()
+
+
+# --- 子进程 ---
+
+def serve(pool_size: int) -> None:
+    """子进程主循环：读取 stdin 上的请求，在线程池中生成，结果写回 stdout"""
+    import concurrent.futures
+
+    from . import llm_transport
+    from .api_client import generate_from_prompt
+    from .config_manager import ConfigSnapshot
+
+    sys.stdin.reconfigure(encoding="utf-8")
+    protocol_out = sys.stdout
+    protocol_out.reconfigure(encoding="utf-8")
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def send(message):
+        line = json.dumps(message, ensure_ascii=False) + "\n"
+        with write_lock:
+            protocol_out.write(line)
+            protocol_out.flush()
+
+    def handle(message, config):
+        try:
+            pairs = generate_from_prompt(config, message["kw"], message["prompt"],
+                                         message.get("purpose", "generate"), message.get("count"))
+            send({"id": message["id"], "pairs": pairs or []})
+        except Exception as e:
+            send({"id": message["id"], "pairs": [], "error": f"{type(e).__name__} - {e}"})
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="GenerationProcess")
+    config = ConfigSnapshot({})
+    send({"op": "ready"})
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        op = message.get("op")
+        if op == "config":
+            config = ConfigSnapshot(message.get("config") or {})
+            # 子进程中没有 Anki 配置，录制 / 回放模式直接指定
+            llm_transport.configure(config.get("llm_cassette_mode") or llm_transport.MODE_OFF,
+                                    config.get("llm_cassette_path") or None,
+                                    config.get("llm_cassette_speed", 1.0))
+        elif op == "gen":
+            executor.submit(handle, message, config)
+        elif op == "quit":
+            break
+    executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import importlib
+    import types
+
+    _lib_path = os.path.join(ADDON_FOLDER, "lib")
+    if _lib_path not in sys.path:
+        sys.path.insert(0, _lib_path)
+    _package = types.ModuleType(WORKER_PACKAGE)
+    _package.__path__ = [ADDON_FOLDER]
+    sys.modules[WORKER_PACKAGE] = _package
+    importlib.import_module(f"{WORKER_PACKAGE}.generation_process").serve(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+例句库存规划 —— 按卡片的复习预测决定每个关键词的库存深度与生成批量。
+
+原来每个关键词固定生成 5 句，缓存用尽才以优先级 999 补货：当天要重复四次的学习中卡片
+会断货卡住，而间隔 200 天的卡片却把 4 句闲置数月。这里按卡片类型、到期日与 FSRS 稳定性
+（未启用 FSRS 时以当前间隔代替）预测规划周期内的复习次数：
+- target_depth：周期内预计需要的例句数
+- batch_size：一次生成的例句数（写入提示词的数量要求与 max_tokens）
+- low_water：剩余例句少于该值时提前补货（学习中卡片当天还会出现几次）
+
+规划在主线程观察到卡片时（渲染、预取）按关键词记录，生成线程按关键词读取。
+"""
+
+import threading
+from collections import OrderedDict
+
+from aqt import mw
+
+from .config_manager import get_config
+from .sentence_recycler import card_stability
+
+# 未规划或关闭规划时的批量（与默认提示词中的 5 句一致）
+DEFAULT_BATCH_SIZE = 5
+MIN_BATCH_SIZE = 2
+MAX_TARGET_DEPTH = 10
+# 新卡片首日的学习步数估计
+NEW_CARD_REVIEWS = 3
+# 最多记录的关键词数（按最近使用淘汰）
+MAX_PLANS = 2000
+
+
+class KeywordPlan:
+    """单个关键词的库存规划"""
+
+    __slots__ = ("predicted_reviews", "target_depth", "batch_size", "low_water")
+
+    def __init__(self, predicted_reviews: int, target_depth: int, batch_size: int, low_water: int):
+        self.predicted_reviews = predicted_reviews
+        self.target_depth = target_depth
+        self.batch_size = batch_size
+        self.low_water = low_water
+
+
+class InventoryPlanner:
+    """关键词 → 库存规划"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()
+
+    def enabled(self) -> bool:
+        return bool(get_config().get("inventory_planner_enabled", True))
+
+    def observe(self, card, keyword: str):
+        """按卡片当前状态规划该关键词的库存，返回 KeywordPlan；关闭规划时返回 None"""
+        if not keyword or card is None or not self.enabled():
+            return None
+        try:
+            plan = self._plan_for(card)
+        except Exception as e:
+            print(f"ERROR: 规划关键词 '{keyword}' 库存失败: {e}")
+            return None
+        with self._lock:
+            self._plans[keyword] = plan
+            self._plans.move_to_end(keyword)
+            while len(self._plans) > MAX_PLANS:
+                self._plans.popitem(last=False)
+        return plan
+
+    def batch_size(self, keyword: str) -> int:
+        """生成线程调用：该关键词一次生成的例句数"""
+        if not self.enabled():
+            return DEFAULT_BATCH_SIZE
+        with self._lock:
+            plan = self._plans.get(keyword)
+        return plan.batch_size if plan else DEFAULT_BATCH_SIZE
+
+    def needs_refill(self, plan, remaining: int) -> bool:
+        """剩余例句是否已低于补货水位；无规划时保持原行为（用尽才补货）"""
+        low_water = plan.low_water if plan else 1
+        return remaining < low_water
+
+    def _plan_for(self, card) -> KeywordPlan:
+        config = get_config()
+        horizon = max(1, int(config.get("inventory_horizon_days", 7) or 7))
+        max_batch = max(MIN_BATCH_SIZE, int(config.get("inventory_max_batch", 8) or 8))
+
+        predicted, due_today = _predict_reviews(card, horizon)
+        target_depth = max(1, min(predicted, MAX_TARGET_DEPTH))
+        batch_size = max(MIN_BATCH_SIZE, min(target_depth + 1, max_batch))
+        # 当前这次显示之后当天还会出现的次数：剩余例句低于它就提前补货
+        low_water = max(1, due_today - 1)
+        return KeywordPlan(predicted, target_depth, batch_size, low_water)
+
+
+def _predict_reviews(card, horizon: int):
+    """预测规划周期内的复习次数，返回 (周期内次数, 当天次数)"""
+    card_type = getattr(card, "type", 0)
+    if card_type == 0:
+        return NEW_CARD_REVIEWS, NEW_CARD_REVIEWS
+
+    if card_type in (1, 3):
+        # 学习 / 重学中：left 的低三位是当天剩余步数，毕业后还会在周期内复习一次
+        steps_left = (getattr(card, "left", 0) or 0) % 1000 or 2
+        return steps_left + 1, steps_left
+
+    stability = card_stability(card) or float(getattr(card, "ivl", 0) or 1)
+    try:
+        days_until_due = max(0, card.due - mw.col.sched.today)
+    except Exception:
+        days_until_due = 0
+    if days_until_due > horizon:
+        return 1, 0
+    return 1 + int((horizon - days_until_due) // max(stability, 1.0)), 1
+
+
+# --- 单例实例 ---
+inventory_planner = InventoryPlanner()
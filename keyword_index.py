@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+关键词索引 —— note_id → 清洗后的关键词。
+
+原来预取每次渲染都要为队列中的每张卡片构造 Card、调用 note()、clean_html，学习中卡片还要
+逐张 get_card；Web 端提取关键词时又重复一遍。这里：
+- 首次使用时用一条 SQL 批量读取目标牌组所有笔记的字段，按 deck_name[N] 的字段序号规则
+  （序号越界时取第一个字段）清洗出关键词；
+- 索引外的笔记（例如之后才移入目标牌组）按需单条查询并补入；
+- 编辑器失焦时更新单条笔记；笔记内容被操作修改（changes.note_text）后，下次查询时只重读
+  上次同步以来修改过（notes.mod）的笔记；牌组变化（changes.deck）、配置快照更换
+  （牌组或字段序号可能已修改）、打开配置档案时才整体重建。
+
+另提供 CardInfo：从调度器队列的后端卡片或 cards 表的一行构造的轻量卡片视图，
+属性名与 anki Card 一致（id / nid / did / type / queue / due / ivl / left / memory_state），
+供预取与库存规划使用，不再构造 Card 对象。
+"""
+
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from aqt import mw, gui_hooks
+from anki.utils import ids2str
+
+from .config_manager import get_config, clean_html
+from .deck_resolver import deck_resolver
+
+
+class CardInfo:
+    """预取用的轻量卡片视图"""
+
+    __slots__ = ("id", "nid", "did", "type", "queue", "due", "ivl", "left", "memory_state")
+
+    def __init__(self, id, nid, did, type=0, queue=0, due=0, ivl=0, left=0, memory_state=None):
+        self.id = id
+        self.nid = nid
+        self.did = did
+        self.type = type
+        self.queue = queue
+        self.due = due
+        self.ivl = ivl
+        self.left = left
+        self.memory_state = memory_state
+
+    @classmethod
+    def from_backend(cls, backend_card):
+        """调度器 get_queued_cards 返回的后端卡片"""
+        memory_state = None
+        try:
+            if backend_card.HasField("memory_state"):
+                memory_state = SimpleNamespace(stability=backend_card.memory_state.stability)
+        except Exception:
+            pass
+        return cls(
+            backend_card.id, backend_card.note_id, backend_card.deck_id,
+            backend_card.ctype, backend_card.queue, backend_card.due,
+            backend_card.interval, backend_card.remaining_steps, memory_state,
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """cards 表的一行：id, nid, did, type, queue, due, ivl, left, data"""
+        memory_state = None
+        try:
+            stability = json.loads(row[8] or "{}").get("s")
+            if stability:
+                memory_state = SimpleNamespace(stability=float(stability))
+        except Exception:
+            pass
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], memory_state)
+
+
+def _keyword_from_fields(flds: str, field_index: int) -> str:
+    fields = flds.split("\x1f")
+    if field_index >= len(fields):
+        field_index = 0
+    return clean_html(fields[field_index]) if fields else ""
+
+
+class KeywordIndex:
+    """note_id → 关键词"""
+
+    def __init__(self):
+        # (配置快照, {note_id: 关键词})；整体替换，读取方无需加锁
+        self._state = None
+        # 上次同步笔记内容的时间（秒，与 notes.mod 同单位）；有笔记被修改时 _stale 为真
+        self._synced_at = 0
+        self._stale = False
+
+    def invalidate(self) -> None:
+        self._state = None
+
+    def _current_state(self):
+        config = get_config()
+        state = self._state
+        if state is not None and state[0] is config:
+            if self._stale:
+                self._refresh_modified(state)
+            return state
+
+        synced_at = int(time.time())
+        keywords = {}
+        target_ids = deck_resolver.target_deck_ids()
+        if target_ids:
+            try:
+                rows = mw.col.db.all(
+                    f"SELECT DISTINCT n.id, n.flds FROM notes n JOIN cards c ON c.nid = n.id "
+                    f"WHERE c.did IN {ids2str(target_ids)}"
+                )
+                field_index = config.field_index
+                for nid, flds in rows:
+                    keywords[nid] = _keyword_from_fields(flds, field_index)
+            except Exception as e:
+                print(f"ERROR: 构建关键词索引失败: {e}")
+                return (config, {})
+
+        state = (config, keywords)
+        self._state = state
+        self._synced_at = synced_at
+        self._stale = False
+        print(f"DEBUG: 关键词索引已重建：{len(keywords)} 条笔记")
+        return state
+
+    def _refresh_modified(self, state) -> None:
+        """只重读上次同步以来修改过的笔记（索引外的笔记仍按需查询）"""
+        config, keywords = state
+        since = self._synced_at
+        self._synced_at = int(time.time())
+        self._stale = False
+        try:
+            rows = mw.col.db.all("SELECT id, flds FROM notes WHERE mod >= ?", since)
+        except Exception as e:
+            print(f"ERROR: 更新关键词索引失败: {e}")
+            return
+        for nid, flds in rows:
+            if nid in keywords:
+                keywords[nid] = _keyword_from_fields(flds, config.field_index)
+
+    # --- 查询 ---
+
+    def keyword_for_note(self, nid):
+        """笔记的关键词；字段为空时返回 None"""
+        config, keywords = self._current_state()
+        keyword = keywords.get(nid)
+        if keyword is None:
+            try:
+                flds = mw.col.db.scalar("SELECT flds FROM notes WHERE id = ?", nid)
+            except Exception as e:
+                print(f"ERROR: 读取笔记 {nid} 失败: {e}")
+                return None
+            if flds is None:
+                return None
+            keyword = _keyword_from_fields(flds, config.field_index)
+            keywords[nid] = keyword
+        return keyword or None
+
+    def keyword_for_card(self, card):
+        return self.keyword_for_note(card.nid)
+
+    def sample_keywords(self, count: int) -> list:
+        """从目标牌组随机抽取最多 count 个不重复的关键词（提示词对比测试用）"""
+        _, keywords = self._current_state()
+        distinct = sorted({keyword for keyword in keywords.values() if keyword})
+        return random.sample(distinct, min(count, len(distinct)))
+
+    def learning_cards(self, deck_ids) -> list:
+        """牌组中学习 / 重学中的卡片（is:learn），一条 SQL 取回"""
+        if not deck_ids:
+            return []
+        try:
+            rows = mw.col.db.all(
+                f"SELECT id, nid, did, type, queue, due, ivl, left, data FROM cards "
+                f"WHERE did IN {ids2str(deck_ids)} AND queue IN (1, 3)"
+            )
+        except Exception as e:
+            print(f"ERROR: 查询学习中卡片失败: {e}")
+            return []
+        return [CardInfo.from_row(row) for row in rows]
+
+    def due_cards(self, deck_ids, limit: int) -> list:
+        """今天待复习的卡片，近似调度器顺序：到期的学习中 → 到期复习 → 新卡片（按位置），最多 limit 张"""
+        if not deck_ids or limit <= 0:
+            return []
+        try:
+            today = mw.col.sched.today
+            learn_cutoff = int(time.time()) + int(mw.col.get_config("collapseTime", 1200) or 0)
+            rows = mw.col.db.all(
+                f"SELECT id, nid, did, type, queue, due, ivl, left, data FROM cards "
+                f"WHERE did IN {ids2str(deck_ids)} AND ("
+                f"(queue = 1 AND due <= ?) OR (queue IN (2, 3) AND due <= ?) OR queue = 0) "
+                f"ORDER BY CASE queue WHEN 1 THEN 0 WHEN 3 THEN 0 WHEN 2 THEN 1 ELSE 2 END, due "
+                f"LIMIT ?",
+                learn_cutoff, today, int(limit),
+            )
+        except Exception as e:
+            print(f"ERROR: 查询今日待复习卡片失败: {e}")
+            return []
+        return [CardInfo.from_row(row) for row in rows]
+
+    # --- 钩子 ---
+
+    def _on_operation_did_execute(self, changes, handler) -> None:
+        if getattr(changes, "deck", False):
+            self.invalidate()
+        elif getattr(changes, "note_text", False):
+            self._stale = True
+
+    def _on_editor_did_unfocus_field(self, changed, note, field_idx):
+        state = self._state
+        if state is None or note is None or not getattr(note, "id", 0):
+            return changed
+        try:
+            state[1][note.id] = _keyword_from_fields("\x1f".join(note.fields), state[0].field_index)
+        except Exception as e:
+            print(f"ERROR: 更新关键词索引失败: {e}")
+        return changed
+
+    def register_hooks(self) -> None:
+        gui_hooks.operation_did_execute.append(self._on_operation_did_execute)
+        gui_hooks.editor_did_unfocus_field.append(self._on_editor_did_unfocus_field)
+        gui_hooks.profile_did_open.append(self.invalidate)
+
+
+# --- 单例实例 ---
+keyword_index = KeywordIndex()
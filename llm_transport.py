@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 传输层 —— 所有对模型服务的 POST 请求都经过这里，支持录制 / 回放。
+
+设计要点：
+- off：直接透传给 requests.post，行为与原来一致。
+- record：照常请求，并把每一对 请求/响应 追加到 JSONL 磁带（cassette）文件；
+  api_key 等鉴权头一律脱敏。流式响应逐块记录相对请求发出的时间偏移。
+- replay：不访问网络，从磁带读取响应；流式响应按录制时的块间隔回放，
+  speed 为回放倍速（2 为两倍速，即等待时间减半；0 为不等待）。匹配规则：先按 URL + 请求体精确匹配，
+  匹配不到（如第二关键词随机抽样导致提示词不同）则按录制顺序取下一条同类型记录。
+- 模式取自配置项 llm_cassette_mode / llm_cassette_path / llm_cassette_speed；
+  脱离 Anki 运行的基准脚本可调用 configure() 直接指定。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+import requests
+
+ADDON_FOLDER = os.path.dirname(__file__)
+DEFAULT_CASSETTE_PATH = os.path.join(ADDON_FOLDER, "cache", "llm_cassette.jsonl")
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# 需要脱敏的请求头（小写比较）
+_SECRET_HEADERS = ("authorization", "x-api-key", "api-key")
+
+_lock = threading.Lock()
+_override = None          # configure() 指定的 (mode, path, speed)，优先于配置项
+_replay_entries = None    # 回放模式下载入的磁带记录
+_replay_path = None
+_replay_used = set()      # 已消费的记录下标
+
+
+def configure(mode=MODE_OFF, path=None, speed=1.0):
+    """不经配置项直接指定模式（供基准脚本等脱离 Anki 的调用方使用）"""
+    global _override, _replay_entries
+    with _lock:
+        _override = (mode, path or DEFAULT_CASSETTE_PATH, float(speed))
+        _replay_entries = None
+
+
+def _settings() -> tuple:
+    if _override is not None:
+        return _override
+    try:
+        from .config_manager import get_config
+        config = get_config()
+    except Exception:
+        return MODE_OFF, DEFAULT_CASSETTE_PATH, 1.0
+    return (config.get("llm_cassette_mode", MODE_OFF) or MODE_OFF,
+            config.get("llm_cassette_path") or DEFAULT_CASSETTE_PATH,
+            float(config.get("llm_cassette_speed", 1.0)))
+
+
+def current_mode() -> str:
+    return _settings()[0]
+
+
+def _request_key(url: str, payload) -> str:
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{url}\n{body}".encode("utf-8")).hexdigest()
+
+
+def _redact_headers(headers) -> dict:
+    return {k: ("***" if k.lower() in _SECRET_HEADERS else v) for k, v in (headers or {}).items()}
+
+
+def _append_entry(path: str, entry: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"ERROR: 写入 LLM 磁带失败: {e}")
+
+
+# --- 录制 ---
+
+class _RecordingStream:
+    """包装真实的流式响应：转发数据块的同时记录内容与时间偏移，读完后写入磁带"""
+
+    def __init__(self, response, entry: dict, path: str, start_time: float):
+        self._response = response
+        self._entry = entry
+        self._path = path
+        self._start_time = start_time
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        chunks = []
+        try:
+            for chunk in self._response.iter_content(chunk_size=chunk_size, decode_unicode=decode_unicode):
+                offset_ms = int((time.time() - self._start_time) * 1000)
+                text = chunk if isinstance(chunk, str) else chunk.decode("utf-8", errors="ignore")
+                chunks.append([offset_ms, text])
+                yield chunk
+        finally:
+            # 调用方中途 break（如用户关闭对话框）时也写入已收到的部分
+            self._entry["chunks"] = chunks
+            self._entry["elapsed_ms"] = int((time.time() - self._start_time) * 1000)
+            _append_entry(self._path, self._entry)
+
+
+# --- 回放 ---
+
+class CassetteResponse:
+    """回放用的响应对象，提供调用方用到的 requests.Response 接口子集"""
+
+    def __init__(self, entry: dict, speed: float):
+        self.status_code = entry.get("status", 200)
+        self._entry = entry
+        self._speed = speed
+        self.headers = {}
+
+    @property
+    def text(self) -> str:
+        if "body" in self._entry:
+            return self._entry["body"]
+        return "".join(text for _, text in self._entry.get("chunks", []))
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} (cassette)", response=self)
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        if "chunks" not in self._entry:
+            yield self.text if decode_unicode else self.text.encode("utf-8")
+            return
+        previous_ms = 0
+        for offset_ms, text in self._entry["chunks"]:
+            if self._speed > 0 and offset_ms > previous_ms:
+                time.sleep((offset_ms - previous_ms) / 1000 / self._speed)
+            previous_ms = offset_ms
+            yield text if decode_unicode else text.encode("utf-8")
+
+
+def _load_replay_entries(path: str) -> list:
+    global _replay_entries, _replay_path
+    if _replay_entries is not None and _replay_path == path:
+        return _replay_entries
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    except FileNotFoundError:
+        print(f"WARNING: LLM 磁带文件不存在: {path}")
+    except Exception as e:
+        print(f"ERROR: 读取 LLM 磁带失败: {e}")
+    _replay_entries, _replay_path = entries, path
+    _replay_used.clear()
+    return entries
+
+
+def _take_replay_entry(path: str, key: str, stream: bool):
+    with _lock:
+        entries = _load_replay_entries(path)
+        for i, entry in enumerate(entries):
+            if i not in _replay_used and entry.get("key") == key:
+                _replay_used.add(i)
+                return entry
+        for i, entry in enumerate(entries):
+            if i not in _replay_used and bool(entry.get("stream")) == stream:
+                _replay_used.add(i)
+                print(f"DEBUG: 磁带无精确匹配，按顺序回放第 {i + 1} 条记录")
+                return entry
+    return None
+
+
+def reset_replay() -> None:
+    """重新从磁带开头回放（基准脚本多轮运行时使用）"""
+    global _replay_entries
+    with _lock:
+        _replay_entries = None
+        _replay_used.clear()
+
+
+# --- 入口 ---
+
+def post(url: str, headers=None, json=None, stream: bool = False, timeout=None):
+    """与 requests.post 同签名的子集；按当前模式透传、录制或回放"""
+    mode, path, speed = _settings()
+    payload = json
+
+    if mode == MODE_REPLAY:
+        entry = _take_replay_entry(path, _request_key(url, payload), stream)
+        if entry is None:
+            raise requests.exceptions.ConnectionError("LLM 磁带已耗尽，无可回放的记录")
+        if entry.get("error"):
+            raise requests.exceptions.ConnectionError(entry["error"])
+        if not stream and speed > 0:
+            time.sleep(entry.get("elapsed_ms", 0) / 1000 / speed)
+        return CassetteResponse(entry, speed)
+
+    if mode != MODE_RECORD:
+        return requests.post(url, headers=headers, json=payload, stream=stream, timeout=timeout)
+
+    start_time = time.time()
+    entry = {
+        "key": _request_key(url, payload),
+        "recorded_at": start_time,
+        "url": url,
+        "headers": _redact_headers(headers),
+        "request": payload,
+        "stream": stream,
+    }
+    try:
+        response = requests.post(url, headers=headers, json=payload, stream=stream, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        entry["error"] = str(e)
+        entry["elapsed_ms"] = int((time.time() - start_time) * 1000)
+        _append_entry(path, entry)
+        raise
+
+    entry["status"] = response.status_code
+    if stream and response.status_code == 200:
+        return _RecordingStream(response, entry, path, start_time)
+
+    entry["body"] = response.text
+    entry["elapsed_ms"] = int((time.time() - start_time) * 1000)
+    _append_entry(path, entry)
+    return response
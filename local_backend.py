@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+本地模型后端 —— Ollama / llama.cpp server 专用的生成通道。
+
+设计要点：
+- 探测服务端并行槽位数（llama.cpp 的 /slots、/props；Ollama 的 OLLAMA_NUM_PARALLEL），
+  据此调整任务管理器的并发数，而不是一律单线程。
+- Ollama 走原生 /api/chat，携带 keep_alive 让模型常驻显存；启动工作线程时预加载模型，
+  避免第一张卡片等待 10-30 秒的冷启动。
+- 按预期输出长度为 num_predict / max_tokens 设上限，防止小模型跑飞。
+- 其他本地 OpenAI 兼容服务（LM Studio 等）仍走 chat/completions，只加 max_tokens。
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from urllib.parse import urlparse
+
+import requests
+
+from . import llm_transport
+
+# 槽位探测结果的上限：本地显卡一般跑不动更多并发，线程池也按此预留线程
+MAX_LOCAL_SLOTS = 8
+
+# 服务端类型
+KIND_OLLAMA = "ollama"
+KIND_LLAMACPP = "llamacpp"
+KIND_GENERIC = "generic"
+
+
+def is_local_url(api_url: str) -> bool:
+    """与任务管理器的单线程判定保持一致：ollama / localhost / 127.0.0.1 视为本地模型"""
+    url = (api_url or "").lower()
+    return "ollama" in url or "localhost" in url or "127.0.0.1" in url
+
+
+def _base_url(api_url: str) -> str:
+    """'http://localhost:11434/v1/chat/completions' -> 'http://localhost:11434'"""
+    parsed = urlparse(api_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _max_words_from_length_desc(length_desc: str) -> int:
+    """从句子长度描述中取最大词数：'约25-40词' -> 40，'60+词' -> 80，无数字时按 40 计"""
+    numbers = [int(n) for n in re.findall(r'\d+', length_desc or "")]
+    if not numbers:
+        return 40
+    max_words = max(numbers)
+    if "+" in length_desc:
+        max_words += 20
+    return max_words
+
+
+def estimate_max_tokens(config: dict, sentence_count: int = 5) -> int:
+    """
+    按预期输出估算 max_tokens 上限。
+    每个例句对 ≈ 例句 (词数 × 1.5) + 中文翻译 (约等量) + JSON 结构开销，再留 30% 余量。
+    """
+    max_words = _max_words_from_length_desc(config.get("sentence_length_desc", ""))
+    per_pair = int(max_words * 3) + 20
+    return int((per_pair * sentence_count + 50) * 1.3)
+
+
+class LocalModelBackend:
+    """本地模型服务的探测、预加载与调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server_info: dict = {}  # base_url -> {"kind": ..., "slots": ...}
+
+    # --- 探测 ---
+
+    def detect_server(self, api_url: str, force: bool = False) -> dict:
+        """探测本地服务类型和并行槽位数，结果按 base_url 缓存"""
+        base = _base_url(api_url)
+        with self._lock:
+            if not force and base in self._server_info:
+                return self._server_info[base]
+
+        info = {"kind": KIND_GENERIC, "slots": 1}
+        if llm_transport.current_mode() == llm_transport.MODE_REPLAY:
+            # 回放模式不访问网络，按通用服务处理（并发数可用 local_parallel_slots 指定）
+            return info
+        try:
+            resp = requests.get(f"{base}/api/version", timeout=3)
+            if resp.status_code == 200 and "version" in resp.json():
+                info = {"kind": KIND_OLLAMA, "slots": self._ollama_slots()}
+        except Exception:
+            pass
+
+        if info["kind"] == KIND_GENERIC:
+            slots = self._llamacpp_slots(base)
+            if slots:
+                info = {"kind": KIND_LLAMACPP, "slots": slots}
+
+        print(f"DEBUG: 本地模型服务探测结果: {base} -> {info}")
+        with self._lock:
+            self._server_info[base] = info
+        return info
+
+    @staticmethod
+    def _ollama_slots() -> int:
+        """Ollama 不通过 API 暴露并行数，只能读取同机环境变量 OLLAMA_NUM_PARALLEL"""
+        value = os.environ.get("OLLAMA_NUM_PARALLEL", "")
+        try:
+            return max(1, min(int(value), MAX_LOCAL_SLOTS))
+        except ValueError:
+            return 1
+
+    @staticmethod
+    def _llamacpp_slots(base: str) -> int:
+        """llama.cpp server：优先 /slots（槽位列表），被禁用时退回 /props 的 total_slots"""
+        try:
+            resp = requests.get(f"{base}/slots", timeout=3)
+            if resp.status_code == 200:
+                slots = resp.json()
+                if isinstance(slots, list) and slots:
+                    return min(len(slots), MAX_LOCAL_SLOTS)
+        except Exception:
+            pass
+        try:
+            resp = requests.get(f"{base}/props", timeout=3)
+            if resp.status_code == 200:
+                total = resp.json().get("total_slots")
+                if isinstance(total, int) and total > 0:
+                    return min(total, MAX_LOCAL_SLOTS)
+        except Exception:
+            pass
+        return 0
+
+    def resolve_parallel_slots(self, config: dict) -> int:
+        """并发数：配置 local_parallel_slots > 0 时以配置为准，否则使用探测值"""
+        configured = config.get("local_parallel_slots", 0) or 0
+        if configured > 0:
+            return min(int(configured), MAX_LOCAL_SLOTS)
+        return self.detect_server(config.get("api_url", ""))["slots"]
+
+    # --- 预加载 ---
+
+    def preload(self, config: dict) -> bool:
+        """预加载模型：Ollama 发送空 prompt 的 /api/generate 即可加载并设置 keep_alive；
+        llama.cpp 在服务启动时已加载模型，无需处理"""
+        api_url = config.get("api_url", "")
+        model_name = config.get("model_name", "")
+        info = self.detect_server(api_url)
+        if info["kind"] != KIND_OLLAMA or not model_name:
+            return False
+
+        start_time = time.time()
+        try:
+            resp = llm_transport.post(
+                f"{_base_url(api_url)}/api/generate",
+                json={"model": model_name, "keep_alive": config.get("local_keep_alive", "30m")},
+                timeout=120,
+            )
+            print(f"DEBUG: Ollama 模型 '{model_name}' 预加载完成 "
+                  f"(状态 {resp.status_code}, 耗时 {time.time() - start_time:.1f}s)")
+            return resp.status_code == 200
+        except Exception as e:
+            print(f"WARNING: Ollama 模型预加载失败: {e}")
+            return False
+
+    # --- 调用 ---
+
+    def chat(self, config: dict, prompt: str, purpose: str = "generate", sentence_count: int = 5) -> str:
+        """发送单轮对话，返回模型输出文本；失败返回空字符串"""
+        from .api_client import log_usage
+
+        api_url = config.get("api_url", "")
+        api_key = config.get("api_key", "")
+        model_name = config.get("model_name", "")
+        info = self.detect_server(api_url)
+        max_tokens = estimate_max_tokens(config, sentence_count)
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        if model_name and "qwen3" in model_name.lower():
+            prompt = prompt + "/no_think"
+        messages = [{"role": "user", "content": prompt}]
+
+        start_time = time.time()
+        try:
+            if info["kind"] == KIND_OLLAMA:
+                resp = llm_transport.post(
+                    f"{_base_url(api_url)}/api/chat",
+                    headers=headers,
+                    json={
+                        "model": model_name,
+                        "messages": messages,
+                        "stream": False,
+                        "format": "json",
+                        "keep_alive": config.get("local_keep_alive", "30m"),
+                        "options": {"num_predict": max_tokens},
+                    },
+                    timeout=120,
+                )
+                if resp.status_code != 200:
+                    print(f"错误：[local_backend] Ollama 返回 {resp.status_code}: {resp.text[:300]}")
+                    log_usage(purpose, model_name, None, start_time, f"http_{resp.status_code}")
+                    return ""
+                data = resp.json()
+                usage = {
+                    "prompt_tokens": data.get("prompt_eval_count", 0),
+                    "completion_tokens": data.get("eval_count", 0),
+                }
+                log_usage(purpose, model_name, usage, start_time, "ok")
+                return (data.get("message") or {}).get("content", "")
+
+            payload = {"model": model_name, "messages": messages, "max_tokens": max_tokens}
+            if info["kind"] == KIND_LLAMACPP:
+                # 复用同一槽位的 KV cache，提示词前缀相同的请求可跳过预填充
+                payload["cache_prompt"] = True
+            resp = llm_transport.post(api_url, headers=headers, json=payload, timeout=120)
+            if resp.status_code != 200:
+                print(f"错误：[local_backend] 本地服务返回 {resp.status_code}: {resp.text[:300]}")
+                log_usage(purpose, model_name, None, start_time, f"http_{resp.status_code}")
+                return ""
+            data = resp.json()
+            log_usage(purpose, model_name, data.get("usage"), start_time, "ok")
+            return data["choices"][0]["message"]["content"]
+        except requests.exceptions.RequestException as e:
+            print(f"错误：[local_backend] 网络错误：{e}")
+            log_usage(purpose, model_name, None, start_time, "network_error")
+            return ""
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            print(f"错误：[local_backend] 无法解析本地模型响应：{e}")
+            log_usage(purpose, model_name, None, start_time, "error")
+            return ""
+
+
+# --- 单例实例 ---
+local_backend = LocalModelBackend()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+预取窗口刷新服务 —— 合并、防抖、限频。
+
+原来每次渲染题面（桌面端 _render_question_side、Web 端 _prepare_target_sentence）都要
+get_queued_cards + 查询学习中卡片 + 整队列 reorganize_queue，快速翻卡时一秒内重复多次。
+这里：
+- request() 只记录最新的牌组并（重新）启动防抖计时器，连续请求合并为一次刷新；
+- 两次刷新之间至少间隔 MIN_INTERVAL_MS；
+- 刷新时与上一次的窗口比较：已有关键词的相对顺序变化时才整体重排；否则把整个窗口交给
+  enqueue_prefetch，它跳过已在队列、正在处理或已有缓存的关键词，只补上新进入窗口的
+  以及上次生成失败（已离开处理集合却仍未入缓存）的关键词，不重排已有任务。
+
+只在主线程调用（访问集合）。
+"""
+
+import time
+
+from PyQt6.QtCore import QTimer
+
+# 最后一次请求之后等待的时间
+DEBOUNCE_MS = 300
+# 两次刷新的最小间隔
+MIN_INTERVAL_MS = 1000
+
+
+class LookaheadService:
+    """预取窗口的合并刷新"""
+
+    def __init__(self, task_manager):
+        self.task_manager = task_manager
+        self._timer = None
+        self._deck_name = None
+        self._window = []
+        self._last_run = 0.0
+
+    def request(self, deck_name: str) -> None:
+        """请求刷新预取窗口；在防抖 / 限频之后于主线程执行"""
+        self._deck_name = deck_name
+        if self._timer is None:
+            self._timer = QTimer()
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self._run)
+
+        since_last_ms = (time.monotonic() - self._last_run) * 1000
+        delay = max(DEBOUNCE_MS, MIN_INTERVAL_MS - since_last_ms)
+        self._timer.start(int(delay))
+
+    def cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        self._deck_name = None
+        self._window = []
+
+    def _run(self) -> None:
+        deck_name = self._deck_name
+        if deck_name is None:
+            return
+        self._last_run = time.monotonic()
+
+        try:
+            window = self.task_manager.get_upcoming_card_keywords(deck_name)
+        except Exception as e:
+            print(f"ERROR: Failed to preload and reorganize task queue: {e}")
+            return
+
+        previous = self._window
+        self._window = window
+
+        previous_set = set(previous)
+        window_set = set(window)
+        common_now = [kw for kw in window if kw in previous_set]
+        common_before = [kw for kw in previous if kw in window_set]
+        if common_now != common_before:
+            # 已有关键词的相对顺序变了，整体重排
+            self.task_manager.reorganize_queue(window)
+            return
+
+        # 整个窗口都交给 enqueue_prefetch：生成失败的关键词仍在窗口中，借此重新入队
+        self.task_manager.enqueue_prefetch([(index + 1, kw) for index, kw in enumerate(window)])
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+预取深度自动调节。
+
+原来 get_upcoming_card_keywords 固定取 20 张（单线程时 100 张），不管用户答题多快、生成多慢。
+这里测量：
+- 复习节奏：相邻两次新题面之间的秒数（超过 BREAK_SECONDS 视为休息，不计入）
+- 生成耗时：每个关键词从请求到入缓存的秒数
+- 命中率：最近 HIT_WINDOW 次新题面中缓存命中的比例
+并据此计算窗口深度 N，使第 k+N 张卡片的例句在用户翻到之前生成完：
+    N × 节奏 ≥ (N / 并发数 + 1) × 生成耗时
+生成跟不上答题时取最大深度；命中率低于目标（lookahead_target_hit_rate）时逐步放大，达标后缓慢回落。
+当前深度与命中率显示在 `AI用量` 选项卡中。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+from .config_manager import get_config
+
+MIN_DEPTH = 5
+MAX_DEPTH = 100
+# 数据不足时沿用原来的固定深度
+DEFAULT_DEPTH = 20
+SINGLE_WORKER_DEPTH = 100
+BREAK_SECONDS = 120
+HIT_WINDOW = 50
+# 指数滑动平均的权重
+EMA_ALPHA = 0.2
+MAX_BOOST = 4.0
+
+
+def _ema(previous, value):
+    return value if previous is None else previous + EMA_ALPHA * (value - previous)
+
+
+class LookaheadTuner:
+    """按复习节奏、生成耗时与命中率调节预取深度"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pace = None            # 秒/张
+        self._latency = None         # 秒/关键词
+        self._last_shown = None
+        self._hits = deque(maxlen=HIT_WINDOW)
+        self._boost = 1.0
+        self._depth = None
+
+    def record_card_shown(self, hit: bool) -> None:
+        """主线程：一张卡片第一次显示题面时调用，hit 为是否直接取到例句"""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_shown is not None:
+                gap = now - self._last_shown
+                if gap < BREAK_SECONDS:
+                    self._pace = _ema(self._pace, gap)
+            self._last_shown = now
+
+            self._hits.append(bool(hit))
+            if len(self._hits) >= HIT_WINDOW // 2:
+                target = float(get_config().get("lookahead_target_hit_rate", 0.95) or 0.95)
+                if self._hit_rate() < target:
+                    self._boost = min(MAX_BOOST, self._boost * 1.1)
+                else:
+                    self._boost = max(1.0, self._boost * 0.98)
+
+    def record_generation(self, seconds: float) -> None:
+        """生成线程：一个关键词生成成功后调用"""
+        with self._lock:
+            self._latency = _ema(self._latency, seconds)
+
+    def depth(self, workers: int) -> int:
+        """当前应使用的预取深度（get_queued_cards 的 fetch_limit）"""
+        workers = max(1, workers or 1)
+        with self._lock:
+            pace, latency, boost = self._pace, self._latency, self._boost
+
+        if pace is None or latency is None:
+            depth = SINGLE_WORKER_DEPTH if workers == 1 else DEFAULT_DEPTH
+        else:
+            spare = pace - latency / workers
+            if spare <= 0:
+                # 生成速度跟不上答题速度，尽量往前多取
+                depth = MAX_DEPTH
+            else:
+                depth = math.ceil(latency / spare * boost) + 1
+        depth = max(MIN_DEPTH, min(MAX_DEPTH, depth))
+        with self._lock:
+            self._depth = depth
+        return depth
+
+    def _hit_rate(self):
+        return sum(self._hits) / len(self._hits) if self._hits else None
+
+    def snapshot(self) -> dict:
+        """统计页使用的当前状态"""
+        with self._lock:
+            hit_rate = self._hit_rate()
+            return {
+                "depth": self._depth,
+                "hit_rate": round(hit_rate, 3) if hit_rate is not None else None,
+                "samples": len(self._hits),
+                "pace_s": round(self._pace, 2) if self._pace is not None else None,
+                "latency_s": round(self._latency, 2) if self._latency is not None else None,
+                "boost": round(self._boost, 2),
+                "target_hit_rate": float(get_config().get("lookahead_target_hit_rate", 0.95) or 0.95),
+            }
+
+
+# --- 单例实例 ---
+lookahead_tuner = LookaheadTuner()
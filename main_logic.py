@@ -7,12 +7,25 @@ import threading
 from anki.cards import Card
 from PyQt6.QtCore import QTimer
 from . import config_manager
-from .config_manager import get_config, clean_html
-from .cache.cache_manager import load_cache, pop_cache
-from .card.card_template_manager import get_processed_back_html, get_processed_front_html
+from .config_manager import get_config
+from . import api_client
+from .cache.cache_manager import load_cache, pop_cache, save_cache
+from .card.card_template_manager import (get_processed_back_html, get_processed_front_html, get_front_swap_js,
+                                         get_translation_fill_js)
 from .tts.tts_manager import tts_manager
+from .tts.tts_prefetcher import tts_prefetcher, TTS_PREFETCH_DEPTH
 from .ui.stats import add_stats
 from .task_manager import SentenceTaskManager
+from .deck_resolver import deck_resolver
+from .keyword_index import keyword_index
+from .prerender import PrerenderStage
+from .lookahead_service import LookaheadService
+from .session_prewarm import SessionPrewarm
+from .lookahead_tuner import lookahead_tuner
+from .sentence_ledger import sentence_ledger
+from .sentence_recycler import sentence_recycler
+from .inventory_planner import inventory_planner
+from .translation_service import translation_service
 
 # --- 单例实例 ---
 _task_manager = SentenceTaskManager()
@@ -28,7 +41,13 @@ showing_sentence = ""
 showing_translation = ""
 showing_keyword = ""
 WAITING_SENTENCE_TEXT = "例句生成中..."
+# 卡片绘制完成的通知未到达时，最迟在此时间后执行预取
+LOOKAHEAD_FALLBACK_MS = 500
 _active_wait_session = {"keyword": None, "timer": None}
+_prerender = PrerenderStage(_task_manager.cache_lock)
+_lookahead = LookaheadService(_task_manager)
+# 题面显示后待执行的预取（卡片绘制完成的 pycmd 或兜底计时器先到者执行）
+_pending_lookahead = {"args": None}
 
 
 def _update_showing_state(sentence, translation, keyword=""):
@@ -43,31 +62,37 @@ def _update_showing_state(sentence, translation, keyword=""):
     config_manager.showing_translation = translation
 
 
-def _extract_keyword(card, field_index_match):
-    """从卡片中提取关键词，失败返回 None"""
+def _extract_keyword(card):
+    """从关键词索引中取卡片的关键词，失败返回 None"""
     try:
-        note = card.note()
-        field_index = int(field_index_match.group(1)) - 1 if field_index_match else 0
-        if field_index < 0 or (note.fields and field_index >= len(note.fields)):
-            field_index = 0
-        keyword = note.fields[field_index].strip() if note.fields and len(note.fields) > field_index else ""
-        keyword = clean_html(keyword)
-        return keyword if keyword else None
+        return keyword_index.keyword_for_card(card)
     except Exception as e:
         aqt.utils.showInfo(f"获取卡片字段失败：{str(e)}")
         return None
 
 
-def _handle_cache_hit(keyword, popped_pair):
-    """处理缓存命中：更新显示状态，若缓存耗尽则重新入队。返回 HTML"""
+def _handle_cache_hit(keyword, popped_pair, html_result=None, card=None):
+    """处理缓存命中：更新显示状态，若缓存耗尽则重新入队。返回 HTML
+
+    html_result 为预渲染好的题面时直接使用；card 的下次出现可复用归档例句时不补货。
+    剩余例句低于库存规划的补货水位（学习中卡片当天还要出现几次）时提前补货。
+    """
     try:
         _finish_wait_session()
         sentence, translation = popped_pair
+        if not translation:
+            # 两阶段生成：例句对不带翻译，取已缓存的译文，没有则视情况提前翻译
+            translation = translation_service.lookup(sentence) or ""
+            if not translation:
+                translation_service.prefetch_for(card, sentence)
         _update_showing_state(sentence, translation, keyword)
-        html_result = get_processed_front_html(sentence, keyword)
+        if html_result is None:
+            html_result = get_processed_front_html(sentence, keyword)
 
-        if not load_cache(keyword):
-            print(f"DEBUG: 关键词 '{keyword}' 缓存已用尽，以最低优先级重新加入队列。")
+        plan = inventory_planner.observe(card, keyword)
+        remaining = len(load_cache(keyword))
+        if inventory_planner.needs_refill(plan, remaining) and not sentence_recycler.will_recycle(card):
+            print(f"DEBUG: 关键词 '{keyword}' 剩余 {remaining} 句，低于补货水位，以最低优先级重新加入队列。")
             _task_manager.reorganize_queue(keyword, is_repopulate=True)
 
         return html_result
@@ -90,6 +115,7 @@ def _finish_wait_session(keyword=None):
 
     _active_wait_session["keyword"] = None
     _active_wait_session["timer"] = None
+    _task_manager.waiting_keyword = None
 
     if timer is not None:
         timer.stop()
@@ -103,10 +129,16 @@ def _finish_wait_session(keyword=None):
 
 
 def _handle_cache_miss(keyword):
-    """处理缓存未命中：加入队列，启动进度条轮询等待。返回 HTML"""
+    """处理缓存未命中：加入队列并显示进度条，由任务管理器的完成通知结束等待。返回 HTML
+
+    计时器每秒触发一次，只负责刷新已等待秒数、响应取消和超时，不再轮询缓存。
+    """
     print(f"DEBUG: 缓存未命中 '{keyword}'。加入队列并开始等待。")
-    _task_manager.reorganize_queue(keyword)
     _finish_wait_session()
+    if aqt.mw.reviewer is not None:
+        inventory_planner.observe(aqt.mw.reviewer.card, keyword)
+    _task_manager.waiting_keyword = keyword
+    _task_manager.reorganize_queue(keyword)
 
     max_wait = 30
     start_time = time.time()
@@ -154,63 +186,164 @@ def _handle_cache_miss(keyword):
 
         if elapsed >= max_wait:
             _finish_progress()
-            return
-
-        if load_cache(keyword):
-            _finish_progress()
-            mw.reset()
 
     timer.timeout.connect(update_ui)
-    timer.start(100)
+    timer.start(1000)
 
     _update_showing_state(WAITING_SENTENCE_TEXT, "", keyword)
     return get_processed_front_html(WAITING_SENTENCE_TEXT)
 
 
-def _refresh_waiting_card_if_ready(keyword: str):
-    """关键词就绪后立即刷新当前仍在等待的题面。"""
+def _refresh_waiting_card_if_ready(keyword: str, pair=None):
+    """任务管理器的完成通知（主线程）：关键词就绪后立即刷新当前仍在等待的题面。
+
+    pair 为生成结果中预留给等待方的例句对；题面已不再等待时把它放回缓存。
+    """
     try:
         reviewer = aqt.mw.reviewer
-        if reviewer is None or reviewer.state != 'question':
-            return
+        waiting = (
+            reviewer is not None and reviewer.state == 'question'
+            and keyword == showing_keyword and showing_sentence == WAITING_SENTENCE_TEXT
+        )
 
-        if keyword != showing_keyword or showing_sentence != WAITING_SENTENCE_TEXT:
+        if not waiting:
+            if pair:
+                save_cache(keyword, [pair])
             return
 
-        if not load_cache(keyword):
-            return
+        if not pair:
+            pair = pop_cache(keyword)
+            if not pair:
+                return
 
         _finish_wait_session(keyword)
-        QTimer.singleShot(0, mw.reset)
+        swap_question_sentence(keyword, pair)
     except Exception as e:
         print(f"ERROR: Failed to refresh waiting card for '{keyword}': {e}")
 
 
-def _render_question_side(card, base_deck_name, field_index_match):
+def swap_question_sentence(keyword: str, pair) -> None:
+    """在当前复习界面中原地替换问题面的例句块，不调用 mw.reset()。
+
+    mw.reset() 会重建整个复习器状态、重新查询调度器并重跑所有 card_will_show 钩子；
+    这里只通过 web.eval 替换例句所在的 DOM 节点。页面中找不到例句块时退回 mw.reset()，
+    例句对已记入账本，重新渲染时取回同一句。
+    """
+    reviewer = aqt.mw.reviewer
+    html_result = _handle_cache_hit(keyword, pair, card=reviewer.card if reviewer else None)
+    if reviewer is not None and reviewer.card is not None:
+        sentence_ledger.record(reviewer.card, keyword, pair)
+    if reviewer is None or reviewer.web is None or reviewer.state != 'question':
+        return
+
+    def _after_swap(swapped):
+        if swapped:
+            if get_config().get("tts_replace_audio", False):
+                _auto_play_tts()
+            return
+        print(f"DEBUG: 原地替换例句失败，退回 mw.reset()：'{keyword}'")
+        mw.reset()
+
+    reviewer.web.evalWithCallback(get_front_swap_js(html_result), _after_swap)
+
+
+def refresh_current_sentence() -> None:
+    """换一句：问题面从缓存取下一句原地替换；缓存为空或不在问题面时退回 mw.reset()"""
+    reviewer = aqt.mw.reviewer
+    keyword = showing_keyword
+    if reviewer is not None and reviewer.card is not None:
+        # 当前例句已看过，不再由账本取回
+        sentence_ledger.discard(reviewer.card)
+    if reviewer is None or reviewer.state != 'question' or not keyword \
+            or showing_sentence == WAITING_SENTENCE_TEXT:
+        mw.reset()
+        return
+
+    pair = pop_cache(keyword)
+    if not pair:
+        mw.reset()
+        return
+    swap_question_sentence(keyword, pair)
+
+
+def _render_question_side(card, base_deck_name):
     """渲染问题面：尝试缓存命中，否则等待生成。返回 HTML"""
-    keyword = _extract_keyword(card, field_index_match)
+    keyword = _extract_keyword(card)
     if not keyword:
         return None  # 无关键词，由调用方返回原始 html
 
-    popped_pair = pop_cache(keyword)
-    if popped_pair:
-        html_result = _handle_cache_hit(keyword, popped_pair)
+    # 重新渲染或撤销答题：沿用这张卡片本次复习已显示的例句
+    shown_pair = sentence_ledger.lookup(card, keyword)
+    prepared = None if shown_pair else _prerender.take(keyword)
+    if shown_pair:
+        html_result = _handle_cache_hit(keyword, shown_pair, card=card)
+    elif prepared:
+        lookahead_tuner.record_card_shown(hit=True)
+        sentence_ledger.record(card, keyword, prepared[0])
+        html_result = _handle_cache_hit(keyword, *prepared, card=card)
     else:
-        html_result = _handle_cache_miss(keyword)
+        # 新例句用尽时先尝试复用归档例句
+        popped_pair = pop_cache(keyword) or sentence_recycler.take(card, keyword)
+        lookahead_tuner.record_card_shown(hit=bool(popped_pair))
+        if popped_pair:
+            sentence_ledger.record(card, keyword, popped_pair)
+            html_result = _handle_cache_hit(keyword, popped_pair, card=card)
+        else:
+            html_result = _handle_cache_miss(keyword)
 
-    # 预加载后续卡片
-    try:
-        upcoming_keywords = _task_manager.get_upcoming_card_keywords(base_deck_name)
-        _task_manager.reorganize_queue(upcoming_keywords)
-    except Exception as e:
-        print(f"ERROR: Failed to preload and reorganize task queue: {e}")
+    # 预取与预渲染推迟到卡片绘制之后，不占用渲染钩子的时间
+    _pending_lookahead["args"] = base_deck_name
+    QTimer.singleShot(LOOKAHEAD_FALLBACK_MS, _run_pending_lookahead)
 
     return html_result
 
 
-def _is_target_deck(card, current_deck, base_deck_name):
-    """判断卡片是否属于目标牌组且为正面（ord==0）"""
-    return (current_deck == base_deck_name or current_deck.startswith(base_deck_name + "::")) and card.ord == 0
+def _run_pending_lookahead():
+    """题面绘制完成后：预加载后续卡片，并预渲染接下来的几张卡片"""
+    base_deck_name = _pending_lookahead["args"]
+    if base_deck_name is None:
+        return
+    _pending_lookahead["args"] = None
+
+    # 预取窗口刷新经过防抖与限频，快速翻卡时合并为一次
+    _lookahead.request(base_deck_name)
+
+    try:
+        depth = max(_prerender.depth, TTS_PREFETCH_DEPTH) if tts_prefetcher.enabled() else _prerender.depth
+        upcoming = _task_manager.get_next_card_keywords(base_deck_name, depth)
+        _prerender.update(upcoming)
+        # 预渲染窗口内的卡片由预渲染交出预留例句；之后的卡片合成单词和缓存中的下一句
+        tts_prefetcher.prefetch_keywords(upcoming[_prerender.depth:])
+    except Exception as e:
+        print(f"ERROR: Failed to prerender next cards: {e}")
+
+
+def _render_answer_side(html):
+    """渲染答案面；两阶段生成的译文未就绪时显示占位条，译文到达后原地填入"""
+    translation = showing_translation
+    pending = False
+    if not translation and showing_sentence and showing_sentence != WAITING_SENTENCE_TEXT \
+            and translation_service.enabled():
+        translation = translation_service.lookup(showing_sentence) or ""
+        if translation:
+            _update_showing_state(showing_sentence, translation, showing_keyword)
+        else:
+            pending = True
+            translation_service.request([showing_sentence], _fill_answer_translation)
+    return get_processed_back_html(showing_sentence, translation, html, showing_keyword,
+                                   translation_pending=pending)
+
+
+def _fill_answer_translation(sentence, translation):
+    """译文到达（主线程）：仍在显示该例句的答案面时填入"""
+    if sentence != showing_sentence:
+        return
+    if translation:
+        _update_showing_state(sentence, translation, showing_keyword)
+    reviewer = aqt.mw.reviewer
+    if reviewer is None or reviewer.web is None or reviewer.state != 'answer':
+        return
+    reviewer.web.eval(get_translation_fill_js(translation or "翻译生成失败"))
 
 
 def _strip_native_audio(html: str) -> str:
@@ -233,25 +366,17 @@ def _auto_play_tts():
 
 def on_card_render(html: str, card: Card, context: str) -> str:
     """卡片渲染钩子，处理问题面和答案面的显示逻辑"""
-    config = get_config()
-    try:
-        current_deck = aqt.mw.col.decks.name(card.did)
-    except Exception as e:
-        print(f"ERROR: 获取牌组名称失败 for card {card.id}: {e}")
+    if not deck_resolver.is_target_card(card):
         return html
 
-    config_deck_name = config.get("deck_name")
-    field_index_match = re.search(r'\[(\d+)\]$', config_deck_name)
-    base_deck_name = re.sub(r'\[\d+\]$', '', config_deck_name) if field_index_match else config_deck_name
-
-    if not _is_target_deck(card, current_deck, base_deck_name):
-        return html
+    config = get_config()
+    base_deck_name = config.base_deck_name
 
     replace_audio = config.get("tts_replace_audio", False)
     state = aqt.mw.reviewer.state if aqt.mw.reviewer else 'unknown'
 
     if state == 'question':
-        result = _render_question_side(card, base_deck_name, field_index_match)
+        result = _render_question_side(card, base_deck_name)
         if result is not None:
             if replace_audio:
                 QTimer.singleShot(0, _auto_play_tts)
@@ -262,7 +387,7 @@ def on_card_render(html: str, card: Card, context: str) -> str:
         return html
 
     if state == 'answer':
-        result = get_processed_back_html(showing_sentence, showing_translation, html, showing_keyword)
+        result = _render_answer_side(html)
         if replace_audio:
             #result = _strip_native_audio(result)
             pass
@@ -284,6 +409,11 @@ def stop_worker():
     """停止后台例句生成工作线程"""
     global executor, max_workers
     _finish_wait_session()
+    _pending_lookahead["args"] = None
+    _lookahead.cancel()
+    _prerender.clear()
+    tts_prefetcher.clear()
+    sentence_ledger.abandon()
     _task_manager.stop()
     executor = None
     max_workers = 0
@@ -313,6 +443,10 @@ def _handle_js_message(handled, message, context):
     command = parts[1]
     payload = parts[2]
 
+    if command == "painted":
+        _run_pending_lookahead()
+        return (True, None)
+
     if command == "tts":
         if payload.startswith("sentence:"):
             text = payload[len("sentence:"):]
@@ -345,7 +479,9 @@ def _handle_js_message(handled, message, context):
                             audio_data, ext = result
                             try:
                                 from .tts.tts_manager import _play_bytes
-                                _play_bytes(audio_data, ext)
+                                # 生成结果已写入磁盘缓存，直接播放缓存文件
+                                if not tts_manager.play_cached(text):
+                                    _play_bytes(audio_data, ext)
                             except Exception as e:
                                 print(f"ERROR: TTS play file failed: {e}")
 
@@ -377,16 +513,35 @@ def _block_native_audio(card, tags):
     QTimer.singleShot(0, lambda: tags.extend(original))
 
 
+def _on_reviewer_did_answer_card(reviewer, card, ease):
+    """复习后增量刷新第二关键词的难词索引，并在账本中标记例句已看完"""
+    sentence_ledger.mark_answered(card)
+    api_client.on_card_reviewed(card)
+
+
+def _on_state_did_change(new_state, old_state):
+    """离开复习界面：未答题卡片的例句放回缓存"""
+    if old_state == "review" and new_state != "review":
+        sentence_ledger.abandon()
+
+
 def register_hooks():
     """注册所有需要的钩子，并延迟启动工作线程"""
     _task_manager.on_keyword_ready = _refresh_waiting_card_if_ready
+    _task_manager.is_reserved = _prerender.holds
     gui_hooks.card_will_show.append(on_card_render)
+    gui_hooks.reviewer_did_answer_card.append(_on_reviewer_did_answer_card)
+    gui_hooks.state_did_change.append(_on_state_did_change)
     gui_hooks.webview_did_receive_js_message.append(_handle_js_message)
     gui_hooks.reviewer_will_play_question_sounds.append(_block_native_audio)
     gui_hooks.reviewer_will_play_answer_sounds.append(_block_native_audio)
 
     gui_hooks.profile_will_close.append(stop_worker)
     gui_hooks.stats_dialog_will_show.append(add_stats)
+    deck_resolver.register_hooks()
+    keyword_index.register_hooks()
+    # 打开配置档案时预热今天到期卡片的例句（必要时重新启动生成线程）
+    SessionPrewarm(_task_manager, start_worker).register_hooks()
 
     try:
         from .ui import context_menu
@@ -39,6 +39,7 @@ PACKAGE_ONLY_EXCLUDE = [
     'DESIGN_PHILOSOPHY.md', # 设计文档
     'picture/',             # README 截图（约 872K）
     'web-src/',             # Vue 前端源码（构建产物已在 web/static/）
+    'bench/',               # 基准测试脚本（脱离 Anki 运行）
 ]
 
 def get_addon_info():
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+桌面复习器的下一张卡片预渲染。
+
+题面绘制完成后（main_logic._run_pending_lookahead，由 contextflow:painted:card 的 pycmd
+或 500ms 兜底计时器触发），取调度器接下来的几张目标卡片，
+在后台线程中为每个关键词预留一个例句对（从缓存中取出）并生成题面 HTML。
+渲染钩子命中时直接交出预留的例句对和 HTML，不再读缓存、填模板。
+
+预留的例句对离开预渲染窗口、或停止时，会放回缓存，不会丢失。
+"""
+
+import threading
+
+from .cache.cache_manager import pop_cache, save_cache
+from .card.card_template_manager import get_processed_front_html
+from .config_manager import get_config
+from .tts.tts_prefetcher import tts_prefetcher
+
+# 预渲染的卡片张数
+PRERENDER_DEPTH = 2
+
+
+class PrerenderStage:
+    """下一张卡片的预留例句对与题面 HTML"""
+
+    def __init__(self, cache_lock, depth: int = PRERENDER_DEPTH):
+        self.cache_lock = cache_lock
+        self.depth = depth
+        self._lock = threading.Lock()
+        self._entries = {}      # keyword -> (配置快照, 例句对, 题面 HTML)
+        self._preparing = set()
+        # 已从缓存取出、还在生成题面 HTML 的关键词
+        self._popped = set()
+        self._window = ()
+
+    def holds(self, keyword: str) -> bool:
+        """该关键词是否有已预留（已从缓存取出、尚未显示）的例句对"""
+        with self._lock:
+            return keyword in self._entries or keyword in self._popped
+
+    def take(self, keyword: str):
+        """渲染钩子调用：取出为该关键词准备好的 (例句对, 题面 HTML)，没有则返回 None"""
+        with self._lock:
+            entry = self._entries.pop(keyword, None)
+        if entry is None:
+            return None
+
+        config, pair, html = entry
+        if config is not get_config():
+            # 预渲染后配置（字体等）已修改，按新配置重新填模板
+            html = get_processed_front_html(pair[0], keyword)
+        return pair, html
+
+    def update(self, keywords) -> None:
+        """以接下来的卡片关键词（按出现顺序）更新预渲染窗口"""
+        window = tuple(keywords[:self.depth])
+        with self._lock:
+            self._window = window
+            stale = [(kw, entry[1]) for kw, entry in self._entries.items() if kw not in window]
+            for kw, _ in stale:
+                del self._entries[kw]
+            todo = [kw for kw in window if kw not in self._entries and kw not in self._preparing]
+            self._preparing.update(todo)
+
+        for kw, pair in stale:
+            self._release(kw, pair)
+        if todo:
+            threading.Thread(target=self._prepare, args=(todo,), daemon=True).start()
+
+    def clear(self) -> None:
+        """放回所有预留的例句对（停止工作线程时调用）"""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+            self._window = ()
+        for kw, entry in entries:
+            self._release(kw, entry[1])
+
+    def _prepare(self, keywords) -> None:
+        for kw in keywords:
+            pair, html = None, None
+            config = get_config()
+            try:
+                with self.cache_lock:
+                    pair = pop_cache(kw)
+                    if pair:
+                        with self._lock:
+                            self._popped.add(kw)
+                if pair:
+                    html = get_processed_front_html(pair[0], kw)
+            except Exception as e:
+                print(f"ERROR: 预渲染 '{kw}' 失败: {e}")
+
+            with self._lock:
+                self._preparing.discard(kw)
+                keep = html is not None and kw in self._window
+                if keep:
+                    self._entries[kw] = (config, pair, html)
+                    self._popped.discard(kw)
+
+            if pair and not keep:
+                self._release(kw, pair)
+                with self._lock:
+                    self._popped.discard(kw)
+            elif keep:
+                print(f"DEBUG: 已预渲染下一张卡片 '{kw}'")
+                # 预留的例句就是这张卡片将显示的例句，提前合成朗读音频（未开启时不做任何事）
+                tts_prefetcher.prefetch_reserved(kw, pair[0])
+
+    def _release(self, keyword: str, pair) -> None:
+        try:
+            with self.cache_lock:
+                save_cache(keyword, [list(pair)])
+        except Exception as e:
+            print(f"ERROR: 归还预留例句 '{keyword}' 失败: {e}")
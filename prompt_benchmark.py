@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+提示词 / 模型对比测试。
+
+提示词编辑器原来的"测试"只对一个关键词生成一次，选提示词和模型只能凭个别样例。这里对同一组
+关键词（默认从目标牌组随机抽取 30 个）分别用两个或更多"变体"（提示词模板 × 模型）生成：
+- 各变体的请求按关键词交错提交到例句生成的线程池（main_logic.executor），同时在途的请求
+  不超过 max_workers，与后台预取共用并发上限，各变体在相同的服务端负载下比较；
+- 每个请求记录延迟、token（接口返回 usage 时为实际值，否则估算）、能否解析出例句、
+  解析出的例句中缺少关键词的比例；
+- 汇总为每个变体的 p50/p95 延迟、平均 token、解析失败率、缺关键词率、请求失败数和吞吐。
+
+用量账本中记为 prompt_bench。在后台线程运行，进度与结果回调由调用方切回主线程。
+"""
+
+import concurrent.futures
+import threading
+import time
+
+from . import api_client
+from .config_manager import ConfigSnapshot
+from .sentence_validator import contains_keyword
+
+DEFAULT_KEYWORD_COUNT = 30
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class PromptBenchmark:
+    """对一组关键词运行多个变体；variants 为 [{"label", "prompt", "model"}, ...]"""
+
+    def __init__(self, config, variants, keywords, format_prompt, concurrency: int, submit=None):
+        self.config = config
+        self.variants = variants
+        self.keywords = keywords
+        # format_prompt(模板, 关键词) -> 填好占位符的提示词
+        self.format_prompt = format_prompt
+        self.concurrency = max(1, concurrency)
+        # submit(fn, *args) -> Future：共享线程池的提交函数；为 None 时使用独立线程池
+        self.submit = submit
+        self.stop_event = threading.Event()
+        self.results = {variant["label"]: [] for variant in variants}
+        self._lock = threading.Lock()
+
+    def total(self) -> int:
+        return len(self.variants) * len(self.keywords)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run(self, on_progress=None) -> dict:
+        """阻塞运行全部请求，返回 summary()；on_progress(已完成, 总数) 在工作线程调用"""
+        configs = {}
+        for variant in self.variants:
+            values = self.config.to_dict()
+            if variant.get("model"):
+                values["model_name"] = variant["model"]
+            configs[variant["label"]] = ConfigSnapshot(values)
+
+        done = [0]
+        total = self.total()
+        # 每次只向线程池提交 concurrency 个请求，不在共享线程池的队列里堆积、挤占预取
+        slots = threading.Semaphore(self.concurrency)
+
+        def job(variant, keyword):
+            if self.stop_event.is_set():
+                return
+            result = self._measure(configs[variant["label"]], variant, keyword)
+            with self._lock:
+                self.results[variant["label"]].append(result)
+                done[0] += 1
+                finished = done[0]
+            if on_progress:
+                on_progress(finished, total)
+
+        own_executor = None
+        submit = self.submit
+        if submit is None:
+            own_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                                 thread_name_prefix="PromptBenchmark")
+            submit = own_executor.submit
+
+        futures = []
+        try:
+            for keyword in self.keywords:
+                if self.stop_event.is_set():
+                    break
+                for variant in self.variants:
+                    slots.acquire()
+                    if self.stop_event.is_set():
+                        slots.release()
+                        break
+                    try:
+                        future = submit(job, variant, keyword)
+                    except RuntimeError as e:
+                        # 共享线程池已关闭（停止了后台工作线程）
+                        print(f"WARNING: 提示词对比测试无法提交请求: {e}")
+                        slots.release()
+                        self.stop_event.set()
+                        break
+                    # 完成或被线程池关闭时取消，都归还名额
+                    future.add_done_callback(lambda _future: slots.release())
+                    futures.append(future)
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"ERROR: 提示词对比测试请求出错: {e}")
+        finally:
+            if own_executor is not None:
+                own_executor.shutdown(wait=False)
+        return self.summary()
+
+    def _measure(self, config, variant, keyword) -> dict:
+        formatted_prompt = self.format_prompt(variant["prompt"], keyword)
+        start = time.time()
+        response = api_client.get_api_response(config, formatted_prompt, "prompt_bench")
+        end = time.time()
+        result = {"start": start, "end": end, "latency": end - start, "ok": False,
+                  "pairs": 0, "missing": 0, "estimated": False,
+                  "prompt_tokens": 0, "completion_tokens": 0}
+        if response is None or response.status_code != 200:
+            return result
+
+        result["ok"] = True
+        content = api_client.get_message_content(response, keyword)
+        usage = api_client.get_response_usage(response)
+        if usage:
+            result["prompt_tokens"], result["completion_tokens"], _ = usage
+        else:
+            result["prompt_tokens"] = api_client.estimate_tokens(formatted_prompt)
+            result["completion_tokens"] = api_client.estimate_tokens(content)
+            result["estimated"] = True
+        pairs = api_client.parse_message_content_to_sentence_pairs(content, keyword) if content else []
+        language = config.get("learning_language", "英语")
+        result["pairs"] = len(pairs)
+        result["missing"] = sum(1 for pair in pairs if not contains_keyword(pair[0], keyword, language))
+        return result
+
+    def summary(self) -> dict:
+        """label -> 汇总指标"""
+        with self._lock:
+            results = {label: list(items) for label, items in self.results.items()}
+
+        summary = {}
+        for label, items in results.items():
+            ok = [item for item in items if item["ok"]]
+            latencies = [item["latency"] * 1000 for item in ok]
+            sentences = sum(item["pairs"] for item in ok)
+            wall = (max(item["end"] for item in items) - min(item["start"] for item in items)) if items else 0
+            summary[label] = {
+                "requests": len(items),
+                "failed": len(items) - len(ok),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "prompt_tokens": sum(item["prompt_tokens"] for item in ok) / len(ok) if ok else 0,
+                "completion_tokens": sum(item["completion_tokens"] for item in ok) / len(ok) if ok else 0,
+                "estimated": any(item["estimated"] for item in ok),
+                "parse_failure_rate": sum(1 for item in ok if not item["pairs"]) / len(ok) if ok else 0,
+                "missing_keyword_rate": sum(item["missing"] for item in ok) / sentences if sentences else 0,
+                "requests_per_min": len(ok) * 60 / wall if wall else 0,
+                "sentences_per_min": sentences * 60 / wall if wall else 0,
+            }
+        return summary
+
+
+def format_summary(summary: dict) -> str:
+    """汇总表的纯文本形式，每个变体一段"""
+    lines = []
+    for label, s in summary.items():
+        estimated = "（估算）" if s["estimated"] else ""
+        lines.append(
+            f"【{label}】\n"
+            f"  请求 {s['requests']}，失败 {s['failed']}\n"
+            f"  延迟 p50 {s['p50_ms']:.0f} ms，p95 {s['p95_ms']:.0f} ms\n"
+            f"  平均 token：输入 {s['prompt_tokens']:.0f}，输出 {s['completion_tokens']:.0f}{estimated}\n"
+            f"  解析失败率 {s['parse_failure_rate']:.0%}，例句缺关键词率 {s['missing_keyword_rate']:.0%}\n"
+            f"  吞吐 {s['requests_per_min']:.1f} 请求/分钟，{s['sentences_per_min']:.1f} 例句/分钟"
+        )
+    return "\n\n".join(lines)
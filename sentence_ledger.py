@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+例句账本 —— 记录每张卡片在本次复习中显示的是哪个例句对。
+
+pop_cache 是破坏性的：撤销答题、mw.reset() 重新渲染、Web 端刷新都会让同一张卡片再取一个
+例句，关键词更快耗尽并触发新的付费生成。账本以卡片 ID 记录 (复习次数, 关键词, 例句对)：
+- 同一张卡片、复习次数（card.reps）未变 —— 重新渲染或撤销答题后 —— 返回同一个例句对；
+- 答题后 reps 增加，下次出现时取新例句；
+- 用户主动"刷新例句"时先 discard，再取新例句；
+- 复习中途离开（退出复习界面、关闭配置档案）时，已显示但未答题的例句放回缓存。
+"""
+
+import threading
+from collections import OrderedDict
+
+from .cache.cache_manager import save_cache
+from .sentence_recycler import sentence_recycler
+
+# 账本最多记录的卡片数（按最近使用淘汰）
+LEDGER_SIZE = 500
+
+
+class SentenceLedger:
+    """卡片 ID → 本次复习显示的例句对"""
+
+    def __init__(self, size: int = LEDGER_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        # card_id -> {"reps", "keyword", "pair", "answered"}
+        self._entries = OrderedDict()
+
+    def lookup(self, card, keyword: str):
+        """同一张卡片的同一次复习（重新渲染 / 撤销答题）返回已显示的例句对，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(card.id)
+            if entry is None or entry["reps"] != card.reps or entry["keyword"] != keyword:
+                return None
+            # 撤销答题后卡片回到未答状态
+            entry["answered"] = False
+            self._entries.move_to_end(card.id)
+            return entry["pair"]
+
+    def record(self, card, keyword: str, pair) -> None:
+        """记录卡片本次复习显示的例句对"""
+        with self._lock:
+            self._entries[card.id] = {
+                "reps": card.reps,
+                "keyword": keyword,
+                "pair": pair,
+                "answered": False,
+            }
+            self._entries.move_to_end(card.id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def mark_answered(self, card) -> None:
+        """答题后调用：该例句已被看完，离开复习时不再放回缓存；开启复用时写入归档"""
+        with self._lock:
+            entry = self._entries.get(card.id)
+            if entry is None or entry["answered"]:
+                return
+            entry["answered"] = True
+        sentence_recycler.archive(entry["keyword"], entry["pair"])
+
+    def discard(self, card) -> None:
+        """刷新例句：丢弃记录，下一次渲染取新例句"""
+        with self._lock:
+            self._entries.pop(card.id, None)
+
+    def abandon(self) -> int:
+        """复习中途离开：把已显示但未答题的例句放回缓存，返回放回的数量"""
+        with self._lock:
+            unanswered = [(card_id, entry) for card_id, entry in self._entries.items() if not entry["answered"]]
+            for card_id, _ in unanswered:
+                del self._entries[card_id]
+
+        returned = 0
+        for _, entry in unanswered:
+            try:
+                if save_cache(entry["keyword"], [list(entry["pair"])]):
+                    returned += 1
+            except Exception as e:
+                print(f"ERROR: 归还例句 '{entry['keyword']}' 失败: {e}")
+        if returned:
+            print(f"DEBUG: 离开复习，{returned} 个未答题的例句已放回缓存")
+        return returned
+
+
+# --- 单例实例 ---
+sentence_ledger = SentenceLedger()
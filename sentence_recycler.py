@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+例句间隔复用（可选，默认关闭）。
+
+每次复习消耗一个例句，生成量随复习总数线性增长；而间隔一年的成熟卡片早已忘了旧例句。
+开启后：
+- 答题后把例句写入归档表（sentence_archive），记录显示时间；
+- 关键词的新例句用尽时，若某条归档例句上次显示已超过阈值天数，直接复用它而不是排队生成；
+- 缓存耗尽时，若卡片间隔已不短于阈值（下次出现时刚显示的例句必然可复用），不再补货；
+- 预取时跳过可复用的关键词。
+
+阈值：sentence_recycle_stability_factor > 0 且卡片有 FSRS 稳定性时为 稳定性 × 系数，
+否则为 sentence_recycle_min_days；两者同时生效时取较大值。
+"""
+
+from .cache.cache_manager import archive_sentence, has_recyclable_sentence, recycle_sentence
+from .config_manager import get_config
+
+
+class SentenceRecycler:
+    """按配置阈值在归档例句与重新生成之间做选择"""
+
+    def enabled(self) -> bool:
+        return bool(get_config().get("sentence_recycling_enabled", False))
+
+    def threshold_days(self, card=None) -> float:
+        config = get_config()
+        min_days = float(config.get("sentence_recycle_min_days", 60) or 0)
+        factor = float(config.get("sentence_recycle_stability_factor", 0) or 0)
+        stability = card_stability(card) if factor > 0 else None
+        if stability:
+            return max(min_days, stability * factor)
+        return min_days
+
+    def archive(self, keyword: str, pair) -> None:
+        """答题后调用：记录例句的显示时间"""
+        if keyword and pair and self.enabled():
+            archive_sentence(keyword, pair)
+
+    def take(self, card, keyword: str):
+        """新例句用尽时取一条可复用的归档例句，没有则返回 None"""
+        if not self.enabled():
+            return None
+        pair = recycle_sentence(keyword, self.threshold_days(card))
+        if pair:
+            print(f"DEBUG: 复用归档例句 '{keyword}'，跳过生成")
+        return pair
+
+    def can_recycle(self, card, keyword: str) -> bool:
+        """预取时判断：该关键词现在就有可复用的归档例句"""
+        return self.enabled() and has_recyclable_sentence(keyword, self.threshold_days(card))
+
+    def will_recycle(self, card) -> bool:
+        """缓存耗尽时判断：卡片下次出现时刚显示的例句已可复用，无需补货"""
+        if card is None or not self.enabled():
+            return False
+        interval = getattr(card, "ivl", 0) or 0
+        return getattr(card, "type", 0) == 2 and interval >= self.threshold_days(card)
+
+
+def card_stability(card):
+    """FSRS 记忆稳定性（天）；未启用 FSRS 或读取失败时返回 None"""
+    try:
+        memory_state = getattr(card, "memory_state", None)
+        return float(memory_state.stability) if memory_state else None
+    except Exception:
+        return None
+
+
+# --- 单例实例 ---
+sentence_recycler = SentenceRecycler()
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+例句校验 —— 位于 parse_response 与 save_cache 之间。
+
+提示词要求每个例句都包含关键词，但模型并不总是遵守；不合格的例句一旦进缓存，
+就会被展示给用户，再由"刷新例句"触发一次完整生成。这里在入缓存前做两项检查：
+- 关键词出现检查：去掉括号释义，按学习语言的小型词形表做屈折变化匹配；
+- 去重：拒绝与同批或已缓存例句完全相同或高度相似的句子。
+"""
+
+import re
+import unicodedata
+
+# 近似重复判定阈值：两句词集合 Jaccard 相似度达到该值即视为重复
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# 各学习语言的匹配方式：
+#   english  —— 英语构词规则 + 不规则变化表，排除 ENGLISH_DERIVED 中的派生词（book -> booking）
+#   stem     —— 去掉词尾后按词干前缀匹配，允许有限长度的屈折词尾（罗曼/日耳曼/斯拉夫语）
+#   substring —— 无空格分词或黏着语，按（去词尾后的）子串匹配
+LANGUAGE_RULES = {
+    "英语": {"mode": "english"},
+    "法语": {"mode": "stem", "endings": ("er", "ir", "re", "e", "s", "x"), "max_suffix": 5},
+    "西班牙语": {"mode": "stem", "endings": ("ar", "er", "ir", "o", "a", "s", "es"), "max_suffix": 5},
+    "意大利语": {"mode": "stem", "endings": ("are", "ere", "ire", "o", "a", "e", "i"), "max_suffix": 5},
+    "葡萄牙语": {"mode": "stem", "endings": ("ar", "er", "ir", "o", "a", "s", "es"), "max_suffix": 5},
+    "德语": {"mode": "stem", "endings": ("en", "n", "e"), "max_suffix": 4, "compound": True},
+    "俄语": {"mode": "stem", "endings": ("ть", "ться", "ь", "а", "я", "о", "е", "й", "ы", "и"), "max_suffix": 4},
+    "日语": {"mode": "substring", "endings": ("る", "う", "く", "ぐ", "す", "つ", "ぬ", "ぶ", "む", "い", "だ", "な")},
+    "韩语": {"mode": "substring", "endings": ("하다", "다")},
+    "阿拉伯语": {"mode": "substring", "endings": ()},
+    "印地语": {"mode": "substring", "endings": ()},
+}
+
+# 英语常见不规则变化（原形 -> 变化形式）
+ENGLISH_IRREGULAR = {
+    "be": ("am", "is", "are", "was", "were", "been", "being"),
+    "have": ("has", "had", "having"),
+    "do": ("does", "did", "done", "doing"),
+    "go": ("goes", "went", "gone", "going"),
+    "say": ("says", "said"),
+    "make": ("made",),
+    "take": ("took", "taken"),
+    "come": ("came",),
+    "see": ("saw", "seen"),
+    "know": ("knew", "known"),
+    "get": ("got", "gotten"),
+    "give": ("gave", "given"),
+    "find": ("found",),
+    "think": ("thought",),
+    "tell": ("told",),
+    "become": ("became",),
+    "leave": ("left",),
+    "feel": ("felt",),
+    "bring": ("brought",),
+    "begin": ("began", "begun"),
+    "keep": ("kept",),
+    "hold": ("held",),
+    "write": ("wrote", "written"),
+    "stand": ("stood",),
+    "hear": ("heard",),
+    "mean": ("meant",),
+    "meet": ("met",),
+    "run": ("ran",),
+    "pay": ("paid",),
+    "sit": ("sat",),
+    "speak": ("spoke", "spoken"),
+    "lie": ("lay", "lain", "lying"),
+    "lead": ("led",),
+    "grow": ("grew", "grown"),
+    "lose": ("lost",),
+    "fall": ("fell", "fallen"),
+    "send": ("sent",),
+    "build": ("built",),
+    "understand": ("understood",),
+    "draw": ("drew", "drawn"),
+    "break": ("broke", "broken"),
+    "spend": ("spent",),
+    "rise": ("rose", "risen"),
+    "drive": ("drove", "driven"),
+    "buy": ("bought",),
+    "wear": ("wore", "worn"),
+    "choose": ("chose", "chosen"),
+    "seek": ("sought",),
+    "throw": ("threw", "thrown"),
+    "catch": ("caught",),
+    "teach": ("taught",),
+    "fight": ("fought",),
+    "eat": ("ate", "eaten"),
+    "drink": ("drank", "drunk"),
+    "sell": ("sold",),
+    "fly": ("flew", "flown", "flies"),
+    "forget": ("forgot", "forgotten"),
+    "swim": ("swam", "swum"),
+    "sing": ("sang", "sung"),
+    "ring": ("rang", "rung"),
+    "sink": ("sank", "sunk"),
+    "shrink": ("shrank", "shrunk"),
+    "ride": ("rode", "ridden"),
+    "hide": ("hid", "hidden"),
+    "bite": ("bit", "bitten"),
+    "shake": ("shook", "shaken"),
+    "steal": ("stole", "stolen"),
+    "freeze": ("froze", "frozen"),
+    "wake": ("woke", "woken"),
+    "forgive": ("forgave", "forgiven"),
+    "bear": ("bore", "born", "borne"),
+    "tear": ("tore", "torn"),
+    "swear": ("swore", "sworn"),
+    "blow": ("blew", "blown"),
+    "show": ("shown",),
+    "beat": ("beaten",),
+    "dig": ("dug",),
+    "hang": ("hung",),
+    "shoot": ("shot",),
+    "sleep": ("slept",),
+    "sweep": ("swept",),
+    "lend": ("lent",),
+    "bend": ("bent",),
+    "deal": ("dealt",),
+    "feed": ("fed",),
+    "flee": ("fled",),
+    "win": ("won",),
+    "spin": ("spun",),
+    "stick": ("stuck",),
+    "strike": ("struck",),
+    "swing": ("swung",),
+    "lay": ("laid",),
+    "light": ("lit",),
+    "learn": ("learnt",),
+    "burn": ("burnt",),
+    "dream": ("dreamt",),
+    "smell": ("smelt",),
+    "goose": ("geese",),
+    "far": ("farther", "further", "farthest", "furthest"),
+    "little": ("less", "least"),
+    "many": ("more", "most"),
+    "much": ("more", "most"),
+    "child": ("children",),
+    "man": ("men",),
+    "woman": ("women",),
+    "person": ("people",),
+    "foot": ("feet",),
+    "tooth": ("teeth",),
+    "mouse": ("mice",),
+    "good": ("better", "best"),
+    "bad": ("worse", "worst"),
+}
+
+# 规则生成的形式中实际是派生词的（名词 -ing、-dom 等），提示词要求用原词，不算命中
+ENGLISH_DERIVED = {
+    "book": ("booking", "bookings"),
+    "king": ("kingdom", "kingdoms"),
+    "friend": ("friendship",),
+    "free": ("freedom",),
+    "wise": ("wisdom",),
+}
+
+_VOWELS = "aeiou"
+
+
+def strip_gloss(keyword: str) -> str:
+    """去掉关键词后的括号释义：'bank (河岸)' / 'bank（河岸）' -> 'bank'"""
+    return re.sub(r'\s*[（(][^（()）]*[)）]', '', keyword or "").strip()
+
+
+def _normalize(text: str) -> str:
+    """小写、去 HTML 标签、去重音符号（é -> e，ä -> a），阿拉伯语等的附加符号一并去除"""
+    text = re.sub(r'<.*?>', '', text or "").lower()
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    # 重新组合，避免韩文等被分解为字母后无法与词尾表比较
+    return unicodedata.normalize("NFC", stripped)
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"\w+", text)
+
+
+def _english_forms(word: str) -> set:
+    """生成英语单词的常见屈折形式（去掉 ENGLISH_DERIVED 中列出的派生词）"""
+    forms = {word, word + "s", word + "es", word + "ed", word + "d", word + "ing", word + "er", word + "est"}
+    if len(word) > 2 and word.endswith("y") and word[-2] not in _VOWELS:
+        stem = word[:-1]
+        forms |= {stem + "ies", stem + "ied", stem + "ier", stem + "iest"}
+    if word.endswith("ie"):
+        forms.add(word[:-2] + "ying")
+    elif word.endswith("e"):
+        forms |= {word + "r", word + "st"}
+        if not word.endswith("ee"):
+            forms.add(word[:-1] + "ing")
+    if len(word) >= 3 and word[-1] not in _VOWELS + "wxy" and word[-2] in _VOWELS and word[-3] not in _VOWELS:
+        doubled = word + word[-1]
+        forms |= {doubled + "ing", doubled + "ed", doubled + "er", doubled + "est"}
+    if word.endswith("fe"):
+        forms.add(word[:-2] + "ves")
+    elif word.endswith("f"):
+        forms.add(word[:-1] + "ves")
+    if word.endswith("ic"):
+        forms |= {word + "ked", word + "king"}
+    forms.update(ENGLISH_IRREGULAR.get(word, ()))
+    return forms - set(ENGLISH_DERIVED.get(word, ()))
+
+
+def _strip_ending(word: str, endings, min_stem: int = 2) -> str:
+    """去掉最长的一个词尾，词干至少保留 min_stem 个字符"""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= min_stem:
+            return word[:-len(ending)]
+    return word
+
+
+def _word_present(word: str, sentence_tokens: list, rules: dict) -> bool:
+    mode = rules.get("mode")
+    if mode == "english":
+        forms = _english_forms(word)
+        for token in sentence_tokens:
+            if token in forms:
+                return True
+            # 允许作为复合词的后半部分出现（notebook 中的 book），前缀至少 3 个字母
+            if len(word) >= 4 and any(token.endswith(form) and len(token) - len(form) >= 3 for form in forms):
+                return True
+        return False
+
+    stem = _strip_ending(word, rules.get("endings", ()))
+    max_suffix = rules.get("max_suffix", 4)
+    for token in sentence_tokens:
+        if token == word:
+            return True
+        if rules.get("compound") and stem in token:
+            return True
+        if token.startswith(stem) and len(token) - len(stem) <= max_suffix:
+            return True
+        # 德语过去分词 ge- 前缀
+        if token.startswith("ge" + stem) and len(token) - len(stem) - 2 <= max_suffix:
+            return True
+    return False
+
+
+def contains_keyword(sentence: str, keyword: str, language: str) -> bool:
+    """判断例句是否包含关键词（允许屈折变化）。关键词可用 '/' 分隔多个写法，任一命中即可"""
+    base = strip_gloss(keyword)
+    if not base:
+        return True
+    text = _normalize(sentence)
+    rules = LANGUAGE_RULES.get(language, {"mode": "substring", "endings": ()})
+
+    for variant in filter(None, (v.strip() for v in base.split("/"))):
+        variant = _normalize(variant)
+        if rules["mode"] == "substring":
+            if variant in text or _strip_ending(variant, rules.get("endings", ()), min_stem=1) in text:
+                return True
+            continue
+        if re.search(r'\b' + re.escape(variant) + r'\b', text):
+            return True
+        # 短语：每个词都须以某种屈折形式出现（允许可分动词、插入成分）
+        sentence_tokens = _tokens(text)
+        if all(_word_present(word, sentence_tokens, rules) for word in _tokens(variant)):
+            return True
+    return False
+
+
+def _shingles(sentence: str, language: str) -> set:
+    """相似度计算单元：有空格分词的语言用词集合，其余用字符二元组"""
+    text = _normalize(sentence)
+    rules = LANGUAGE_RULES.get(language, {"mode": "substring"})
+    if rules["mode"] != "substring" or language in ("阿拉伯语", "印地语", "韩语"):
+        tokens = set(_tokens(text))
+        if tokens:
+            return tokens
+    compact = re.sub(r"\W+", "", text)
+    return {compact[i:i + 2] for i in range(max(len(compact) - 1, 1))}
+
+
+def _is_near_duplicate(shingles: set, seen: list) -> bool:
+    for other in seen:
+        union = shingles | other
+        if union and len(shingles & other) / len(union) >= NEAR_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def validate_sentence_pairs(sentence_pairs: list, keyword: str, language: str, existing_pairs=None) -> tuple:
+    """
+    校验一批例句对。
+    返回 (accepted, rejected_missing, rejected_duplicate)：
+    accepted 为通过的例句对；后两者为被拒绝的例句对，分别因缺少关键词、与已有例句重复。
+    existing_pairs 为该关键词已缓存的例句对，参与去重但不参与输出。
+    """
+    seen = [_shingles(pair[0], language) for pair in (existing_pairs or []) if pair]
+    accepted, rejected_missing, rejected_duplicate = [], [], []
+
+    for pair in sentence_pairs:
+        sentence = pair[0]
+        if not contains_keyword(sentence, keyword, language):
+            rejected_missing.append(pair)
+            continue
+        shingles = _shingles(sentence, language)
+        if _is_near_duplicate(shingles, seen):
+            rejected_duplicate.append(pair)
+            continue
+        seen.append(shingles)
+        accepted.append(pair)
+
+    return accepted, rejected_missing, rejected_duplicate
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+打开配置档案时预热例句缓存。
+
+原来缓存只由预取窗口在复习时逐步填充：每次开始复习的前几张卡片几乎必然缓存未命中，要在卡片上
+等待生成。这里在 profile_did_open 之后（延迟 PREWARM_DELAY_MS，让主窗口先完成加载）：
+- 确保生成线程已启动（关闭配置档案时 stop_worker 会停掉它）；
+- 用一条 SQL 按近似调度器顺序（到期的学习中 → 到期复习 → 新卡片）取目标牌组今天的前
+  prewarm_card_count 张卡片（默认 30，0 为关闭）；
+- 跳过已有缓存或可复用归档例句的关键词，前 URGENT_COUNT 个以紧急优先级入队，其余按顺序预取。
+
+只在主线程调用。
+"""
+
+from aqt import mw, gui_hooks
+from PyQt6.QtCore import QTimer
+
+from .cache.cache_manager import load_cache
+from .config_manager import get_config
+from .deck_resolver import deck_resolver
+from .inventory_planner import inventory_planner
+from .keyword_index import keyword_index
+from .sentence_recycler import sentence_recycler
+
+PREWARM_DELAY_MS = 2000
+# 以紧急优先级生成的关键词数（开始复习的前几张卡片）
+URGENT_COUNT = 3
+
+
+class SessionPrewarm:
+    """打开配置档案时为今天的到期卡片填充缓存"""
+
+    def __init__(self, task_manager, start_worker):
+        self.task_manager = task_manager
+        self.start_worker = start_worker
+
+    def _on_profile_did_open(self) -> None:
+        QTimer.singleShot(PREWARM_DELAY_MS, self.run)
+
+    def run(self) -> None:
+        if mw.col is None:
+            return
+        count = int(get_config().get("prewarm_card_count", 30) or 0)
+        if count <= 0:
+            return
+
+        if self.task_manager.executor is None:
+            self.start_worker()
+
+        keywords = []
+        seen = set()
+        for card in keyword_index.due_cards(deck_resolver.target_deck_ids(), count):
+            keyword = keyword_index.keyword_for_note(card.nid)
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            inventory_planner.observe(card, keyword)
+            if load_cache(keyword) or sentence_recycler.can_recycle(card, keyword):
+                continue
+            keywords.append(keyword)
+
+        if not keywords:
+            print("DEBUG: 预热：今天的到期卡片均已有例句")
+            return
+
+        items = [(0 if index < URGENT_COUNT else index + 1, keyword) for index, keyword in enumerate(keywords)]
+        self.task_manager.enqueue_prefetch(items)
+        print(f"DEBUG: 预热：{len(keywords)} 个关键词入队（紧急 {min(len(keywords), URGENT_COUNT)} 个）")
+
+    def register_hooks(self) -> None:
+        gui_hooks.profile_did_open.append(self._on_profile_did_open)
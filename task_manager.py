@@ -5,11 +5,19 @@ import threading
 import time
 import traceback
 import concurrent.futures
-from anki.cards import Card
 
-from .config_manager import get_config, clean_html
+from .config_manager import get_config
 from .cache.cache_manager import load_cache, save_cache, pop_cache
-from .api_client import generate_ai_sentence
+from .api_client import generate_ai_sentence, build_generation_prompt
+from .generation_process import GenerationProcess
+from .local_backend import local_backend, is_local_url, MAX_LOCAL_SLOTS
+from .deck_resolver import deck_resolver
+from .sentence_recycler import sentence_recycler
+from .inventory_planner import inventory_planner
+from .keyword_index import keyword_index, CardInfo
+from .lookahead_tuner import lookahead_tuner
+from .card.card_template_manager import card_template_engine
+from .tts.tts_prefetcher import tts_prefetcher
 
 
 class SentenceTaskManager:
@@ -25,7 +33,15 @@ class SentenceTaskManager:
         self._manager_thread: threading.Thread = None
         self.showing_sentence: str = ""
         self.showing_translation: str = ""
+        # 完成回调 on_keyword_ready(keyword, handoff_pair)，在主线程调用
         self.on_keyword_ready = None
+        # is_reserved(keyword)：例句是否已被预渲染预留（已从缓存取出、尚未显示）。
+        # 预取窗口把这类关键词视为有缓存，不为它们提前生成（用完时由 _handle_cache_hit 判断是否补货）
+        self.is_reserved = lambda keyword: False
+        # 主线程正在等待的关键词：其生成结果的第一句不入缓存，随完成通知直接交给等待方
+        self.waiting_keyword: str = None
+        # 可选的独立生成进程（generation_worker_process），未启用时为 None
+        self.generation_process: GenerationProcess = None
 
     # --- Lifecycle ---
 
@@ -38,20 +54,40 @@ class SentenceTaskManager:
         self.stop_event.clear()
         api_url = config.get("api_url", "")
 
-        if "ollama" in api_url.lower() or "localhost" in api_url.lower() or "127.0.0.1" in api_url.lower():
+        if is_local_url(api_url):
+            # 本地模型：先按单线程运行，后台探测服务端并行槽位后再放开并发；
+            # 线程池按上限预留线程，实际并发由 _worker_manager 按 max_workers 控制
             self.max_workers = 1
-            print("DEBUG: 检测到ollama或localhost API，启用单线程模式")
+            pool_size = MAX_LOCAL_SLOTS
+            threading.Thread(target=self._prepare_local_backend, args=(config,), daemon=True).start()
+            print("DEBUG: 检测到ollama或localhost API，探测并行槽位前先以单线程运行")
         else:
             self.max_workers = 3
+            pool_size = self.max_workers
             print("DEBUG: 使用多线程模式（3个线程）")
 
         self.executor = concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_workers, thread_name_prefix='SentenceWorker'
+            max_workers=pool_size, thread_name_prefix='SentenceWorker'
         )
+        if config.get("generation_worker_process", False):
+            process = GenerationProcess()
+            if process.start(config, pool_size):
+                self.generation_process = process
         self._manager_thread = threading.Thread(target=self._worker_manager, daemon=True)
         self._manager_thread.start()
         print(f"DEBUG: 句子处理线程池及管理器已启动（{self.max_workers}个线程）。")
 
+    def _prepare_local_backend(self, config: dict) -> None:
+        """后台线程：探测本地服务的并行槽位并调整并发数，然后预加载模型"""
+        try:
+            slots = local_backend.resolve_parallel_slots(config)
+            if not self.stop_event.is_set():
+                self.max_workers = slots
+                print(f"DEBUG: 本地模型服务并行槽位为 {slots}，并发数已调整为 {slots}")
+            local_backend.preload(config)
+        except Exception as e:
+            print(f"ERROR: 本地模型后端初始化失败: {e}")
+
     def stop(self) -> None:
         """停止管理器线程和线程池"""
         # 取消注册右键菜单
@@ -88,6 +124,10 @@ class SentenceTaskManager:
             print("DEBUG: Thread pool shutdown initiated.")
             self.executor = None
 
+        if self.generation_process is not None:
+            self.generation_process.stop()
+            self.generation_process = None
+
         self._manager_thread = None
         print("DEBUG: All workers stopped immediately.")
 
@@ -113,7 +153,8 @@ class SentenceTaskManager:
                 else:
                     keywords_to_process = [keywords] if not load_cache(keywords) and keywords not in self.processing_keywords else []
             else:
-                keywords_to_process = [kw for kw in keywords if not load_cache(kw) and kw not in self.processing_keywords]
+                keywords_to_process = [kw for kw in keywords if not self._has_sentences(kw)
+                                       and kw not in self.processing_keywords]
 
             if not keywords_to_process:
                 return
@@ -163,57 +204,70 @@ class SentenceTaskManager:
             for priority, kw in updated_tasks:
                 self.task_queue.put((priority, kw))
 
+    def _has_sentences(self, keyword) -> bool:
+        """缓存中有例句，或已有一句被预渲染预留"""
+        return bool(load_cache(keyword)) or self.is_reserved(keyword)
+
+    def enqueue_prefetch(self, items):
+        """把预取窗口中尚未排队、未在处理且没有缓存的关键词加入队列，不重排已有任务。items: [(优先级, 关键词), ...]"""
+        with self.cache_lock:
+            with self.task_queue.mutex:
+                queued = {kw for _, kw in self.task_queue.queue}
+            for priority, kw in items:
+                if kw in queued or kw in self.processing_keywords or self._has_sentences(kw):
+                    continue
+                queued.add(kw)
+                self.task_queue.put((priority, kw))
+
     def get_upcoming_card_keywords(self, deck_name):
         """获取接下来的卡片关键词（调度器队列+学习中卡片），并过滤掉已有缓存的关键词"""
-        is_single_threaded = self.executor is not None and self.max_workers == 1
-        fetch_limit = 100 if is_single_threaded else 20
+        # 窗口深度按复习节奏、生成耗时与命中率自动调节
+        fetch_limit = lookahead_tuner.depth(self.max_workers if self.executor is not None else 0)
 
         output = mw.col.sched.get_queued_cards(fetch_limit=fetch_limit, intraday_learning_only=False)
         queued_cards = output.cards[1:] if output.cards else []  # 跳过第一张（当前卡片）
 
         # 补充学习中的卡片（调度器已吐出过的不在队列中）
-        learn_card_ids = aqt.mw.col.find_cards(f"deck:{deck_name} is:learn")
-        learn_cards = []
-        for cid in learn_card_ids:
-            try:
-                learn_cards.append(mw.col.get_card(cid))
-            except Exception:
-                continue
+        learn_cards = keyword_index.learning_cards(deck_resolver.subtree_ids(deck_name))
 
         seen_keywords = set()
         keywords = []
 
-        for kw in self._iter_card_keywords(queued_cards, deck_name, use_backend=True):
+        for kw in self._iter_card_keywords([CardInfo.from_backend(q.card) for q in queued_cards], deck_name):
             if kw not in seen_keywords:
                 seen_keywords.add(kw)
                 keywords.append(kw)
 
-        for kw in self._iter_card_keywords(learn_cards, deck_name, use_backend=False):
+        for kw in self._iter_card_keywords(learn_cards, deck_name):
             if kw not in seen_keywords:
                 seen_keywords.add(kw)
                 keywords.append(kw)
 
         return keywords
 
-    def _iter_card_keywords(self, cards, deck_name, use_backend=True):
-        """从卡片列表中提取目标牌组的关键词（已过滤缓存）"""
-        for card_or_queued in cards:
-            try:
-                if use_backend:
-                    upcoming_card = Card(mw.col, backend_card=card_or_queued.card)
-                else:
-                    upcoming_card = card_or_queued
+    def get_next_card_keywords(self, deck_name, count):
+        """调度器接下来 count 张目标卡片的关键词（不过滤缓存，用于预渲染）"""
+        output = mw.col.sched.get_queued_cards(fetch_limit=count + 1, intraday_learning_only=False)
+        queued_cards = output.cards[1:] if output.cards else []  # 跳过第一张（当前卡片）
+        return list(self._iter_card_keywords([CardInfo.from_backend(q.card) for q in queued_cards],
+                                             deck_name, skip_cached=False))
 
-                card_deck_name = aqt.mw.col.decks.name(upcoming_card.did)
-                if not (card_deck_name == deck_name or card_deck_name.startswith(deck_name + "::")):
+    def _iter_card_keywords(self, cards, deck_name, skip_cached=True):
+        """从 CardInfo 列表中提取目标牌组的关键词（skip_cached 为真时过滤已有缓存的）"""
+        deck_ids = deck_resolver.subtree_ids(deck_name)
+        for upcoming_card in cards:
+            try:
+                if upcoming_card.did not in deck_ids:
                     continue
 
-                note = upcoming_card.note()
-                first_field = note.fields[0] if note.fields else ""
-                cleaned_keyword = clean_html(first_field)
-
-                if cleaned_keyword and not load_cache(cleaned_keyword):
-                    yield cleaned_keyword
+                cleaned_keyword = keyword_index.keyword_for_note(upcoming_card.nid)
+                if not cleaned_keyword:
+                    continue
+                inventory_planner.observe(upcoming_card, cleaned_keyword)
+                if skip_cached and (self._has_sentences(cleaned_keyword)
+                                    or sentence_recycler.can_recycle(upcoming_card, cleaned_keyword)):
+                    continue
+                yield cleaned_keyword
             except Exception:
                 continue
 
@@ -233,12 +287,35 @@ class SentenceTaskManager:
         config = get_config()
         print(f"DEBUG:正在处理关键词: {keyword} (优先级: {priority})")
 
+        # 按优先级区分调用来源，写入用量账本：0=当前卡片等待，999=缓存耗尽补货，其余为预取
+        if priority == 0:
+            purpose = "urgent"
+        elif priority == 999:
+            purpose = "repopulate"
+        else:
+            purpose = "prefetch"
+
         try:
-            sentence_pairs = generate_ai_sentence(config, keyword)
+            start_time = time.monotonic()
+            sentence_pairs = self._generate(config, keyword, purpose, inventory_planner.batch_size(keyword))
+            if sentence_pairs:
+                lookahead_tuner.record_generation(time.monotonic() - start_time)
 
+            handoff_pair = None
             if sentence_pairs:
                 with self.cache_lock:
-                    save_cache(keyword, sentence_pairs)
+                    if keyword == self.waiting_keyword:
+                        handoff_pair, sentence_pairs = sentence_pairs[0], sentence_pairs[1:]
+                    if sentence_pairs:
+                        save_cache(keyword, sentence_pairs)
+                # 写入缓存时预先生成渲染片段（高亮 HTML、朗读文本），翻卡时只需拼接
+                card_template_engine.precompute(sentence_pairs)
+                if handoff_pair:
+                    card_template_engine.precompute([handoff_pair])
+                    tts_prefetcher.prefetch_sentences([handoff_pair[0]])
+                # 提前合成单词和下一个将显示的例句的朗读音频（未开启时不做任何事）
+                tts_prefetcher.prefetch_keywords([keyword])
+            return handoff_pair
 
         except Exception as e:
             print(f"ERROR: Worker failed to generate/cache sentences for '{keyword}': {type(e).__name__} - {str(e)}")
@@ -248,6 +325,24 @@ class SentenceTaskManager:
                 if keyword in self.processing_keywords:
                     self.processing_keywords.remove(keyword)
 
+    def _generate(self, config, keyword, purpose, sentence_count):
+        """生成一个关键词的例句：启用独立生成进程时只在本进程格式化提示词，其余交给子进程；
+        子进程不可用时退回进程内生成"""
+        # 两阶段生成：只生成例句，翻译由 translation_service 在答案面需要时批量补上
+        sentence_only = bool(config.get("two_phase_generation", False))
+        process = self.generation_process
+        if process is not None:
+            prompt = build_generation_prompt(config, keyword, sentence_count=sentence_count,
+                                             sentence_only=sentence_only)
+            sentence_pairs = process.generate(config, keyword, prompt, purpose, sentence_count)
+            if sentence_pairs is not None:
+                return sentence_pairs
+            if self.stop_event.is_set():
+                return []
+            print(f"WARNING: 生成进程不可用，'{keyword}' 改为进程内生成")
+        return generate_ai_sentence(config, keyword, purpose=purpose, sentence_count=sentence_count,
+                                    sentence_only=sentence_only)
+
     def _worker_manager(self):
         """后台工作线程管理器，从队列中获取任务并提交到线程池"""
         if self.executor is None:
@@ -259,6 +354,11 @@ class SentenceTaskManager:
                 if self.executor._work_queue.qsize() >= self.max_workers:
                     time.sleep(0.1)
                     continue
+                with self.cache_lock:
+                    in_flight = len(self.processing_keywords)
+                if in_flight >= self.max_workers:
+                    time.sleep(0.1)
+                    continue
 
                 try:
                     priority, keyword = self.task_queue.get(timeout=0.1)
@@ -276,6 +376,7 @@ class SentenceTaskManager:
 
                 def task_completed_callback(f, completed_keyword=keyword):
                     self.task_queue.task_done()
+                    handoff_pair = None if f.cancelled() or f.exception() else f.result()
                     with self.cache_lock:
                         remaining_tasks = self.task_queue.qsize() + len(self.processing_keywords)
                     message = f"后台缓存+1，生成队列剩余: {remaining_tasks} 个。"
@@ -284,7 +385,7 @@ class SentenceTaskManager:
                         aqt.utils.tooltip(message, period=2000, parent=mw)
                         if self.on_keyword_ready is not None:
                             try:
-                                self.on_keyword_ready(completed_keyword)
+                                self.on_keyword_ready(completed_keyword, handoff_pair)
                             except Exception as e:
                                 print(f"ERROR: on_keyword_ready callback failed for '{completed_keyword}': {e}")
 
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+两阶段生成的翻译服务（可选，默认关闭）。
+
+每个例句对都附带中文翻译，约占输出 token 与生成耗时的四成；而很多卡片在正面就作答，
+从不翻面。开启 two_phase_generation 后批量生成只产出例句（翻译为空字符串），翻译在这里完成：
+- 答案面即将显示而译文未就绪时，先显示占位条并请求翻译，译文到达后原地填入；
+- 可能翻面的卡片提前翻译：新卡片和学习中卡片在题面显示时立即请求；复习卡片在题面停留
+  超过 AHEAD_DELAY_MS 才请求（一眼认出、直接在正面作答的卡片不花翻译费用）；
+- BATCH_WINDOW_S 内到达的请求合并为一次调用，每批最多 MAX_BATCH 句；正在翻译的例句再次被
+  请求（例如提前翻译还没返回就翻面）时只追加回调，不重复调用；
+- 译文按例句写入 SQLite（translation_cache），内存中保留最近 MEMORY_SIZE 条。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from aqt import mw
+from PyQt6.QtCore import QTimer
+
+from .api_client import translate_sentences
+from .cache.cache_manager import load_translations, save_translations
+from .config_manager import get_config
+
+BATCH_WINDOW_S = 0.15
+MAX_BATCH = 8
+MEMORY_SIZE = 1000
+AHEAD_DELAY_MS = 2000
+
+
+class TranslationService:
+    """按例句缓存译文，后台合并批量翻译"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._memory = OrderedDict()
+        # 例句 -> 译文到达后在主线程调用的回调列表
+        self._pending = OrderedDict()
+        # 已取出、正在翻译的例句 -> 回调列表（翻译期间的新请求追加到这里）
+        self._in_flight = {}
+        self._thread = None
+
+    def enabled(self) -> bool:
+        return bool(get_config().get("two_phase_generation", False))
+
+    def lookup(self, sentence: str):
+        """已缓存的译文，没有则返回 None"""
+        if not sentence:
+            return None
+        with self._cond:
+            translation = self._memory.get(sentence)
+            if translation is not None:
+                self._memory.move_to_end(sentence)
+                return translation
+        translation = load_translations([sentence]).get(sentence)
+        if translation:
+            self._remember({sentence: translation})
+        return translation
+
+    def request(self, sentences, callback=None) -> None:
+        """后台翻译；callback(sentence, translation) 在主线程调用，失败时 translation 为 None"""
+        with self._cond:
+            for sentence in sentences:
+                if not sentence:
+                    continue
+                callbacks = self._in_flight.get(sentence)
+                if callbacks is None:
+                    callbacks = self._pending.setdefault(sentence, [])
+                if callback is not None:
+                    callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="TranslationService")
+                self._thread.start()
+            self._cond.notify()
+
+    def prefetch_for(self, card, sentence: str) -> None:
+        """主线程：题面显示了一个还没有译文的例句时调用"""
+        if not sentence or not self.enabled() or self.lookup(sentence):
+            return
+        if card is None or getattr(card, "type", 2) != 2:
+            self.request([sentence])
+            return
+        QTimer.singleShot(AHEAD_DELAY_MS, lambda: self._prefetch_if_showing(sentence))
+
+    def _prefetch_if_showing(self, sentence: str) -> None:
+        from . import main_logic
+
+        if main_logic.showing_sentence == sentence and not main_logic.showing_translation:
+            self.request([sentence])
+
+    def _remember(self, translations: dict) -> None:
+        with self._cond:
+            for sentence, translation in translations.items():
+                self._memory[sentence] = translation
+                self._memory.move_to_end(sentence)
+            while len(self._memory) > MEMORY_SIZE:
+                self._memory.popitem(last=False)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # 等一小段时间，把接连到达的请求合并成一批
+            time.sleep(BATCH_WINDOW_S)
+            with self._cond:
+                batch = list(self._pending.items())[:MAX_BATCH]
+                for sentence, callbacks in batch:
+                    del self._pending[sentence]
+                    self._in_flight[sentence] = callbacks
+
+            sentences = [sentence for sentence, _ in batch]
+            try:
+                translations = load_translations(sentences)
+                todo = [sentence for sentence in sentences if sentence not in translations]
+                if todo:
+                    result = translate_sentences(get_config(), todo)
+                    if result:
+                        fresh = dict(zip(todo, result))
+                        save_translations(fresh)
+                        translations.update(fresh)
+                        print(f"DEBUG: 已翻译 {len(fresh)} 个例句")
+                self._remember(translations)
+            except Exception as e:
+                print(f"ERROR: 批量翻译例句失败: {e}")
+                translations = {}
+
+            with self._cond:
+                # 取出时回调列表可能已被翻译期间的请求追加
+                batch = [(sentence, self._in_flight.pop(sentence, [])) for sentence in sentences]
+            for sentence, callbacks in batch:
+                for callback in callbacks:
+                    mw.taskman.run_on_main(
+                        lambda cb=callback, s=sentence: cb(s, translations.get(s)))
+
+
+# --- 单例实例 ---
+translation_service = TranslationService()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Disk-backed TTS audio cache.
+
+原来 TTSManager 把音频放在进程内的字典里：从不淘汰，重启即丢失，每次复习都要重新联网合成。
+这里改为磁盘缓存：
+- 文件名为 (引擎, 人声, 文本) 的哈希，存放在插件目录 cache/tts 下；
+- 首次使用时扫描目录建立内存索引（按最后使用时间排序），命中时更新文件 mtime，
+  重启后仍按最近使用顺序淘汰；
+- 总大小超过 tts_cache_max_mb（默认 200，0 为不限制）时淘汰最久未使用的文件；
+- 先写临时文件再 os.replace，中途崩溃不会留下半个音频。
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from ..config_manager import get_config
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "tts")
+AUDIO_EXTS = (".mp3", ".wav")
+STALE_TEMP_S = 3600
+
+
+def cache_key(engine: str, voice: str, text: str) -> str:
+    return hashlib.sha1(f"{engine}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # key -> (file name, size)，越靠后越近使用
+        self._index = None
+        self._total = 0
+
+    def _load_index(self) -> OrderedDict:
+        """持有 _lock 时调用"""
+        if self._index is not None:
+            return self._index
+        entries = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            now = time.time()
+            for name in os.listdir(self.directory):
+                key, ext = os.path.splitext(name)
+                stat = os.stat(os.path.join(self.directory, name))
+                if ext == ".tmp" and now - stat.st_mtime > STALE_TEMP_S:
+                    # 写入中途崩溃留下的临时文件
+                    os.remove(os.path.join(self.directory, name))
+                    continue
+                if ext not in AUDIO_EXTS:
+                    continue
+                entries.append((stat.st_mtime, key, name, stat.st_size))
+        except OSError as e:
+            print(f"WARNING: Failed to scan TTS cache directory: {e}")
+        entries.sort()
+        self._index = OrderedDict((key, (name, size)) for _, key, name, size in entries)
+        self._total = sum(size for _, _, _, size in entries)
+        return self._index
+
+    def get_path(self, engine: str, voice: str, text: str) -> str | None:
+        """Path of the cached audio file, or None on miss."""
+        key = cache_key(engine, voice, text)
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is None:
+                return None
+            self._index.move_to_end(key)
+        path = os.path.join(self.directory, entry[0])
+        try:
+            os.utime(path)
+        except OSError:
+            # 文件被外部删除
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._total -= entry[1]
+            return None
+        return path
+
+    def contains(self, engine: str, voice: str, text: str) -> bool:
+        """Membership test that does not count as a use."""
+        with self._lock:
+            return cache_key(engine, voice, text) in self._load_index()
+
+    def get(self, engine: str, voice: str, text: str) -> tuple[bytes, str] | None:
+        """Return (audio_bytes, ext) on hit, None on miss."""
+        path = self.get_path(engine, voice, text)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read(), os.path.splitext(path)[1]
+        except OSError as e:
+            print(f"WARNING: Failed to read cached TTS audio: {e}")
+            return None
+
+    def put(self, engine: str, voice: str, text: str, audio_data: bytes, ext: str) -> str | None:
+        """Store audio atomically and evict old files over the size cap. Returns the file path."""
+        key = cache_key(engine, voice, text)
+        name = key + ext
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(audio_data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"WARNING: Failed to write TTS cache file: {e}")
+            return None
+
+        with self._lock:
+            index = self._load_index()
+            old = index.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            index[key] = (name, len(audio_data))
+            self._total += len(audio_data)
+            evicted = self._evict(key)
+            if old is not None and old[0] != name:
+                # 同一文本换了音频格式（自定义接口）
+                evicted.append(old[0])
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+        return path
+
+    def _evict(self, keep: str) -> list:
+        """持有 _lock 时调用：返回需要删除的文件名（不淘汰刚写入的 keep）"""
+        max_mb = float(get_config().get("tts_cache_max_mb", 200) or 0)
+        if max_mb <= 0:
+            return []
+        limit = int(max_mb * 1024 * 1024)
+        evicted = []
+        while self._total > limit and len(self._index) > 1:
+            key, (name, size) = next(iter(self._index.items()))
+            if key == keep:
+                break
+            del self._index[key]
+            self._total -= size
+            evicted.append(name)
+        if evicted:
+            print(f"DEBUG: TTS cache evicted {len(evicted)} file(s), {self._total / 1048576:.1f} MB kept")
+        return evicted
+
+
+# Singleton instance
+tts_cache = TTSCache()
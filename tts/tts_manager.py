@@ -10,6 +10,7 @@ import tempfile
 import threading
 
 from ..config_manager import get_config
+from .tts_cache import tts_cache
 
 # Language name -> edge-tts voice mapping
 TTS_VOICE_MAP = {
@@ -105,6 +106,9 @@ LANG_TO_LOCALE_PREFIX = {
     "印地语": ("hi",),
 }
 
+# Engines whose audio is generated as bytes and stored in the TTS cache
+CACHED_ENGINES = ("edge_tts", "custom_url")
+
 # Module-level cache for the Edge TTS voice list (fetched once per session)
 _cached_voice_list: list[dict] = []
 _voice_list_lock = threading.Lock()
@@ -208,9 +212,18 @@ def _clean_text_for_tts(text: str) -> str:
     """Remove HTML tags and clean text for TTS."""
     text = re.sub(r'<[^>]+>', '', text)
     text = re.sub(r'\s+', ' ', text).strip()
+    # 高亮标签后补的空格会留在标点前；去掉后桌面端与 Web 端的同一句话命中同一个缓存文件
+    text = re.sub(r' ([,.!?;:，。！？；：])', r'\1', text)
     return text
 
 
+def _play_file(path: str) -> str:
+    """Play an audio file. Must be called on main thread."""
+    from aqt.sound import av_player
+    av_player.play_file(path)
+    return path
+
+
 def _play_bytes(audio_data: bytes, ext: str = ".mp3") -> str:
     """Write audio bytes to a temp file and play it. Must be called on main thread."""
     fd, path = tempfile.mkstemp(suffix=ext)
@@ -218,15 +231,11 @@ def _play_bytes(audio_data: bytes, ext: str = ".mp3") -> str:
         os.write(fd, audio_data)
     finally:
         os.close(fd)
-
-    from aqt.sound import av_player
-    av_player.play_file(path)
-    return path
+    return _play_file(path)
 
 
 class TTSManager:
     def __init__(self):
-        self._cache = {}  # cache_key -> (bytes, ext)
         self._apple_voices = None
         self._apple_spoken_content_defaults = None
         self._apple_spoken_content_defaults_mtime = None
@@ -243,12 +252,28 @@ class TTSManager:
         if not text:
             return ""
 
-        cache_key = f"{engine}:{text}"
-        if cache_key in self._cache:
-            audio_data, ext = self._cache[cache_key]
-            return _play_bytes(audio_data, ext)
+        path = tts_cache.get_path(engine, self._cache_voice(engine, config), text)
+        if path:
+            return _play_file(path)
         return None
 
+    @staticmethod
+    def _cache_voice(engine: str, config) -> str:
+        """The part of the cache key besides engine and text: whatever changes the audio."""
+        voice = _get_voice_for_language(config.get("learning_language", "英语"))
+        if engine == "custom_url":
+            return f"{config.get('tts_custom_url', '')}|{voice}|{config.get('learning_language', '英语')}"
+        return voice
+
+    def is_cached(self, text: str) -> bool:
+        """Whether generate(text) would be served from the TTS cache."""
+        config = get_config()
+        engine = config.get("tts_engine", "edge_tts")
+        text = _clean_text_for_tts(text)
+        if engine not in CACHED_ENGINES or not text:
+            return False
+        return tts_cache.contains(engine, self._cache_voice(engine, config), text)
+
     def is_anki_native(self) -> bool:
         return get_config().get("tts_engine", "edge_tts") == "anki_native"
 
@@ -276,17 +301,26 @@ class TTSManager:
         if not text:
             return None
 
-        cache_key = f"{engine}:{text}"
+        if engine not in CACHED_ENGINES:
+            return None
+        voice = self._cache_voice(engine, config)
+        cached = tts_cache.get(engine, voice, text)
+        if cached:
+            return cached
+
         try:
             if engine == "edge_tts":
-                return self._generate_edge_tts(text, cache_key)
-            elif engine == "custom_url":
-                return self._generate_custom(text, cache_key)
+                result = self._generate_edge_tts(text)
+            else:
+                result = self._generate_custom(text)
         except Exception as e:
             print(f"ERROR: TTS generation failed ({engine}): {e}")
-        return None
+            return None
+        if result:
+            tts_cache.put(engine, voice, text, *result)
+        return result
 
-    def _generate_edge_tts(self, text: str, cache_key: str):
+    def _generate_edge_tts(self, text: str):
         """Generate audio with edge-tts. Returns (bytes, ext) or None.
 
         关键：edge-tts 的同步接口 stream_sync() 内部用一个无超时的
@@ -354,7 +388,6 @@ class TTSManager:
         if not audio_data:
             return None
 
-        self._cache[cache_key] = (audio_data, ".mp3")
         return (audio_data, ".mp3")
 
     def _play_anki_native(self, text: str):
@@ -614,7 +647,7 @@ class TTSManager:
             stderr=subprocess.DEVNULL,
         )
 
-    def _generate_custom(self, text: str, cache_key: str):
+    def _generate_custom(self, text: str):
         """Generate audio from a user-supplied URL template (GET with placeholders).
 
         用户在配置里填一个带占位符的 URL 模板，朗读时把实际值替换进去再发 GET：
@@ -655,7 +688,6 @@ class TTSManager:
         ext = ".mp3" if "mpeg" in content_type else ".wav"
         audio_data = resp.content
 
-        self._cache[cache_key] = (audio_data, ext)
         return (audio_data, ext)
 
 
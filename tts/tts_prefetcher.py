@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Ahead-of-time TTS synthesis (optional, off by default).
+
+原来朗读音频只在点击"朗读"时才合成，edge-tts 要先等 1–3 秒网络往返。开启 tts_prefetch_enabled 后，
+在后台提前合成并写入 TTS 缓存，复习时直接播放：
+- 预渲染为下一张卡片预留例句后（prerender），合成单词和这句预留的例句；
+- 题面绘制后，接下来 TTS_PREFETCH_DEPTH 张卡片中预渲染窗口以外的（不论是否已有缓存），
+  合成单词和缓存中的下一句（pop_cache 按顺序取出，下一句就是将要显示的那句）；
+- 例句写入缓存后（task_manager），同样合成该词的单词和下一句；直接交给当前卡片的例句也立即合成。
+只合成将要显示的例句，不为一批中几天后才轮到的例句提前花费请求。
+
+同时进行的合成数不超过 tts_prefetch_concurrency（默认 2）；队列最多 MAX_QUEUE 项，
+超出的请求直接丢弃（翻卡时仍会按需合成）。仅对缓存音频的引擎（edge_tts / custom_url）生效。
+"""
+
+import threading
+from collections import deque
+
+from ..cache.cache_manager import load_cache
+from ..card.card_template_manager import spoken_sentence, spoken_word
+from ..config_manager import get_config
+from .tts_manager import CACHED_ENGINES, tts_manager
+
+MAX_QUEUE = 200
+# 题面绘制后为接下来多少张卡片提前合成（包括预渲染窗口）
+TTS_PREFETCH_DEPTH = 5
+
+
+class TTSPrefetcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ("keyword", 关键词)：单词与缓存中的下一句；("word", 关键词)；("sentence", 例句)
+        self._queue = deque()
+        self._queued = set()
+        self._workers = 0
+
+    def enabled(self) -> bool:
+        config = get_config()
+        return (bool(config.get("tts_prefetch_enabled", False))
+                and config.get("tts_engine", "edge_tts") in CACHED_ENGINES)
+
+    def prefetch_keywords(self, keywords) -> None:
+        """Synthesize the word and its next cached sentence. Safe to call from any thread."""
+        self._submit([("keyword", keyword) for keyword in keywords if keyword])
+
+    def prefetch_sentences(self, sentences) -> None:
+        self._submit([("sentence", sentence) for sentence in sentences if sentence])
+
+    def prefetch_reserved(self, keyword: str, sentence: str) -> None:
+        """A sentence already taken out of the cache for an upcoming card (prerender)."""
+        self._submit([("word", keyword), ("sentence", sentence)])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queue.clear()
+            self._queued.clear()
+
+    def _submit(self, items) -> None:
+        if not items or not self.enabled():
+            return
+        concurrency = max(1, int(get_config().get("tts_prefetch_concurrency", 2) or 1))
+        with self._lock:
+            for item in items:
+                if item in self._queued or len(self._queue) >= MAX_QUEUE:
+                    continue
+                self._queued.add(item)
+                self._queue.append(item)
+            while self._workers < concurrency and self._workers < len(self._queue):
+                self._workers += 1
+                threading.Thread(target=self._run, daemon=True, name="TTSPrefetch").start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._workers -= 1
+                    return
+                item = self._queue.popleft()
+            try:
+                for text in self._texts(item):
+                    if self.enabled() and not tts_manager.is_cached(text):
+                        tts_manager.generate(text)
+            except Exception as e:
+                print(f"ERROR: TTS prefetch failed for {item[1]!r}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(item)
+
+    @staticmethod
+    def _texts(item) -> list:
+        kind, value = item
+        if kind == "sentence":
+            return [spoken_sentence(value)]
+        if kind == "word":
+            return [spoken_word(value)]
+        texts = [spoken_word(value)]
+        pairs = load_cache(value)
+        if pairs:
+            texts.append(spoken_sentence(pairs[0][0]))
+        return texts
+
+
+# Singleton instance
+tts_prefetcher = TTSPrefetcher()
@@ -9,9 +9,11 @@ import threading
 import queue
 import markdown
 import re
+import time
 from functools import partial
 
 from ..config_manager import get_config
+from .. import llm_transport
 from ..card.anki_card_creator import create_sentence_card
 
 # --- 样式 ---
@@ -478,14 +480,21 @@ class AIExplanationDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
             
         from .. import api_client
-        if api_client.support_thinking:
-            payload = {"model": self.model_name, "messages": self.conversation_history, "stream": True,"thinking": {"type": "disabled"}}
-        else:
-            payload = {"model": self.model_name, "messages": self.conversation_history, "stream": True}
+        messages = list(self.conversation_history)
+        start_time = time.time()
+        usage = None
+        status = "ok"
+        full_response_content = ""
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload, stream=True, timeout=60)
+            response = llm_transport.post(self.api_url, headers=headers,
+                                          json=api_client.stream_payload(self.model_name, messages),
+                                          stream=True, timeout=60)
+            # thinking / stream_options 不被支持 → 去掉该字段重试一次
+            if response.status_code != 200 and api_client.downgrade_stream_payload(response.text):
+                response = llm_transport.post(self.api_url, headers=headers,
+                                              json=api_client.stream_payload(self.model_name, messages),
+                                              stream=True, timeout=60)
             response.raise_for_status()
-            full_response_content = ""
             for chunk in response.iter_content(chunk_size=None):
                 if self.stop_streaming.is_set(): break
                 if chunk:
@@ -498,6 +507,9 @@ class AIExplanationDialog(QDialog):
                                 break
                             try:
                                 data = json.loads(json_data)
+                                # 服务端若返回 usage 帧（通常是最后一帧），记入用量账本
+                                if data.get("usage"):
+                                    usage = data["usage"]
                                 # choices 可能为空列表（结尾帧/usage帧），需安全取值，否则抛 IndexError 中断整个流
                                 choices = data.get("choices") or []
                                 if not choices:
@@ -512,10 +524,15 @@ class AIExplanationDialog(QDialog):
             if full_response_content:
                 self.conversation_history.append({"role": "assistant", "content": full_response_content})
         except requests.exceptions.RequestException as e:
+            status = "network_error"
             self.stream_queue.put(f"<p style='color: #ff6b6b;'><b>网络错误:</b> {e}</p>[STREAM_END_ERROR]")
         except Exception as e:
+            status = "error"
             self.stream_queue.put(f"<p style='color: #ff6b6b;'><b>意外错误:</b> {e}</p>[STREAM_END_ERROR]")
         finally:
+            if usage is None and full_response_content:
+                usage = api_client.estimate_chat_usage(messages, full_response_content)
+            api_client.log_usage("chat", self.model_name, usage, start_time, status)
             q_list = list(self.stream_queue.queue)
             if not any(tag in q_list for tag in ["[STREAM_END]", "[STREAM_END_ERROR]"]):
                  self.stream_queue.put("[STREAM_END]")
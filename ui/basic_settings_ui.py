@@ -296,7 +296,7 @@ def add_othersetting(parent_dialog, basic_layout, current_config):
 
     parent_dialog.prompt_name_combo = NoWheelComboBox()
     custom_prompts = current_config.get("custom_prompts", {})
-    prompt_choices = ["默认-不标记目标词", "默认-标记目标词"] + list(custom_prompts.keys())
+    prompt_choices = api_client.BUILTIN_PROMPT_NAMES + list(custom_prompts.keys())
     parent_dialog.prompt_name_combo.addItems(prompt_choices)
 
     saved_prompt_selection = current_config.get("prompt_name", "默认-不标记目标词")
@@ -639,7 +639,15 @@ def save_basic_settings(parent_dialog):
     }
 
     current_full_config = get_config()
-    for key in ["custom_prompts", "preset_api_urls", "preset_vocab_levels", "preset_learning_goals", "preset_difficulties", "preset_lengths"]:
+    for key in ["custom_prompts", "preset_api_urls", "preset_vocab_levels", "preset_learning_goals", "preset_difficulties", "preset_lengths",
+                "model_prices", "local_keep_alive", "local_parallel_slots", "sentence_validation_enabled",
+                "llm_cassette_mode", "llm_cassette_path", "llm_cassette_speed",
+                "sentence_recycling_enabled", "sentence_recycle_min_days", "sentence_recycle_stability_factor",
+                "inventory_planner_enabled", "inventory_horizon_days", "inventory_max_batch",
+                "remote_max_tokens_enabled",
+                "lookahead_target_hit_rate", "prewarm_card_count",
+                "generation_worker_process", "generation_worker_python", "two_phase_generation",
+                "tts_cache_max_mb", "tts_prefetch_enabled", "tts_prefetch_concurrency"]:
         if key in current_full_config:
             new_config[key] = current_full_config[key]
 
@@ -652,7 +660,9 @@ def save_basic_settings(parent_dialog):
     new_config[f"edge_tts_voice_{current_lang}"] = voice_shortname
 
     save_config(new_config)
-    
+    # 牌组 / Top N 可能已变化，丢弃第二关键词缓存
+    api_client.clear_difficulty_cache()
+
     # 保存配置后更新卡片模板
     _update_card_templates_with_notification(parent_dialog)
 
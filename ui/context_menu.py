@@ -9,6 +9,7 @@ from anki.hooks import addHook
 from ..config_manager import get_config
 from ..card.anki_card_creator import create_sentence_card
 from .. import config_manager
+from ..deck_resolver import deck_resolver
 from .ai_explanation_dialog import AIExplanationDialog
 
 # 全局变量存储选中的词汇
@@ -58,7 +59,8 @@ def on_webview_context_menu(webview, menu):
     # 检查是否在复习模式下且有当前卡片
     try:
         if mw.reviewer and mw.reviewer.card:
-            current_deck = mw.col.decks.name(mw.reviewer.card.did)
+            current_did = mw.reviewer.card.did
+            is_target_deck = deck_resolver.is_target_deck(current_did)
         else:
             # 不在复习模式，直接返回不添加菜单项
             return
@@ -66,10 +68,6 @@ def on_webview_context_menu(webview, menu):
         # 处理 reviewer 或 card 为 None 的情况
         return
     
-    config = get_config()
-    config_deck_name = config.get("deck_name")
-    field_index_match = re.search(r'\[(\d+)\]$', config_deck_name)
-    base_deck_name = re.sub(r'\[\d+\]$', '', config_deck_name) if field_index_match else config_deck_name
     showing_sentence = config_manager.showing_sentence
     showing_translation = config_manager.showing_translation
 
@@ -80,7 +78,7 @@ def on_webview_context_menu(webview, menu):
     # 存储选中的词汇
     selected_word = cleaned_text
 
-    if (current_deck == base_deck_name or current_deck.startswith(base_deck_name + "::")):
+    if is_target_deck:
         # 获取选中的文本
         try:
             if menu.actions():
@@ -106,10 +104,10 @@ def on_webview_context_menu(webview, menu):
             
         except Exception as e:
             print(f"ERROR: 处理右键菜单时出错: {e}")
-    if current_deck == config.get("save_deck", "收藏例句") and mw.reviewer and mw.reviewer.card and selected_word:
+    if deck_resolver.is_save_deck(current_did) and mw.reviewer and mw.reviewer.card and selected_word:
         if menu.actions():
             menu.addSeparator()
-        print(f"DEBUG: 当前卡片的牌组是 {current_deck}, 选中的词汇是 {selected_word}")
+        print(f"DEBUG: 当前卡片位于收藏例句牌组, 选中的词汇是 {selected_word}")
         # 4. 仅在收藏例句中添加“AI详细解释”菜单
         explain_action = QAction(f'AI详细解释 "{selected_word}"', menu)
         # 获取当前卡片的第一个字段
@@ -120,9 +118,10 @@ def on_webview_context_menu(webview, menu):
 # 新增的函数
 def refresh_example_sentences():
     """
-    刷新例句
+    刷新例句：问题面原地替换为缓存中的下一句
     """
-    mw.reset()
+    from .. import main_logic
+    main_logic.refresh_current_sentence()
 
 def store_example_sentences(sentence, translation):
     """
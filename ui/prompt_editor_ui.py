@@ -1,3 +1,4 @@
+import threading
 import time
 import traceback
 import os
@@ -7,11 +8,14 @@ import aqt
 from aqt.qt import (
     QDialog, QVBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QComboBox,
     QGroupBox, QHBoxLayout, QWidget, QDialogButtonBox, QMessageBox, QApplication,
-    QTabWidget, QTextEdit, QSplitter, Qt, QGridLayout, QCompleter, QScrollArea
+    QTabWidget, QTextEdit, QSplitter, Qt, QGridLayout, QCompleter, QScrollArea,
+    QListWidget, QListWidgetItem, QSpinBox, sip
 )
 from ..config_manager import get_config, save_config
 from .. import api_client
 from .. import main_logic # 导入 main_logic 以便调用线程池
+from ..keyword_index import keyword_index
+from ..prompt_benchmark import PromptBenchmark, format_summary, DEFAULT_KEYWORD_COUNT
 
 # Custom ComboBox to ignore wheel events
 class NoWheelComboBox(QComboBox):
@@ -47,7 +51,7 @@ def setup_prompt_template_tab(parent_dialog, layout, config):
     current_config = get_config()
     custom_prompts = current_config.get("custom_prompts", {})
     parent_dialog.prompt_source_combo.addItems(
-        ["默认-不标记目标词", "默认-标记目标词"] + list(custom_prompts.keys()) + ["空"])
+        api_client.BUILTIN_PROMPT_NAMES + list(custom_prompts.keys()) + ["空"])
     edit_prompt_layout.addWidget(parent_dialog.prompt_source_combo)
 
     parent_dialog.delete_prompt_btn = QPushButton("删除")
@@ -59,6 +63,11 @@ def setup_prompt_template_tab(parent_dialog, layout, config):
     parent_dialog.prompt_template_edit.setMinimumHeight(200)
     prompt_layout.addWidget(parent_dialog.prompt_template_edit)
 
+    # 按当前配置填入占位符后估算的输入 token 数，随编辑实时更新
+    parent_dialog.prompt_token_label = QLabel()
+    prompt_layout.addWidget(parent_dialog.prompt_token_label)
+    parent_dialog.prompt_template_edit.textChanged.connect(lambda: _update_prompt_token_label(parent_dialog))
+
     save_layout = QHBoxLayout()
     save_layout.addWidget(QLabel("存储名:"))
     parent_dialog.prompt_name_edit = QLineEdit()
@@ -96,6 +105,12 @@ def setup_prompt_template_tab(parent_dialog, layout, config):
     keyword_layout.addLayout(test_mode_layout)
 
     test_input_layout.addLayout(keyword_layout)
+    # 本次打开设置以来每个模板最近一次测试的 token 与延迟，便于选出最省的提示词
+    parent_dialog.prompt_test_stats = {}
+    parent_dialog.prompt_stats_label = QLabel()
+    parent_dialog.prompt_stats_label.setWordWrap(True)
+    parent_dialog.prompt_stats_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+    test_layout.addWidget(parent_dialog.prompt_stats_label)
     test_result_label = QLabel("测试结果:")
     test_layout.addWidget(test_result_label)
     parent_dialog.test_result_edit = QTextEdit()
@@ -107,16 +122,154 @@ def setup_prompt_template_tab(parent_dialog, layout, config):
     prompt_group.setLayout(prompt_layout)
     layout.addWidget(prompt_group)
     layout.addWidget(test_group)
+    setup_benchmark_group(parent_dialog, layout, config)
+
+# 对比测试中代表编辑器当前内容的模板名
+CURRENT_EDIT_ITEM = "当前编辑内容"
+
+def setup_benchmark_group(parent_dialog, layout, config):
+    bench_group = QGroupBox("对比测试")
+    bench_layout = QVBoxLayout()
+    bench_layout.addWidget(QLabel("勾选要对比的提示词，可填写多个模型（逗号分隔，留空为当前模型）；"
+                                  "每个提示词与每个模型的组合对同一组随机抽取的关键词各生成一次。"))
+
+    parent_dialog.bench_prompt_list = QListWidget()
+    parent_dialog.bench_prompt_list.setMaximumHeight(110)
+    names = [CURRENT_EDIT_ITEM] + api_client.BUILTIN_PROMPT_NAMES + list(config.get("custom_prompts", {}).keys())
+    for name in names:
+        item = QListWidgetItem(name)
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(Qt.CheckState.Unchecked)
+        parent_dialog.bench_prompt_list.addItem(item)
+    bench_layout.addWidget(parent_dialog.bench_prompt_list)
+
+    options_layout = QHBoxLayout()
+    options_layout.addWidget(QLabel("模型:"))
+    parent_dialog.bench_models_edit = QLineEdit()
+    parent_dialog.bench_models_edit.setPlaceholderText(config.get("model_name", ""))
+    options_layout.addWidget(parent_dialog.bench_models_edit)
+    options_layout.addWidget(QLabel("关键词数:"))
+    parent_dialog.bench_keyword_count = QSpinBox()
+    parent_dialog.bench_keyword_count.setRange(1, 200)
+    parent_dialog.bench_keyword_count.setValue(DEFAULT_KEYWORD_COUNT)
+    options_layout.addWidget(parent_dialog.bench_keyword_count)
+    parent_dialog.bench_button = QPushButton("开始对比")
+    parent_dialog.bench_button.clicked.connect(lambda: toggle_prompt_benchmark(parent_dialog))
+    options_layout.addWidget(parent_dialog.bench_button)
+    bench_layout.addLayout(options_layout)
+
+    parent_dialog.prompt_benchmark = None
+    # 关闭设置窗口时停止对比测试，不再继续发送付费请求
+    parent_dialog.finished.connect(lambda _result: stop_prompt_benchmark(parent_dialog))
+    bench_group.setLayout(bench_layout)
+    layout.addWidget(bench_group)
+
+def _benchmark_variants(parent_dialog):
+    """勾选的提示词 × 填写的模型"""
+    builtin_prompts = api_client.get_builtin_prompts()
+    custom_prompts = get_config().get("custom_prompts", {})
+    prompts = []
+    for row in range(parent_dialog.bench_prompt_list.count()):
+        item = parent_dialog.bench_prompt_list.item(row)
+        if item.checkState() != Qt.CheckState.Checked:
+            continue
+        name = item.text()
+        if name == CURRENT_EDIT_ITEM:
+            prompts.append((name, parent_dialog.prompt_template_edit.toPlainText()))
+        else:
+            prompts.append((name, builtin_prompts.get(name, custom_prompts.get(name, ""))))
+
+    models = [m.strip() for m in parent_dialog.bench_models_edit.text().split(",") if m.strip()] or [""]
+    variants = []
+    for name, prompt in prompts:
+        for model in models:
+            label = f"{name} / {model}" if model else name
+            variants.append({"label": label, "prompt": prompt, "model": model})
+    return variants
+
+def stop_prompt_benchmark(parent_dialog):
+    if parent_dialog.prompt_benchmark is not None:
+        parent_dialog.prompt_benchmark.stop()
+
+def toggle_prompt_benchmark(parent_dialog):
+    if parent_dialog.prompt_benchmark is not None:
+        parent_dialog.prompt_benchmark.stop()
+        parent_dialog.bench_button.setEnabled(False)
+        parent_dialog.test_result_edit.setText("正在停止对比测试，等待进行中的请求结束...")
+        return
+
+    test_config = get_config()
+    if not test_config["api_url"] or not test_config["api_key"] or not test_config["model_name"]:
+        parent_dialog.test_result_edit.setText("错误: 请先在基本设置中配置API信息（URL、密钥和模型名称）")
+        return
+    variants = _benchmark_variants(parent_dialog)
+    if len(variants) < 2:
+        parent_dialog.test_result_edit.setText("请至少勾选两个提示词，或勾选一个提示词并填写两个以上模型")
+        return
+    for variant in variants:
+        try:
+            _format_test_prompt(variant["prompt"], "example", test_config)
+        except Exception as e:
+            parent_dialog.test_result_edit.setText(f"提示词 {variant['label']} 格式化错误: {str(e)}")
+            return
+    keywords = keyword_index.sample_keywords(parent_dialog.bench_keyword_count.value())
+    if not keywords:
+        parent_dialog.test_result_edit.setText("目标牌组中没有可用的关键词")
+        return
+
+    benchmark = PromptBenchmark(
+        test_config, variants, keywords,
+        lambda prompt, keyword: _format_test_prompt(prompt, keyword, test_config),
+        main_logic.max_workers or 3,
+        # 与后台例句生成共用线程池和并发上限；工作线程未启动时使用独立线程池
+        main_logic.executor.submit if main_logic.executor is not None else None,
+    )
+    parent_dialog.prompt_benchmark = benchmark
+    parent_dialog.bench_button.setText("停止")
+    parent_dialog.test_prompt_button.setEnabled(False)
+    parent_dialog.test_result_edit.setText(
+        f"对比测试：{len(variants)} 个变体 × {len(keywords)} 个关键词，并发 {benchmark.concurrency}...")
+
+    def on_progress(finished, total):
+        def update():
+            if not sip.isdeleted(parent_dialog) and parent_dialog.prompt_benchmark is benchmark:
+                parent_dialog.bench_button.setText(f"停止（{finished}/{total}）")
+        aqt.mw.taskman.run_on_main(update)
+
+    def run():
+        try:
+            summary = benchmark.run(on_progress)
+            error = None
+        except Exception as e:
+            traceback.print_exc()
+            summary, error = None, e
+        aqt.mw.taskman.run_on_main(lambda: _handle_benchmark_done(parent_dialog, benchmark, summary, error))
+
+    threading.Thread(target=run, daemon=True, name="PromptBenchmarkRunner").start()
+
+def _handle_benchmark_done(parent_dialog, benchmark, summary, error):
+    if sip.isdeleted(parent_dialog):
+        # 设置窗口已销毁
+        return
+    parent_dialog.prompt_benchmark = None
+    parent_dialog.bench_button.setText("开始对比")
+    parent_dialog.bench_button.setEnabled(True)
+    parent_dialog.test_prompt_button.setEnabled(True)
+    if error is not None:
+        parent_dialog.test_result_edit.setText(f"对比测试错误: {str(error)}")
+        return
+    header = f"对比测试结果（{len(benchmark.keywords)} 个关键词"
+    header += "，已中途停止）" if benchmark.stop_event.is_set() else "）"
+    parent_dialog.test_result_edit.setText(
+        f"{header}：\n\n{format_summary(summary)}\n\n关键词：{', '.join(benchmark.keywords)}")
 
 def load_selected_prompt(parent_dialog, source):
     config = get_config()
     custom_prompts = config.get("custom_prompts", {})
 
-    if source == "默认-不标记目标词":
-        content = api_client.DEFAULT_PROMPT_TEMPLATE + api_client.DEFAULT_FORMAT_NORMAL
-        parent_dialog.prompt_name_edit.setText("自定义提示词")
-    elif source == "默认-标记目标词":
-        content = api_client.DEFAULT_PROMPT_TEMPLATE + api_client.DEFAULT_FORMAT_HIGHLIGHT
+    builtin_prompts = api_client.get_builtin_prompts()
+    if source in builtin_prompts:
+        content = builtin_prompts[source]
         parent_dialog.prompt_name_edit.setText("自定义提示词")
     elif source == "空":
         content = ""
@@ -130,7 +283,7 @@ def load_selected_prompt(parent_dialog, source):
 def delete_selected_prompt(parent_dialog):
     selected = parent_dialog.prompt_source_combo.currentText()
 
-    if selected in ["默认-不标记目标词", "默认-标记目标词", "空"]:
+    if selected in api_client.BUILTIN_PROMPT_NAMES + ["空"]:
         QMessageBox.warning(parent_dialog, "错误", f"不能删除 {selected} 提示词")
         return
 
@@ -142,7 +295,7 @@ def delete_selected_prompt(parent_dialog):
     if reply != QMessageBox.StandardButton.Yes:
         return
 
-    config = get_config()
+    config = get_config().to_dict()
     custom_prompts = config.get("custom_prompts", {})
     if selected in custom_prompts:
         del custom_prompts[selected]
@@ -156,7 +309,7 @@ def delete_selected_prompt(parent_dialog):
     else:
         QMessageBox.warning(parent_dialog, "错误", "未找到该存储提示词")
     
-    current_items = ["默认-不标记目标词", "默认-标记目标词"] + list(custom_prompts.keys())
+    current_items = api_client.BUILTIN_PROMPT_NAMES + list(custom_prompts.keys())
     parent_dialog.prompt_name_combo.clear()
     parent_dialog.prompt_name_combo.addItems(current_items)
     saved_prompt_selection = config.get("prompt_name", "默认-不标记目标词")
@@ -173,23 +326,23 @@ def save_custom_prompt(parent_dialog):
         QMessageBox.warning(parent_dialog, "错误", "存储名不能为空")
         return
 
-    if prompt_name in ["默认-不标记目标词", "默认-标记目标词", "空"]:
+    if prompt_name in api_client.BUILTIN_PROMPT_NAMES + ["空"]:
         prompt_name = "自定义提示词"
         parent_dialog.prompt_name_edit.setText(prompt_name)
 
-    config = get_config()
+    config = get_config().to_dict()
     custom_prompts = config.get("custom_prompts", {})
     custom_prompts[prompt_name] = prompt_content
     config["custom_prompts"] = custom_prompts
     save_config(config)
 
-    current_items = ["默认-不标记目标词", "默认-标记目标词"] + list(custom_prompts.keys()) + ["空"]
+    current_items = api_client.BUILTIN_PROMPT_NAMES + list(custom_prompts.keys()) + ["空"]
     parent_dialog.prompt_source_combo.clear()
     parent_dialog.prompt_source_combo.addItems(current_items)
     parent_dialog.prompt_source_combo.setCurrentText(prompt_name)
     load_selected_prompt(parent_dialog, prompt_name)
 
-    current_items = ["默认-不标记目标词", "默认-标记目标词"] + list(custom_prompts.keys())
+    current_items = api_client.BUILTIN_PROMPT_NAMES + list(custom_prompts.keys())
     parent_dialog.prompt_name_combo.clear()
     parent_dialog.prompt_name_combo.addItems(current_items)
     saved_prompt_selection = config.get("prompt_name", "默认-不标记目标词")
@@ -200,6 +353,43 @@ def save_custom_prompt(parent_dialog):
 
     QMessageBox.information(parent_dialog, "成功", "提示词保存完成")
 
+def _format_test_prompt(prompt, keyword, test_config):
+    """用测试关键词和当前配置填充提示词模板"""
+    second_keywords_str = "strand,exasperated,grudgingly,guerrilla,parish,extent,casino,carousel,hypocritical,hunch"
+    second_keywords_str = "- 在保证句子流畅的前提下，可以在每个例句中尝试融入若干以下词汇（" + second_keywords_str + "），不限制每句融入几个，也不强制融入，但必须以句子自然流畅为前提。"
+    return prompt.format(
+        world=keyword,
+        vocab_level=test_config["vocab_level"],
+        learning_goal=test_config["learning_goal"],
+        difficulty_level=test_config["difficulty_level"],
+        sentence_length_desc=test_config["sentence_length_desc"],
+        language=test_config["learning_language"],
+        second_keywords=second_keywords_str
+    )
+
+def _update_prompt_token_label(parent_dialog):
+    prompt = parent_dialog.prompt_template_edit.toPlainText()
+    keyword = parent_dialog.test_keyword_edit.text() if hasattr(parent_dialog, "test_keyword_edit") else "example"
+    try:
+        tokens = api_client.estimate_tokens(_format_test_prompt(prompt, keyword or "example", get_config()))
+        parent_dialog.prompt_token_label.setText(f"估算输入：约 {tokens} token")
+    except Exception:
+        parent_dialog.prompt_token_label.setText("估算输入：提示词格式化失败")
+
+def _template_label(parent_dialog):
+    """测试记录中的模板名：编辑器内容与所选模板不同时标注已修改"""
+    source = parent_dialog.prompt_source_combo.currentText()
+    builtin_prompts = api_client.get_builtin_prompts()
+    original = builtin_prompts.get(source, get_config().get("custom_prompts", {}).get(source, ""))
+    if parent_dialog.prompt_template_edit.toPlainText() != original:
+        return f"{source}（已修改）"
+    return source
+
+def _record_prompt_test(parent_dialog, template, summary):
+    parent_dialog.prompt_test_stats[template] = summary
+    lines = [f"{name}：{line}" for name, line in parent_dialog.prompt_test_stats.items()]
+    parent_dialog.prompt_stats_label.setText("各模板最近一次测试：\n" + "\n".join(lines))
+
 def test_prompt_template(parent_dialog):
     keyword = parent_dialog.test_keyword_edit.text()
     if not keyword:
@@ -208,18 +398,8 @@ def test_prompt_template(parent_dialog):
 
     prompt = parent_dialog.prompt_template_edit.toPlainText()
     test_config = get_config()
-    second_keywords_str = "strand,exasperated,grudgingly,guerrilla,parish,extent,casino,carousel,hypocritical,hunch"
-    second_keywords_str = "- 在保证句子流畅的前提下，可以在每个例句中尝试融入若干以下词汇（" + second_keywords_str + "），不限制每句融入几个，也不强制融入，但必须以句子自然流畅为前提。"
     try:
-        formatted_prompt = prompt.format(
-            world=keyword,
-            vocab_level=test_config["vocab_level"],
-            learning_goal=test_config["learning_goal"],
-            difficulty_level=test_config["difficulty_level"],
-            sentence_length_desc=test_config["sentence_length_desc"],
-            language=test_config["learning_language"],
-            second_keywords=second_keywords_str
-        )
+        formatted_prompt = _format_test_prompt(prompt, keyword, test_config)
     except Exception as e:
         parent_dialog.test_result_edit.setText(f"提示词格式化错误: {str(e)}")
         return
@@ -227,7 +407,8 @@ def test_prompt_template(parent_dialog):
     test_mode = parent_dialog.test_mode_combo.currentText()
 
     if test_mode == "查看提示词":
-        parent_dialog.test_result_edit.setText(formatted_prompt)
+        parent_dialog.test_result_edit.setText(
+            f"估算输入：约 {api_client.estimate_tokens(formatted_prompt)} token\n\n{formatted_prompt}")
         return
 
     if not test_config["api_url"] or not test_config["api_key"] or not test_config["model_name"]:
@@ -238,28 +419,47 @@ def test_prompt_template(parent_dialog):
     parent_dialog.test_prompt_button.setEnabled(False)
     QApplication.processEvents()
 
+    template = _template_label(parent_dialog)
+    start_time = time.time()
     future = main_logic.executor.submit(
         api_client.get_api_response,
         test_config,
-        formatted_prompt
+        formatted_prompt,
+        "prompt_test"
     )
 
     def handle_result(future):
-        aqt.mw.taskman.run_on_main(lambda: _handle_future(parent_dialog, future, keyword))
+        latency_ms = int((time.time() - start_time) * 1000)
+        aqt.mw.taskman.run_on_main(
+            lambda: _handle_future(parent_dialog, future, keyword, formatted_prompt, template, latency_ms))
 
     future.add_done_callback(handle_result)
 
-def _handle_future(parent_dialog, future, keyword):
+def _test_summary(api_response, formatted_prompt, text_content, pair_count, latency_ms):
+    """输入/输出 token（服务端未返回 usage 时为估算值）、延迟与解析结果"""
+    usage = api_client.get_response_usage(api_response)
+    if usage:
+        prompt_tokens, completion_tokens, cached_tokens = usage
+        tokens = f"输入 {prompt_tokens} token（缓存命中 {cached_tokens}），输出 {completion_tokens} token"
+    else:
+        tokens = (f"输入约 {api_client.estimate_tokens(formatted_prompt)} token，"
+                  f"输出约 {api_client.estimate_tokens(text_content)} token（估算）")
+    parsed = f"解析 {pair_count} 句" if pair_count else "解析失败"
+    return f"{tokens}，延迟 {latency_ms} ms，{parsed}"
+
+def _handle_future(parent_dialog, future, keyword, formatted_prompt="", template="", latency_ms=0):
     try:
         api_response = future.result()
         text_content = api_client.get_message_content(api_response, keyword)
         sentence_pairs = api_client.parse_message_content_to_sentence_pairs(text_content, keyword)
+        summary = _test_summary(api_response, formatted_prompt, text_content, len(sentence_pairs), latency_ms)
+        _record_prompt_test(parent_dialog, template, summary)
 
         if not sentence_pairs:
-            parent_dialog.test_result_edit.setText("例句生成失败，原始输出内容为：\n" + text_content)
+            parent_dialog.test_result_edit.setText(f"{summary}\n\n例句生成失败，原始输出内容为：\n" + text_content)
             return
 
-        result_text = f"关键词 '{keyword}' 的例句测试结果：\n\n"
+        result_text = f"{summary}\n\n关键词 '{keyword}' 的例句测试结果：\n\n"
         for i, (sentence, translation) in enumerate(sentence_pairs, 1):
             result_text += f"\n例句 {i}:\n{sentence}\n翻译:\n{translation}\n"
 
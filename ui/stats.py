@@ -15,6 +15,26 @@ from aqt.qt import (
 )
 from aqt.webview import AnkiWebView
 from datetime import datetime, date, timedelta
+import json
+from ..config_manager import get_config
+from ..cache.cache_manager import get_usage_by_day, get_validation_stats, get_recycle_stats
+from ..deck_resolver import deck_resolver
+from ..lookahead_tuner import lookahead_tuner
+
+# 用量账本中 purpose 字段的显示名
+USAGE_PURPOSE_LABELS = {
+    "urgent": "当前卡片(等待中)",
+    "prefetch": "预取",
+    "repopulate": "缓存补货",
+    "refill": "校验补生成",
+    "translate": "例句翻译(两阶段)",
+    "generate": "例句生成(其他)",
+    "chat": "AI解释",
+    "web_chat": "AI解释(手机)",
+    "prompt_test": "提示词测试",
+    "prompt_bench": "提示词对比测试",
+    "test": "连接测试",
+}
 # --- 新增函数：用于创建自定义统计选项卡的内容 ---
 def create_custom_stats_tab_content(deck_name: str) -> QWidget:
     """
@@ -84,8 +104,8 @@ def get_deck_study_stats_for_date_range(deck_name: str, start_date: date, end_da
         start_timestamp = int(start_dt.timestamp() * 1000)
         end_timestamp = int(end_dt.timestamp() * 1000)
         
-        # 3. 获取所有匹配牌组ID(包含子牌组)
-        deck_ids = [d['id'] for d in mw.col.decks.all() if deck_name in d['name']]
+        # 3. 获取该牌组及其子牌组的ID（按 "::" 层级匹配，不再做子串匹配）
+        deck_ids = deck_resolver.subtree_ids(deck_name)
         
         if not deck_ids:
             return {}, {}
@@ -208,6 +228,124 @@ def refresh_stats_content(container, deck_name):
     stats_webview.setHtml(html_content)
 
 
+# --- 用量统计选项卡 ---
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int, prices: dict) -> float:
+    """
+    按配置的单价（每百万 tokens）估算一次汇总的花费。
+    prices 结构: {"模型名": {"input": 输入单价, "output": 输出单价, "cached": 缓存命中输入单价}}
+    未配置 cached 时按 input 计价；未配置的模型花费记为 0。
+    """
+    price = prices.get(model) or {}
+    input_price = price.get("input", 0) or 0
+    output_price = price.get("output", 0) or 0
+    cached_price = price.get("cached", input_price) or 0
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def build_usage_chart_data(rows: list, days: int, prices: dict) -> dict:
+    """将 get_usage_by_day 的汇总行整理为按日期 / 用途展开的图表数据"""
+    end_date = date.today()
+    dates = [(end_date - timedelta(days=i)).strftime('%Y-%m-%d') for i in reversed(range(days))]
+    date_index = {d: i for i, d in enumerate(dates)}
+
+    purposes = {}
+    summary = {}
+    cached_tokens = [0] * days
+    uncached_prompt_tokens = [0] * days
+    completion_tokens = [0] * days
+
+    for row in rows:
+        idx = date_index.get(row["day"])
+        if idx is None:
+            continue
+        purpose = row["purpose"]
+        prompt = row["prompt_tokens"] or 0
+        completion = row["completion_tokens"] or 0
+        cached = row["cached_tokens"] or 0
+        spend = estimate_cost(row["model"], prompt, completion, cached, prices)
+
+        series = purposes.setdefault(purpose, {
+            "label": USAGE_PURPOSE_LABELS.get(purpose, purpose),
+            "tokens": [0] * days,
+            "spend": [0] * days,
+        })
+        series["tokens"][idx] += prompt + completion
+        series["spend"][idx] = round(series["spend"][idx] + spend, 6)
+
+        cached_tokens[idx] += cached
+        uncached_prompt_tokens[idx] += max(prompt - cached, 0)
+        completion_tokens[idx] += completion
+
+        total = summary.setdefault(purpose, {
+            "label": USAGE_PURPOSE_LABELS.get(purpose, purpose),
+            "calls": 0, "errors": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "completion_tokens": 0, "latency_sum": 0.0, "spend": 0.0,
+        })
+        total["calls"] += row["calls"]
+        total["errors"] += row["errors"] or 0
+        total["prompt_tokens"] += prompt
+        total["cached_tokens"] += cached
+        total["completion_tokens"] += completion
+        total["latency_sum"] += (row["avg_latency_ms"] or 0) * row["calls"]
+        total["spend"] += spend
+
+    summary_rows = []
+    for total in summary.values():
+        total["avg_latency_ms"] = total.pop("latency_sum") / total["calls"] if total["calls"] else 0
+        summary_rows.append(total)
+    summary_rows.sort(key=lambda r: r["calls"], reverse=True)
+
+    return {
+        "dates": [d[5:] for d in dates],
+        "purposes": list(purposes.values()),
+        "cached_tokens": cached_tokens,
+        "uncached_prompt_tokens": uncached_prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "summary": summary_rows,
+    }
+
+
+def create_usage_stats_tab_content(days: int = 30) -> QWidget:
+    """创建并返回 AI 用量统计选项卡（tokens / 花费 / 延迟，按日期和用途）"""
+    container = QWidget()
+    layout = QVBoxLayout(container)
+    layout.setContentsMargins(15, 15, 15, 15)
+
+    usage_webview = AnkiWebView()
+    usage_webview.setMinimumHeight(400)
+    layout.addWidget(usage_webview)
+    container.usage_webview = usage_webview
+
+    refresh_usage_stats_content(container, days)
+    return container
+
+
+def refresh_usage_stats_content(container, days: int = 30):
+    """从用量账本读取数据并渲染用量统计页面"""
+    if not container or not hasattr(container, 'usage_webview') or not container.usage_webview:
+        return
+
+    prices = get_config().get("model_prices", {}) or {}
+    usage_data = build_usage_chart_data(get_usage_by_day(days), days, prices)
+    usage_data["validation"] = get_validation_stats(days)
+    usage_data["recycling"] = get_recycle_stats(days)
+    usage_data["lookahead"] = lookahead_tuner.snapshot()
+
+    import os
+    template_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'usage_stats.html')
+    with open(template_path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    chart_js_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'chart.js')
+    with open(chart_js_path, 'r', encoding='utf-8') as f:
+        chart_js_content = f.read()
+
+    html_content = html_content.replace('{days}', str(days))
+    html_content = html_content.replace('{usage_data}', json.dumps(usage_data, ensure_ascii=False))
+    html_content = html_content.replace('{chart_js_content}', chart_js_content)
+    container.usage_webview.setHtml(html_content)
+
+
 # --- 原始函数：保持函数签名不变 ---
 def add_stats(statsdialog: NewDeckStats) -> None:
     """
@@ -253,10 +391,12 @@ def add_stats(statsdialog: NewDeckStats) -> None:
             current_deck_name = '未知牌组'
         
     my_custom_stats_container = create_custom_stats_tab_content(current_deck_name)
+    usage_stats_container = create_usage_stats_tab_content()
 
     # 4. 将选项卡添加到 QTabWidget
     tab_widget.addTab(original_stats_container, "Anki统计")
     tab_widget.addTab(my_custom_stats_container, "其他统计")
+    tab_widget.addTab(usage_stats_container, "AI用量")
 
     # 5. 将 QTabWidget 添加到 statsdialog 的主布局
     main_dialog_layout.addWidget(tab_widget)
@@ -11,10 +11,13 @@ Web 端 AI 解释 —— SSE 流式代理。
 """
 
 import json
+import time
 import traceback
 
 import requests
 
+from . import llm_transport
+
 
 def _is_ollama(api_url: str, model_name: str) -> bool:
     """ollama 本地模型：不设置 Authorization 头。"""
@@ -87,71 +90,82 @@ def stream_chat(config, sentence: str, word: str, history: list):
     headers = ({"Content-Type": "application/json"} if is_ollama
                else {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
 
-    def make_payload():
-        if api_client.support_thinking:
-            return {"model": model_name, "messages": messages, "stream": True,
-                    "thinking": {"type": "disabled"}}
-        return {"model": model_name, "messages": messages, "stream": True}
-
     def do_request():
-        return requests.post(api_url, headers=headers, json=make_payload(),
+        return llm_transport.post(api_url, headers=headers, json=api_client.stream_payload(model_name, messages),
                              stream=True, timeout=60)
 
+    start_time = time.time()
+    usage = None
+    status = "ok"
+    reply = []
     try:
-        response = do_request()
-    except requests.exceptions.RequestException as e:
-        yield {"type": "error", "message": f"网络错误: {e}"}
-        return
-
-    # thinking 不可用 → 降级重试一次
-    if response.status_code != 200 and api_client.support_thinking:
         try:
-            body = response.text
-        except Exception:
-            body = ""
-        if "thinking" in body.lower():
-            api_client.support_thinking = False
+            response = do_request()
+        except requests.exceptions.RequestException as e:
+            status = "network_error"
+            yield {"type": "error", "message": f"网络错误: {e}"}
+            return
+
+        # thinking / stream_options 不被支持 → 去掉该字段重试一次
+        if response.status_code != 200:
             try:
-                response = do_request()
-            except requests.exceptions.RequestException as e:
-                yield {"type": "error", "message": f"网络错误: {e}"}
-                return
+                body = response.text
+            except Exception:
+                body = ""
+            if api_client.downgrade_stream_payload(body):
+                try:
+                    response = do_request()
+                except requests.exceptions.RequestException as e:
+                    status = "network_error"
+                    yield {"type": "error", "message": f"网络错误: {e}"}
+                    return
 
-    if response.status_code != 200:
-        yield {"type": "error", "message": f"API 返回 {response.status_code}: {response.text[:300]}"}
-        return
+        if response.status_code != 200:
+            status = f"http_{response.status_code}"
+            yield {"type": "error", "message": f"API 返回 {response.status_code}: {response.text[:300]}"}
+            return
 
-    try:
-        for chunk in response.iter_content(chunk_size=None):
-            if not chunk:
-                continue
-            chunk_str = chunk.decode("utf-8", errors="ignore")
-            for line in chunk_str.splitlines():
-                if not line.startswith("data: "):
-                    if "[DONE]" in line:
-                        break
-                    continue
-                json_data = line[len("data: "):].strip()
-                if json_data == "[DONE]":
-                    yield {"type": "done"}
-                    return
-                try:
-                    data = json.loads(json_data)
-                except json.JSONDecodeError:
-                    continue
-                # 结尾帧/usage 帧 choices 可能为空，安全取值避免 IndexError
-                choices = data.get("choices") or []
-                if not choices:
+        try:
+            for chunk in response.iter_content(chunk_size=None):
+                if not chunk:
                     continue
-                delta = choices[0].get("delta", {}).get("content", "")
-                if delta:
-                    yield {"type": "delta", "content": delta}
-    except requests.exceptions.RequestException as e:
-        yield {"type": "error", "message": f"网络错误: {e}"}
-        return
-    except Exception as e:
-        traceback.print_exc()
-        yield {"type": "error", "message": f"意外错误: {e}"}
-        return
-
-    yield {"type": "done"}
+                chunk_str = chunk.decode("utf-8", errors="ignore")
+                for line in chunk_str.splitlines():
+                    if not line.startswith("data: "):
+                        if "[DONE]" in line:
+                            break
+                        continue
+                    json_data = line[len("data: "):].strip()
+                    if json_data == "[DONE]":
+                        yield {"type": "done"}
+                        return
+                    try:
+                        data = json.loads(json_data)
+                    except json.JSONDecodeError:
+                        continue
+                    # 服务端若返回 usage 帧（通常是最后一帧），记入用量账本
+                    if data.get("usage"):
+                        usage = data["usage"]
+                    # 结尾帧/usage 帧 choices 可能为空，安全取值避免 IndexError
+                    choices = data.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content", "")
+                    if delta:
+                        reply.append(delta)
+                        yield {"type": "delta", "content": delta}
+        except requests.exceptions.RequestException as e:
+            status = "network_error"
+            yield {"type": "error", "message": f"网络错误: {e}"}
+            return
+        except Exception as e:
+            status = "error"
+            traceback.print_exc()
+            yield {"type": "error", "message": f"意外错误: {e}"}
+            return
+
+        yield {"type": "done"}
+    finally:
+        if usage is None and reply:
+            usage = api_client.estimate_chat_usage(messages, "".join(reply))
+        api_client.log_usage("web_chat", model_name, usage, start_time, status)
@@ -38,29 +38,11 @@ def rewrite_media_urls(html: str) -> str:
 
 # ── ContextFlow 例句渲染 ──────────────────────────────────────
 
-def _is_target_deck(card, current_deck, base_deck_name):
-    """判断卡片是否属于目标牌组且为正面（ord==0）"""
-    return (current_deck == base_deck_name or current_deck.startswith(base_deck_name + "::")) and card.ord == 0
-
-
-def _is_saved_deck(card, current_deck, save_deck_name):
-    """判断卡片是否属于保存例句牌组且为正面（ord==0）"""
-    if not save_deck_name:
-        return False
-    return (current_deck == save_deck_name or current_deck.startswith(save_deck_name + "::")) and card.ord == 0
-
-
-def _extract_keyword(card, field_index_match):
-    """从卡片中提取关键词（复用 main_logic 的逻辑）"""
+def _extract_keyword(card):
+    """从关键词索引中取卡片的关键词（与 main_logic 共用索引）"""
     try:
-        from .config_manager import clean_html
-        note = card.note()
-        field_index = int(field_index_match.group(1)) - 1 if field_index_match else 0
-        if field_index < 0 or (note.fields and field_index >= len(note.fields)):
-            field_index = 0
-        keyword = note.fields[field_index].strip() if note.fields and len(note.fields) > field_index else ""
-        keyword = clean_html(keyword)
-        return keyword if keyword else None
+        from .keyword_index import keyword_index
+        return keyword_index.keyword_for_card(card)
     except Exception:
         return None
 
@@ -99,39 +81,62 @@ def _extract_saved_sentence(card):
         return None
 
 
-def _prepare_target_sentence(card, base_deck_name, field_index_match):
+def _prepare_target_sentence(card, base_deck_name, refresh=False):
     """
     目标牌组（target）例句准备：从缓存取例句对，返回结构化数据。
 
+    同一张卡片的同一次复习（撤销答题、重新请求）由例句账本返回已显示的例句；
+    refresh 为真时丢弃该记录，取下一条。
+
     不再生成 HTML——只返回例句对 + 关键词 + 就绪状态，前端自行渲染。
     命中缓存：更新全局显示状态、缓存用尽时入队、预取后续卡片（业务逻辑全部保留）。
     未命中：入队生成，标记 ready=False，前端轮询。
     """
     from .cache.cache_manager import pop_cache, load_cache
+    from .sentence_ledger import sentence_ledger
+    from .sentence_recycler import sentence_recycler
+    from .inventory_planner import inventory_planner
+    from .lookahead_tuner import lookahead_tuner
+    from .translation_service import translation_service
     from . import main_logic
 
-    keyword = _extract_keyword(card, field_index_match)
+    keyword = _extract_keyword(card)
     if not keyword:
         return None
 
     # 朗读用纯词（去括号注释）
     speak_keyword = _clean_word(keyword)
 
-    popped_pair = pop_cache(keyword)
+    if refresh:
+        sentence_ledger.discard(card)
+        popped_pair = None
+    else:
+        popped_pair = sentence_ledger.lookup(card, keyword)
+    if popped_pair is None:
+        # 新例句用尽时先尝试复用归档例句
+        popped_pair = pop_cache(keyword) or sentence_recycler.take(card, keyword)
+        if not refresh:
+            lookahead_tuner.record_card_shown(hit=bool(popped_pair))
+        if popped_pair:
+            sentence_ledger.record(card, keyword, popped_pair)
+
     if popped_pair:
         sentence, translation = popped_pair
+        if not translation:
+            # 两阶段生成：手机端取卡时就读取翻译，译文未缓存时立即请求，翻面时由 /api/card/show 取回
+            translation = translation_service.lookup(sentence) or ""
+            if not translation and translation_service.enabled():
+                translation_service.request([sentence])
         # 更新全局显示状态（复用 main_logic 的状态管理）
         main_logic._update_showing_state(sentence, translation, keyword)
-        # 如果缓存用尽，重新入队
-        if not load_cache(keyword):
+        # 剩余例句低于补货水位时重新入队（卡片下次出现时可复用归档例句则不补货）
+        plan = inventory_planner.observe(card, keyword)
+        if inventory_planner.needs_refill(plan, len(load_cache(keyword))) \
+                and not sentence_recycler.will_recycle(card):
             main_logic._task_manager.reorganize_queue(keyword, is_repopulate=True)
 
-        # 预取后续卡片例句（复用桌面端逻辑）
-        try:
-            upcoming_keywords = main_logic._task_manager.get_upcoming_card_keywords(base_deck_name)
-            main_logic._task_manager.reorganize_queue(upcoming_keywords)
-        except Exception as e:
-            print(f"[ContextFlow Web] 预取失败: {e}")
+        # 预取后续卡片例句（与桌面端共用防抖的预取窗口刷新）
+        main_logic._lookahead.request(base_deck_name)
 
         return {
             "sentence": sentence,
@@ -141,6 +146,7 @@ def _prepare_target_sentence(card, base_deck_name, field_index_match):
         }
 
     # 缓存未命中，入队生成
+    inventory_planner.observe(card, keyword)
     main_logic._task_manager.reorganize_queue(keyword)
     main_logic._update_showing_state("例句生成中...", "", keyword)
     return {
@@ -254,7 +260,7 @@ def get_next_card(mw) -> dict:
     return {"status": "finished"}
 
 
-def _render_card_data(mw, card) -> dict:
+def _render_card_data(mw, card, refresh=False) -> dict:
     """
     将卡片渲染为 API 响应数据。
 
@@ -270,12 +276,10 @@ def _render_card_data(mw, card) -> dict:
     states = mw.col._backend.get_scheduling_states(card.id)
     labels = mw.col._backend.describe_next_states(states)
 
+    from .deck_resolver import deck_resolver
+
     config = get_config()
-    config_deck_name = config.get("deck_name") or ""
-    save_deck_name = config.get("save_deck") or ""
-    field_index_match = re.search(r'\[(\d+)\]$', config_deck_name)
-    base_deck_name = re.sub(r'\[\d+\]$', '', config_deck_name) if field_index_match else config_deck_name
-    current_deck = mw.col.decks.name(card.did)
+    base_deck_name = config.base_deck_name
 
     # 按三模式分流
     sentence = ""
@@ -284,9 +288,9 @@ def _render_card_data(mw, card) -> dict:
     sentence_ready = True
     question_html = ""
 
-    if _is_target_deck(card, current_deck, base_deck_name):
+    if deck_resolver.is_target_card(card):
         card_mode = "target"
-        data = _prepare_target_sentence(card, base_deck_name, field_index_match)
+        data = _prepare_target_sentence(card, base_deck_name, refresh=refresh)
         if data is None:
             # 提取关键词失败，回退为普通牌组渲染
             card_mode = "plain"
@@ -295,7 +299,7 @@ def _render_card_data(mw, card) -> dict:
             translation = data["translation"]
             keyword = data["keyword"]
             sentence_ready = data["ready"]
-    elif _is_saved_deck(card, current_deck, save_deck_name):
+    elif deck_resolver.is_save_card(card):
         saved = _extract_saved_sentence(card)
         if saved:
             card_mode = "saved"
@@ -349,6 +353,7 @@ def get_answer(mw, card_id: int) -> dict:
     返回当前显示状态的例句对（结构化，前端自行渲染）+ 原始卡片背面 HTML。
     例句数据取自 main_logic.showing_*（由 _prepare_target_sentence 同步写入）。
     """
+    from .translation_service import translation_service
     from . import main_logic
 
     card = mw.col.get_card(card_id)
@@ -356,6 +361,11 @@ def get_answer(mw, card_id: int) -> dict:
     sentence = main_logic.showing_sentence
     translation = main_logic.showing_translation
     keyword = main_logic.showing_keyword
+    if sentence and not translation:
+        # 两阶段生成：取答案时译文可能已到达
+        translation = translation_service.lookup(sentence) or ""
+        if translation:
+            main_logic._update_showing_state(sentence, translation, keyword)
 
     raw_answer = card.answer()
     original = rewrite_media_urls(raw_answer)
@@ -396,6 +406,11 @@ def answer_card(mw, card_id: int, ease: int) -> dict:
         top_card.start_timer()
 
     mw.col.sched.answerCard(top_card, ease)
+    from .sentence_ledger import sentence_ledger
+    sentence_ledger.mark_answered(top_card)
+    # Web 端答题不经过 reviewer，不会触发 reviewer_did_answer_card，手动刷新难词索引
+    from . import api_client
+    api_client.on_card_reviewed(top_card)
     return get_next_card(mw)
 
 
@@ -408,31 +423,25 @@ def refresh_sentence(mw) -> dict:
       - 未命中则重新入队生成，显示"例句生成中..."，前端轮询；
       - 重置卡片展示时间（重新计时）。
     """
-    from .config_manager import get_config
-
     card = mw.col.sched.getCard()
     if not card:
         return {"status": "error", "error": "没有当前卡片"}
 
-    config = get_config()
-    config_deck_name = config.get("deck_name")
-    field_index_match = re.search(r'\[(\d+)\]$', config_deck_name)
-    base_deck_name = re.sub(r'\[\d+\]$', '', config_deck_name) if field_index_match else config_deck_name
-    current_deck = mw.col.decks.name(card.did)
+    from .deck_resolver import deck_resolver
 
-    if not _is_target_deck(card, current_deck, base_deck_name):
+    if not deck_resolver.is_target_card(card):
         return {"status": "error", "error": "当前卡片不属于例句牌组"}
 
-    keyword = _extract_keyword(card, field_index_match)
+    keyword = _extract_keyword(card)
     if not keyword:
         return {"status": "error", "error": "无法提取关键词"}
 
     # 重置展示时间，让答题时 time_taken() 从刷新时刻重新计时
     _card_show_times[card.id] = time.time()
 
-    # 重新准备例句：_render_card_data 的 target 分支会 pop_cache 取下一条，
+    # 重新准备例句：_render_card_data 的 target 分支丢弃账本记录并 pop_cache 取下一条，
     # 命中则直接返回新例句对，未命中则入队生成并返回 ready=False（前端轮询）
-    return _render_card_data(mw, card)
+    return _render_card_data(mw, card, refresh=True)
 
 
 # ── 牌组操作 ──────────────────────────────────────────────────
@@ -513,6 +522,8 @@ def check_sentence_status(mw) -> dict:
     """
     from . import main_logic
     from .cache.cache_manager import load_cache, pop_cache
+    from .sentence_ledger import sentence_ledger
+    from .translation_service import translation_service
 
     keyword = main_logic.showing_keyword
     current_sentence = main_logic.showing_sentence
@@ -530,7 +541,12 @@ def check_sentence_status(mw) -> dict:
     popped_pair = pop_cache(keyword)
     if popped_pair:
         sentence, translation = popped_pair
+        if not translation and translation_service.enabled():
+            translation_service.request([sentence])
         main_logic._update_showing_state(sentence, translation, keyword)
+        card = mw.col.sched.getCard()
+        if card:
+            sentence_ledger.record(card, keyword, popped_pair)
 
         # 如果缓存用尽，重新入队
         if not load_cache(keyword):